@@ -0,0 +1,142 @@
+# analytics.py
+# Статистика успеваемости по группам и предметам: агрегаты считает БД (GROUP BY),
+# перцентили — по гистограмме итоговых оценок, без выгрузки строк.
+#
+# Результаты кэшируются по срезу (группа, предмет); наши записи оценок сбрасывают
+# затронутые срезы, изменения с других рабочих мест подхватываются по сроку жизни кэша.
+
+import threading
+import time
+
+from db import connection
+import grades
+from config import CACHE_CONFIG
+
+WEAKEST_LIMIT = 10
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _slice_where(class_name, subject):
+    where, params = [], []
+    if class_name:
+        where.append("s.class = %s")
+        params.append(class_name)
+    if subject:
+        where.append("gr.subject = %s")
+        params.append(subject)
+    return (" WHERE " + " AND ".join(where) if where else ""), tuple(params)
+
+
+def percentiles(histogram, points=PERCENTILES):
+    """Перцентили (по ближайшему рангу) из гистограммы [(оценка, количество)] по возрастанию оценки."""
+    total = sum(count for _, count in histogram)
+    if not total:
+        return {p: None for p in points}
+    result = {}
+    for p in points:
+        rank = max(1, -(-p * total // 100))  # ceil(p * total / 100)
+        seen = 0
+        for grade, count in histogram:
+            seen += count
+            if seen >= rank:
+                result[p] = grade
+                break
+    return result
+
+
+def slice_stats(class_name=None, subject=None):
+    """Статистика среза: сводка по (группа, предмет), распределение, перцентили, слабейшие ученики."""
+    where, params = _slice_where(class_name, subject)
+    base = "FROM grade_reports gr JOIN students s ON s.id = gr.student_id" + where
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT s.class, gr.subject, COUNT(*), AVG(gr.s1), AVG(gr.s2), AVG(gr.final_grade),
+                       AVG(gr.final_grade >= %s)
+                {base}
+                GROUP BY s.class, gr.subject ORDER BY s.class, gr.subject
+            """, (grades.PASS_GRADE,) + params)
+            summary = cur.fetchall()
+            cur.execute(f"""
+                SELECT gr.final_grade, COUNT(*) {base}
+                {"AND" if where else "WHERE"} gr.final_grade IS NOT NULL
+                GROUP BY gr.final_grade ORDER BY gr.final_grade
+            """, params)
+            histogram = cur.fetchall()
+            cur.execute(f"""
+                SELECT s.full_name, s.class, AVG(gr.final_grade) AS avg_final, COUNT(*)
+                {base}
+                GROUP BY s.id, s.full_name, s.class
+                HAVING avg_final IS NOT NULL
+                ORDER BY avg_final, s.full_name LIMIT %s
+            """, params + (WEAKEST_LIMIT,))
+            weakest = cur.fetchall()
+        finally:
+            cur.close()
+    graded = sum(count for _, count in histogram)
+    passed = sum(count for grade, count in histogram if grade >= grades.PASS_GRADE)
+    return {
+        'summary': summary,
+        'histogram': histogram,
+        'percentiles': percentiles(histogram),
+        'pass_rate': passed / graded if graded else None,
+        'weakest': weakest,
+    }
+
+
+def classes():
+    """Группы, в которых есть ученики."""
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT DISTINCT class FROM students WHERE class IS NOT NULL AND class <> '' ORDER BY class")
+            return [r[0] for r in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+def subjects():
+    """Предметы, по которым выставлены оценки."""
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT DISTINCT subject FROM grade_reports WHERE subject IS NOT NULL AND subject <> '' ORDER BY subject")
+            return [r[0] for r in cur.fetchall()]
+        finally:
+            cur.close()
+
+
+class SliceCache:
+    """Кэш slice_stats по (группа, предмет) со сроком жизни ttl секунд."""
+
+    def __init__(self, ttl=None):
+        self.ttl = CACHE_CONFIG['check_every'] if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def get(self, class_name=None, subject=None, refresh=False):
+        """Статистика среза из кэша; при промахе, истечении срока или refresh — из БД."""
+        key = (class_name or None, subject or None)
+        with self._lock:
+            item = self._items.get(key)
+        if item and not refresh and time.monotonic() - item[0] < self.ttl:
+            return item[1]
+        stats = slice_stats(*key)
+        with self._lock:
+            self._items[key] = (time.monotonic(), stats)
+        return stats
+
+    def invalidate(self, class_name=None, subject=None):
+        """Сбросить срезы, которые включают оценки группы class_name по предмету subject (None — любые)."""
+        with self._lock:
+            for key in list(self._items):
+                k_class, k_subject = key
+                if class_name and k_class not in (None, class_name):
+                    continue
+                if subject and k_subject not in (None, subject):
+                    continue
+                del self._items[key]
+
+
+cache = SliceCache()
@@ -0,0 +1,282 @@
+# bench.py
+# Замеры частых операций: загрузка каждой вкладки (первая страница, счётчик,
+# прокрутка, строка по id, поиск), добавление/изменение/удаление, миграция при
+# запуске, импорт, статистика и подготовленные запросы. Итог — JSON, который
+# можно сравнить с прошлым выпуском (compare): медиана хуже базовой больше
+# чем на допуск — регрессия.
+#
+# Замеры пишут в БД только свои строки (группа BENCH-*) и удаляют их после себя.
+# Для осмысленных цифр БД сначала заполняется seed.py.
+
+import csv
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from config import DB_CONFIG, SQLITE_CONFIG
+from db import BACKEND, fetch_all, connection, statement, set_prepared
+import db
+import paging
+import services
+import refcache
+import passport
+import analytics
+import schema
+
+REPEAT = 5
+# допуск при сравнении: доля от базовой медианы и абсолютный минимум (мс)
+TOLERANCE = 0.25
+MIN_DELTA_MS = 2.0
+
+IMPORT_ROWS = 1000
+# вызовов в одном замере поиска id по имени и сохранения (с подготовкой и без)
+STATEMENT_CALLS = 200
+
+# что искать на вкладках со строкой поиска: (столбец, текст)
+SEARCH = {
+    'lessons': ("lessons.criteria", "анализ"),
+    'teachers': ("full_name", "Иванов"),
+    'students': ("full_name", "Петров"),
+    'grade_reports': ("gr.subject", "Математика"),
+    'exam_protocols': ("ep.subject", "Физика"),
+}
+
+COUNTED_TABLES = ("teachers", "students", "grade_reports", "lessons", "ro_sections",
+                  "class_plans", "exam_protocols", "social_passport")
+
+
+def _stats(samples):
+    """Сводка замеров в миллисекундах."""
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    return {
+        'runs': len(ms),
+        'min_ms': round(ms[0], 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(p95, 3),
+        'max_ms': round(ms[-1], 3),
+    }
+
+
+def measure(fn, repeat=REPEAT):
+    """Выполнить fn repeat раз; вернуть сводку времени."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return _stats(samples)
+
+
+class _Timer:
+    """Накопитель замеров по именам для операций, которые идут цепочкой (добавить → изменить → удалить)."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def __call__(self, name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.samples.setdefault(name, []).append(time.perf_counter() - started)
+        return result
+
+    def results(self):
+        return {name: _stats(samples) for name, samples in self.samples.items()}
+
+
+# ---------- группы замеров ----------
+def bench_startup(repeat):
+    # схема уже актуальна: это стоимость проверки версии при каждом запуске
+    return {'startup.migrate': measure(schema.migrate, repeat)}
+
+
+def bench_tabs(repeat):
+    results = {}
+    for key, spec in paging.TABS.items():
+        query = paging.KeysetQuery(**spec)
+        first = query.first_page()
+        results[f"{key}.first_page"] = measure(query.first_page, repeat)
+        results[f"{key}.count"] = measure(query.count, repeat)
+        if first:
+            last_id, first_id = first[-1][0], first[0][0]
+            results[f"{key}.older_page"] = measure(lambda: query.older_page(last_id), repeat)
+            results[f"{key}.row"] = measure(lambda: query.row(first_id), repeat)
+        if key in SEARCH:
+            conditions = paging.text_condition(*SEARCH[key])
+            results[f"{key}.search"] = measure(lambda: query.first_page(conditions), repeat)
+            results[f"{key}.search_count"] = measure(lambda: query.count(conditions), repeat)
+    return results
+
+
+def bench_writes(repeat):
+    timer = _Timer()
+    tag = f"BENCH-{os.getpid()}"
+    section = f"Замер {tag}"
+    student = f"Замер Ученик {tag}"
+    try:
+        for i in range(repeat):
+            tid = timer("teachers.add", services.add_teacher, f"Замер Педагог {tag} {i}", "преподаватель")
+            timer("teachers.update", services.update_teacher, tid, f"Замер Педагог {tag} {i}", "методист")
+            timer("teachers.delete", services.delete_teacher, tid)
+
+            sid = timer("students.add", services.add_student, student, "2008-01-01", tag, {'full_family': 1})
+            timer("students.update", services.update_student, sid, student, "2008-01-02", tag,
+                  {'full_family': 1, 'low_income': 1})
+
+            gid = timer("grade_reports.add", services.add_grade, student, "Математика", 4, 5)
+            timer("grade_reports.update", services.update_grade, gid, student, "Математика", 3, 5, "Математика")
+            timer("grade_reports.delete", services.delete_grade, gid, "Математика")
+            timer("students.delete", services.delete_student, sid)
+
+            lid = timer("lessons.add", services.add_lesson, section, i + 1, "замер урока", 2, "практический")
+            timer("lessons.update", services.update_lesson, lid, section, i + 1, "замер урока изм.", 2, "практический")
+            timer("lessons.delete", services.delete_lesson, lid)
+    finally:
+        _cleanup(tag, section)
+    return timer.results()
+
+
+def bench_import(repeat):
+    results = {}
+    samples = []
+    tag = f"BENCH-{os.getpid()}"
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(("ФИО", "Дата рождения", "Группа"))
+            for i in range(IMPORT_ROWS):
+                writer.writerow((f"Замер Импорт {i}", "2008-01-01", tag))
+        results['import.students_dry_run'] = measure(lambda: services.import_file('students', path, dry_run=True), repeat)
+        for _ in range(repeat):
+            report = services.import_file('students', path)
+            samples.append(report.elapsed)
+            _cleanup(tag)
+        results['import.students'] = _stats(samples)
+        results['import.students']['rows'] = IMPORT_ROWS
+    finally:
+        os.unlink(path)
+        _cleanup(tag)
+    return results
+
+
+def bench_analytics(repeat):
+    results = {'analytics.all': measure(analytics.slice_stats, repeat)}
+    groups = analytics.classes()
+    if groups:
+        results['analytics.class'] = measure(lambda: analytics.slice_stats(groups[0]), repeat)
+    results['analytics.subject'] = measure(lambda: analytics.slice_stats(None, "Математика"), repeat)
+    return results
+
+
+def bench_statements(repeat):
+    # одни и те же запросы с подготовкой на соединении и без неё: разница — разбор на сервере
+    # (на SQLite разобранные запросы кэширует sqlite3, варианты совпадут)
+    lookup = statement("SELECT id FROM students WHERE full_name=%s ORDER BY id LIMIT 1")
+    names = [r[0] for r in fetch_all("SELECT full_name FROM students ORDER BY id LIMIT %s", (STATEMENT_CALLS,))]
+    tag = f"BENCH-{os.getpid()}"
+    tid = services.add_teacher(f"Замер Педагог {tag} 0", "преподаватель")
+    results = {}
+    saved = db.prepared
+    try:
+        for mode in ("plain", "prepared"):
+            set_prepared(mode == "prepared")
+            results[f"statements.lookup.{mode}"] = measure(
+                lambda: [fetch_all(lookup, (name,)) for name in names], repeat)
+            results[f"statements.save.{mode}"] = measure(
+                lambda: [services.update_teacher(tid, f"Замер Педагог {tag} 0", f"должность {i}")
+                         for i in range(STATEMENT_CALLS)], repeat)
+            results[f"statements.lookup.{mode}"]['calls'] = len(names)
+            results[f"statements.save.{mode}"]['calls'] = STATEMENT_CALLS
+    finally:
+        set_prepared(saved)
+        _cleanup(tag)
+    return results
+
+
+def _cleanup(tag, section=None):
+    """Удалить строки замеров (в том числе оставшиеся после сбоя посреди цепочки)."""
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM grade_reports WHERE student_id IN (SELECT id FROM students WHERE class = %s)", (tag,))
+            cur.execute("DELETE FROM students WHERE class = %s", (tag,))
+            cur.execute("DELETE FROM teachers WHERE full_name LIKE %s", (f"Замер Педагог {tag} %",))
+            if section:
+                cur.execute("DELETE FROM lessons WHERE ro_id IN (SELECT id FROM ro_sections WHERE title = %s)", (section,))
+                cur.execute("DELETE FROM ro_sections WHERE title = %s", (section,))
+            passport.refresh_classes(cur, [tag])
+            conn.commit()
+        finally:
+            cur.close()
+    refcache.students.invalidate()
+    refcache.teachers.invalidate()
+    refcache.sections.invalidate()
+    analytics.cache.invalidate()
+
+
+GROUPS = {
+    'startup': bench_startup,
+    'tabs': bench_tabs,
+    'writes': bench_writes,
+    'import': bench_import,
+    'analytics': bench_analytics,
+    'statements': bench_statements,
+}
+
+
+# ---------- запуск и сравнение ----------
+def _meta(repeat):
+    counts = {t: fetch_all(f"SELECT COUNT(*) FROM {t}")[0][0] for t in COUNTED_TABLES}
+    if BACKEND == "sqlite":
+        host, database, server = "local", SQLITE_CONFIG['path'], "SQLite " + fetch_all("SELECT sqlite_version()")[0][0]
+    else:
+        host, database, server = DB_CONFIG['host'], DB_CONFIG['database'], fetch_all("SELECT VERSION()")[0][0]
+    return {
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'backend': BACKEND,
+        'host': host,
+        'database': database,
+        'server': server,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'prepared': db.prepared,
+        'statements': db.statement_stats(),
+        'rows': counts,
+    }
+
+
+def run(groups=None, repeat=REPEAT):
+    """Выполнить группы замеров (по умолчанию все); вернуть {'meta': ..., 'results': {замер: сводка}}."""
+    results = {}
+    for name in groups or GROUPS:
+        results.update(GROUPS[name](repeat))
+    return {'meta': _meta(repeat), 'results': results}
+
+
+def compare(report, baseline, tolerance=TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    """Регрессии относительно baseline: [(замер, базовая медиана, текущая медиана)]."""
+    regressions = []
+    before = baseline.get('results', {})
+    for name, stats in report['results'].items():
+        if name not in before:
+            continue
+        was, now = before[name]['median_ms'], stats['median_ms']
+        if now > was * (1 + tolerance) and now - was > min_delta_ms:
+            regressions.append((name, was, now))
+    return regressions
+
+
+def save(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
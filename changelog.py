@@ -0,0 +1,280 @@
+# changelog.py
+# Журнал изменений для одновременной работы нескольких администраторов.
+#
+# Триггеры таблиц вкладок (миграция 10) записывают в change_log каждую вставку,
+# изменение и удаление строки: (version, таблица, id строки, операция). version
+# растёт монотонно, поэтому окно раз в poll_ms спрашивает только «что изменилось
+# после version N» и перечитывает лишь эти строки. Без изменений опрос — один
+# запрос MIN/MAX по первичному ключу.
+#
+# По тому же журналу при сохранении проверяется, что запись не изменил другой
+# пользователь после того, как она была показана (оптимистическая блокировка).
+#
+# Массовые операции (пересчёт итогов, импорт, ведомость, генерация данных) идут
+# в блоке bulk(): триггеры молчат, а в журнал пишется одна запись-маркер на
+# таблицу, по которой окна перечитывают её целиком.
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from db import BACKEND, connection, fetch_all, statement
+from config import CHANGELOG_CONFIG
+import refcache
+import analytics
+
+log = logging.getLogger("edu.changelog")
+
+# таблицы с триггерами журнала: вкладки и справочники
+TRACKED = ("lessons", "teachers", "students", "class_plans", "social_passport",
+           "grade_reports", "exam_protocols", "ro_sections")
+
+# строки этих таблиц показывают имена из справочника-ключа; каскадные изменения
+# по внешним ключам (ON DELETE CASCADE / SET NULL) MySQL в триггерах не видит
+DEPENDENT = {
+    "teachers": ("class_plans", "exam_protocols"),
+    "students": ("grade_reports",),
+    "ro_sections": ("lessons",),
+}
+
+_BOUNDS_SQL = statement("SELECT MIN(version), MAX(version) FROM change_log")
+_SINCE_SQL = statement("""
+    SELECT version, table_name, row_id, op FROM change_log
+    WHERE version > %s ORDER BY version LIMIT %s
+""")
+# маркер массовой операции (row_id 0) считается изменением каждой строки таблицы
+_ROW_SQL = statement("SELECT COALESCE(MAX(version), 0) FROM change_log WHERE table_name=%s AND row_id IN (%s, 0)")
+_ROW_LOCK_SQL = statement(_ROW_SQL + " FOR UPDATE")
+
+
+def latest_version():
+    """Номер последней записи журнала (0 — журнал пуст)."""
+    return fetch_all(_BOUNDS_SQL)[0][1] or 0
+
+
+def row_version(table, row_id, lock=False):
+    """Номер последнего изменения строки по журналу (0 — изменений не было).
+
+    lock — блокирующее чтение внутри транзакции: видит последнюю зафиксированную
+    правку, даже если снимок транзакции сделан раньше.
+    """
+    return fetch_all(_ROW_LOCK_SQL if lock else _ROW_SQL, (table, row_id))[0][0]
+
+
+def prune(keep_days=None):
+    """Удалить записи журнала старше keep_days дней (последняя запись остаётся); вернуть их число."""
+    keep_days = CHANGELOG_CONFIG['keep_days'] if keep_days is None else keep_days
+    last = latest_version()
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            # время сравнивается на сервере: changed_at пишет триггер по часам сервера БД
+            cur.execute("DELETE FROM change_log WHERE changed_at < NOW() - INTERVAL %s SECOND AND version < %s",
+                        (round(keep_days * 86400), last))
+            conn.commit()
+            return cur.rowcount
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+# ---------- массовые операции ----------
+BULK = "B"
+_MARK_SQL = statement(f"INSERT INTO change_log (table_name, row_id, op) VALUES (%s, 0, '{BULK}')")
+if BACKEND == "sqlite":
+    # переменных сеанса в SQLite нет: флаг — строка, которую до фиксации видит только
+    # транзакция записи (пишет всегда одна)
+    _BULK_ON = "INSERT INTO change_log_bulk (active) VALUES (1)"
+    _BULK_OFF = "DELETE FROM change_log_bulk"
+else:
+    _BULK_ON = "SET @edu_bulk = 1"
+    _BULK_OFF = "SET @edu_bulk = NULL"
+
+
+@contextmanager
+def bulk(cur, *tables):
+    """Массовая запись на курсоре cur без строк журнала; после неё — по маркеру на каждую из tables.
+
+    Блок заканчивается до фиксации транзакции: маркер фиксируется (или откатывается)
+    вместе с изменениями. rowcount записи читать внутри блока.
+    """
+    cur.execute(_BULK_ON)
+    try:
+        yield
+    finally:
+        cur.execute(_BULK_OFF)
+    for table in tables:
+        cur.execute(_MARK_SQL, (table,))
+
+
+# ---------- свои правки ----------
+# версия журнала после нашего последнего сохранения строки: свою правку окно
+# может ещё не получить опросом, но конфликтом с собой она не считается
+_own = {}
+_own_lock = threading.Lock()
+
+
+def saved(table, row_id, version):
+    with _own_lock:
+        if version > _own.get((table, row_id), 0):
+            _own[(table, row_id)] = version
+
+
+def base_version(seen, table, row_id):
+    """Версия, с которой сравнивается строка при сохранении: показанная окном или наша последняя правка.
+
+    seen — версия журнала, до которой изменения применены к вкладкам; None — журнал
+    ещё не прочитан, проверка не выполняется.
+    """
+    if seen is None:
+        return None
+    with _own_lock:
+        return max(seen, _own.get((table, row_id), 0))
+
+
+# ---------- опрос ----------
+class Changes:
+    """Изменения одного опроса по таблицам: {таблица: (вставленные, изменённые, удалённые id)}.
+
+    reloaded — таблицы после массовой операции: перечитываются целиком.
+    overflow — изменений больше, чем читается за раз, или часть журнала уже
+    удалена: вкладки перечитываются целиком.
+    """
+
+    def __init__(self, version, overflow=False):
+        self.version = version
+        self.overflow = overflow
+        self.tables = {}
+        self.reloaded = set()
+
+    def add(self, table, row_id, op):
+        if op == BULK:
+            self.reloaded.add(table)
+            self.tables.pop(table, None)
+            return
+        if table in self.reloaded:
+            return
+        inserted, updated, deleted = self.tables.setdefault(table, (set(), set(), set()))
+        if op == "D":
+            inserted.discard(row_id)
+            updated.discard(row_id)
+            deleted.add(row_id)
+        elif op == "I":
+            deleted.discard(row_id)
+            inserted.add(row_id)
+        elif row_id not in inserted:
+            updated.add(row_id)
+
+    def __bool__(self):
+        return self.overflow or bool(self.tables) or bool(self.reloaded)
+
+
+class ChangeSync:
+    """Чтение журнала с последней прочитанной версии; справочники и кэши обновляются здесь же.
+
+    Номер записи выдаётся при вставке, а видна она после фиксации своей транзакции:
+    пропущенные номера перепроверяются GAP_SECONDS (пропуски оставляют и откаты).
+    """
+
+    GAP_SECONDS = 60
+    MAX_GAPS = 1000
+    # журнал старше keep_days удаляется при первом опросе и дальше раз в PRUNE_SECONDS
+    PRUNE_SECONDS = 3600
+
+    def __init__(self, batch=None, prune=True):
+        self.batch = batch or CHANGELOG_CONFIG['batch']
+        self.version = None
+        self.prune = prune
+        self._gaps = {}  # пропущенный номер → когда замечен
+        self._pruned_at = None
+
+    def poll(self):
+        """Изменения после прошлого опроса (первый вызов только запоминает текущую версию)."""
+        self._prune()
+        oldest, newest = fetch_all(_BOUNDS_SQL)[0]
+        newest = newest or 0
+        if self.version is None:
+            self.version = newest
+            return Changes(newest)
+        changes = Changes(self.version)
+        # опоздавшие записи старше новых — применяются первыми
+        for _, table, row_id, op in self._late_rows():
+            changes.add(table, row_id, op)
+        if newest > self.version:
+            if oldest > self.version + 1:
+                # записи после нашей версии удалены prune(): что именно изменилось, неизвестно
+                changes = Changes(newest, overflow=True)
+            else:
+                rows = fetch_all(_SINCE_SQL, (self.version, self.batch + 1))
+                if len(rows) > self.batch:
+                    changes = Changes(newest, overflow=True)
+                elif rows:
+                    self._note_gaps(self.version, [r[0] for r in rows])
+                    changes.version = rows[-1][0]
+                    for _, table, row_id, op in rows:
+                        changes.add(table, row_id, op)
+        if changes.overflow:
+            self._gaps.clear()
+        self.version = changes.version
+        self._refresh_caches(changes)
+        return changes
+
+    def _prune(self):
+        now = time.monotonic()
+        if not self.prune:
+            return
+        if self._pruned_at is not None and now - self._pruned_at < self.PRUNE_SECONDS:
+            return
+        self._pruned_at = now
+        try:
+            removed = prune()
+        except Exception as e:
+            # не удалось — попробуем в следующий раз, опрос от этого не зависит
+            log.warning("Журнал изменений не очищен: %s", e)
+            return
+        if removed:
+            log.info("Журнал изменений: удалено записей старше %d дн.: %d", CHANGELOG_CONFIG['keep_days'], removed)
+
+    def _note_gaps(self, after, versions):
+        now = time.monotonic()
+        expected = after + 1
+        for version in versions:
+            for missing in range(expected, min(version, expected + self.MAX_GAPS)):
+                self._gaps[missing] = now
+            expected = version + 1
+        while len(self._gaps) > self.MAX_GAPS:
+            del self._gaps[min(self._gaps)]
+
+    def _late_rows(self):
+        if not self._gaps:
+            return []
+        now = time.monotonic()
+        for version, seen in list(self._gaps.items()):
+            if now - seen > self.GAP_SECONDS:
+                del self._gaps[version]
+        if not self._gaps:
+            return []
+        gaps = sorted(self._gaps)
+        rows = fetch_all(f"""
+            SELECT version, table_name, row_id, op FROM change_log
+            WHERE version IN ({", ".join(["%s"] * len(gaps))}) ORDER BY version
+        """, gaps)
+        for row in rows:
+            del self._gaps[row[0]]
+        return rows
+
+    def _refresh_caches(self, changes):
+        for ref in refcache.ALL:
+            if changes.overflow or ref.table in changes.reloaded:
+                ref.invalidate()
+            elif ref.table in changes.tables:
+                inserted, updated, deleted = changes.tables[ref.table]
+                ref.apply_changes(inserted | updated, deleted)
+        touched = set(changes.tables) | changes.reloaded
+        if changes.overflow or "grade_reports" in touched or "students" in touched:
+            analytics.cache.invalidate()
+        if changes.overflow:
+            log.info("Журнал изменений: пропущено больше %d записей, вкладки перечитываются", self.batch)
@@ -0,0 +1,289 @@
+# cli.py
+# Командная строка для пакетных заданий (ночные импорты, пересчёты, проверки)
+# без окна: использует services и не импортирует tkinter.
+#
+#   python cli.py migrate
+#   python cli.py import students ученики.csv [--dry-run]
+#   python cli.py recompute [--class П22-4ЖК] [--subject Математика]
+#   python cli.py passport check [--fix] | passport snapshot 2025
+#   python cli.py indexes
+#   python cli.py docs index | docs search слова из документа
+#   python cli.py seed --yes [--students 50000 --grades 2000000 ...]
+#   python cli.py bench [-o bench.json] [--baseline прошлый.json]
+#   python cli.py changes list [--since 1200] | changes prune [--days 7]
+#   python cli.py export grade_reports оценки.csv [--eq s.class=П22-4ЖК] [--text gr.subject=математика]
+
+import argparse
+import logging
+import sys
+
+import mysql.connector
+
+from db import PoolTimeout, close_pool, connection
+from importer import ImportFileError
+from exporter import ExportError
+import exporter
+import paging
+import services
+import passport
+import doctext
+import changelog
+import schema
+import seed
+import bench
+
+log = logging.getLogger("edu.cli")
+
+
+def cmd_migrate(args):
+    print(f"Версия схемы: {schema.migrate()}")
+
+
+def cmd_import(args):
+    report = services.import_file(args.kind, args.path, dry_run=args.dry_run)
+    action = "Проверено" if args.dry_run else "Загружено"
+    count = report.valid if args.dry_run else report.inserted
+    print(f"{action} строк: {count} из {report.total} за {report.elapsed:.1f} с ({report.rate:.0f} строк/с)")
+    for line_no, message in report.errors[:args.show_errors]:
+        print(f"  строка {line_no}: {message}")
+    if len(report.errors) > args.show_errors:
+        print(f"  ... и ещё {len(report.errors) - args.show_errors} ошибок")
+    return 1 if report.errors and args.strict else 0
+
+
+def cmd_recompute(args):
+    changed = services.recompute_grades(args.class_name, args.subject)
+    print(f"Изменено итоговых оценок: {changed}")
+
+
+def cmd_passport(args):
+    if args.action == 'snapshot':
+        year = args.year or passport.academic_year()
+        print(f"Записано групп за {year} год: {passport.snapshot(year)}")
+        return 0
+    mismatches = passport.check()
+    for group, name, have, want in mismatches:
+        print(f"{group or '(без группы)'}: {name} — {have}, должно быть {want}")
+    if not mismatches:
+        print("Сводка совпадает с данными учеников")
+        return 0
+    if args.fix:
+        passport.rebuild()
+        print("Сводка пересобрана")
+        return 0
+    return 1
+
+
+def cmd_indexes(args):
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            schema.ensure_indexes(cur)
+            schema.ensure_fulltext(cur)
+        finally:
+            cur.close()
+    failed = 0
+    for title, ok, key, access in schema.check_hot_queries():
+        print(f"{'OK ' if ok else '!! '} {title}: {key or 'без индекса'} ({access})")
+        failed += not ok
+    return 1 if failed else 0
+
+
+def cmd_seed(args):
+    if not args.yes:
+        print("Генератор добавит в БД десятки тысяч строк; подтвердите флагом --yes", file=sys.stderr)
+        return 2
+    scale = {name: getattr(args, name) for name in seed.DEFAULT_SCALE if getattr(args, name) is not None}
+    for table, count in seed.generate(scale, seed=args.seed).items():
+        print(f"{table}: {count}")
+
+
+def cmd_bench(args):
+    report = bench.run(args.group or None, repeat=args.repeat)
+    for name, stats in report['results'].items():
+        print(f"{name:36} {stats['median_ms']:10.2f} мс  (p95 {stats['p95_ms']:.2f})")
+    if args.output:
+        bench.save(report, args.output)
+        print(f"Результаты записаны в {args.output}")
+    if args.baseline:
+        regressions = bench.compare(report, bench.load(args.baseline), tolerance=args.tolerance)
+        for name, was, now in regressions:
+            print(f"!! {name}: {was:.2f} → {now:.2f} мс")
+        if regressions:
+            return 1
+        print("Регрессий относительно базовых замеров нет")
+    return 0
+
+
+def cmd_docs(args):
+    if args.action == 'index':
+        queued = doctext.index_pending(args.limit)
+        print(f"Поставлено в разбор файлов: {queued}")
+        doctext.get_indexer().wait()
+        doctext.close()
+        st = doctext.stats()
+        print(f"Разобрано: {st.get('ok', 0)}, без текста: {st.get('empty', 0)}, "
+              f"с ошибкой: {st.get('error', 0)}, ожидают: {st['pending']}")
+        return 0
+    text = " ".join(args.words)
+    if not text.strip():
+        raise services.ValidationError("Укажите слова для поиска")
+    conditions = paging.text_condition("ft.content", text)
+    found = 0
+    for tab, title in (('class_plans', "План"), ('exam_protocols', "Протокол")):
+        query = paging.KeysetQuery(**paging.TABS[tab])
+        for row in query.first_page(conditions):
+            print(f"{title} {row[0]}: " + ", ".join(str(v) for v in row[1:] if v is not None))
+            found += 1
+    if not found:
+        print("Ничего не найдено")
+    return 0 if found else 1
+
+
+def cmd_changes(args):
+    if args.action == 'prune':
+        print(f"Удалено записей журнала: {changelog.prune(args.days)}")
+        return 0
+    sync = changelog.ChangeSync(batch=args.limit, prune=False)
+    sync.version = args.since if args.since is not None else max(changelog.latest_version() - args.limit, 0)
+    changes = sync.poll()
+    if changes.overflow:
+        print(f"Изменений больше {args.limit} или часть журнала уже удалена; последняя версия {changes.version}")
+        return 0
+    names = {"I": "добавлены", "U": "изменены", "D": "удалены"}
+    for table in sorted(changes.reloaded):
+        print(f"{table}: массовое изменение")
+    for table, groups in sorted(changes.tables.items()):
+        for op, ids in zip("IUD", groups):
+            if ids:
+                print(f"{table}: {names[op]} {', '.join(map(str, sorted(ids)))}")
+    print(f"Версия журнала: {changes.version}")
+    return 0
+
+
+def _export_conditions(tab, eq, text):
+    """Фильтр выгрузки из пар СТОЛБЕЦ=ЗНАЧЕНИЕ по столбцам строки фильтров вкладки (paging.FILTERS).
+
+    --eq — столбцы точного совпадения, --text — столбцы поиска слов (с FULLTEXT-индексом).
+    """
+    where, params = [], []
+    for kind, pairs in (("eq", eq), ("text", text)):
+        allowed = paging.filter_columns(tab, ('text',) if kind == "text" else ('equals', 'choice', 'number'))
+        for pair in pairs or ():
+            column, sep, value = pair.partition("=")
+            if not sep or column not in allowed:
+                raise services.ValidationError(
+                    f"Столбец --{kind} для {tab} должен быть одним из: {', '.join(allowed) or '(нет)'}")
+            if kind == "eq":
+                where.append(f"{column} = %s")
+                params.append(value)
+            else:
+                w, p = paging.text_condition(column, value)
+                where += w
+                params += p
+    return where, params
+
+
+def cmd_export(args):
+    conditions = _export_conditions(args.tab, args.eq, args.text)
+
+    def progress(rows, total, elapsed):
+        rate = rows / elapsed if elapsed else 0
+        print(f"\r{rows} из {total} строк ({rate:.0f} строк/с)", end="", file=sys.stderr, flush=True)
+    report = exporter.export(args.tab, args.path, conditions, progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"Выгружено строк: {report.rows} в {report.path} за {report.elapsed:.1f} с ({report.rate:.0f} строк/с)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Пакетные операции с учебной БД")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный журнал")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="привести схему БД к текущей версии")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("import", help="импорт учеников или оценок из CSV/XLSX")
+    p.add_argument("kind", choices=("students", "grades"))
+    p.add_argument("path")
+    p.add_argument("--dry-run", action="store_true", help="только проверить файл")
+    p.add_argument("--strict", action="store_true", help="код возврата 1, если есть строки с ошибками")
+    p.add_argument("--show-errors", type=int, default=20, metavar="N", help="сколько ошибок вывести")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("recompute", help="пересчитать итоговые оценки")
+    p.add_argument("--class", dest="class_name")
+    p.add_argument("--subject")
+    p.set_defaults(func=cmd_recompute)
+
+    p = sub.add_parser("passport", help="сводка соц. паспорта")
+    p.add_argument("action", choices=("check", "snapshot"))
+    p.add_argument("year", nargs="?", type=int, help="учебный год для snapshot (по умолчанию текущий)")
+    p.add_argument("--fix", action="store_true", help="пересобрать сводку при расхождениях")
+    p.set_defaults(func=cmd_passport)
+
+    p = sub.add_parser("indexes", help="досоздать индексы и проверить EXPLAIN частых запросов")
+    p.set_defaults(func=cmd_indexes)
+
+    p = sub.add_parser("docs", help="текст файлов планов и протоколов: разбор и поиск")
+    p.add_argument("action", choices=("index", "search"))
+    p.add_argument("words", nargs="*", help="слова для search")
+    p.add_argument("--limit", type=int, help="разобрать не больше стольких файлов")
+    p.set_defaults(func=cmd_docs)
+
+    p = sub.add_parser("seed", help="заполнить БД синтетическими данными для замеров")
+    p.add_argument("--yes", action="store_true", help="подтвердить запись в БД")
+    p.add_argument("--seed", type=int, default=42, help="зерно генератора")
+    for name, default in seed.DEFAULT_SCALE.items():
+        p.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, metavar="N",
+                       help=f"строк (по умолчанию {default})")
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser("bench", help="замеры частых операций с записью в JSON")
+    p.add_argument("--group", action="append", choices=tuple(bench.GROUPS), help="только эти группы замеров")
+    p.add_argument("--repeat", type=int, default=bench.REPEAT, help="повторов каждого замера")
+    p.add_argument("-o", "--output", help="файл JSON для результатов")
+    p.add_argument("--baseline", help="JSON прошлого прогона для поиска регрессий")
+    p.add_argument("--tolerance", type=float, default=bench.TOLERANCE, help="допустимое замедление (доля)")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("changes", help="журнал изменений: последние записи или удаление старых")
+    p.add_argument("action", choices=("list", "prune"))
+    p.add_argument("--since", type=int, metavar="ВЕРСИЯ", help="показать изменения после этой версии")
+    p.add_argument("--limit", type=int, default=200, help="не больше стольких записей")
+    p.add_argument("--days", type=float, help="prune: хранить записи за столько дней "
+                                              "(по умолчанию EDU_CHANGE_KEEP_DAYS)")
+    p.set_defaults(func=cmd_changes)
+
+    p = sub.add_parser("export", help="выгрузить вкладку в CSV/XLSX потоком")
+    p.add_argument("tab", choices=tuple(exporter.HEADERS))
+    p.add_argument("path", help="файл .csv или .xlsx")
+    p.add_argument("--eq", action="append", metavar="СТОЛБЕЦ=ЗНАЧЕНИЕ", help="равенство, например s.class=П22-4ЖК")
+    p.add_argument("--text", action="append", metavar="СТОЛБЕЦ=СЛОВА", help="поиск слов, как в строке поиска вкладки")
+    p.add_argument("-q", "--quiet", action="store_true", help="не показывать ход выгрузки")
+    p.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        if args.command != "migrate":
+            schema.migrate()
+        return args.func(args) or 0
+    except (services.ValidationError, ImportFileError, ExportError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    except (mysql.connector.Error, PoolTimeout, schema.MigrationError) as e:
+        # сбой БД или пула — со стеком в журнале, код возврата для скриптов ненулевой
+        log.exception("Ошибка БД: %s", e)
+        return 1
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,95 @@ import os
 
 load_dotenv()  # <-- Без этого .env не загрузится!
 
+# Хранилище: mysql (сервер) или sqlite (локальный файл — один пользователь без сети)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+
 DB_CONFIG = {
-    'host': os.getenv("DB_HOST"),
-    'user': os.getenv("DB_USER"),
-    'password': os.getenv("DB_PASSWORD"),
-    'database': os.getenv("DB_NAME"),
+    'host': os.getenv("DB_HOST", "127.0.0.1"),
+    'user': os.getenv("DB_USER", "root"),
+    'password': os.getenv("DB_PASSWORD", ""),
+    'database': os.getenv("DB_NAME", "education_manager"),
     'charset': 'utf8mb4'
 }
+
+# Файл БД SQLite и его настройки: кэш страниц и отображение файла в память (МБ),
+# сколько ждать, пока другой процесс закончит запись (мс)
+SQLITE_CONFIG = {
+    'path': os.getenv("DB_SQLITE_PATH", "education_manager.db"),
+    'cache_mb': int(os.getenv("DB_SQLITE_CACHE_MB", "64")),
+    'mmap_mb': int(os.getenv("DB_SQLITE_MMAP_MB", "256")),
+    'busy_timeout_ms': int(os.getenv("DB_SQLITE_BUSY_MS", "5000")),
+}
+
+# Пул соединений: размер, ожидание свободного соединения (сек)
+# и через сколько секунд простоя проверять соединение ping-ом
+POOL_CONFIG = {
+    'size': int(os.getenv("DB_POOL_SIZE", "5")),
+    'timeout': float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    'ping_after': float(os.getenv("DB_POOL_PING_AFTER", "30")),
+}
+
+# Интерфейс: предзагрузка остальных вкладок после показа первой, поиск
+UI_CONFIG = {
+    'prefetch_tabs': os.getenv("EDU_PREFETCH_TABS", "1") == "1",
+    'prefetch_delay_ms': int(os.getenv("EDU_PREFETCH_DELAY_MS", "300")),
+    # пауза после последнего нажатия в строке поиска перед запросом к БД
+    'search_delay_ms': int(os.getenv("EDU_SEARCH_DELAY_MS", "300")),
+}
+
+# Отложенная запись: правки из окон, пришедшие в пределах delay_ms, фиксируются одной транзакцией
+WRITE_CONFIG = {
+    'write_behind': os.getenv("EDU_WRITE_BEHIND", "0") == "1",
+    'delay_ms': int(os.getenv("EDU_WRITE_BEHIND_MS", "50")),
+    'max_batch': int(os.getenv("EDU_WRITE_BEHIND_BATCH", "100")),
+}
+
+# Подготовленные запросы: постоянные запросы приложения MySQL разбирает один раз на соединение;
+# per_connection — сколько подготовленных запросов держать на соединении
+STATEMENT_CONFIG = {
+    'prepared': os.getenv("EDU_PREPARED", "1") == "1",
+    'per_connection': int(os.getenv("EDU_PREPARED_PER_CONN", "64")),
+}
+
+# Снимок справочников и первых страниц вкладок для мгновенного показа окна при запуске
+SNAPSHOT_CONFIG = {
+    'enabled': os.getenv("EDU_SNAPSHOT", "1") == "1",
+    'path': os.getenv("EDU_SNAPSHOT_PATH", os.path.join(os.path.expanduser("~"), ".edu_admin", "snapshot.json.gz")),
+    # снимок старше стольких дней не показывается
+    'max_age_days': float(os.getenv("EDU_SNAPSHOT_MAX_DAYS", "30")),
+}
+
+# Журнал изменений других администраторов: опрос раз в poll_ms (0 — выключен), записей за опрос
+# (при большем числе вкладки перечитываются целиком), сколько дней хранить журнал (очищается при опросе
+# раз в час и cli.py changes prune)
+CHANGELOG_CONFIG = {
+    'poll_ms': int(os.getenv("EDU_CHANGE_POLL_MS", "3000")),
+    'batch': int(os.getenv("EDU_CHANGE_BATCH", "500")),
+    'keep_days': float(os.getenv("EDU_CHANGE_KEEP_DAYS", "7")),
+}
+
+# Кэш справочников: как часто (сек) сверять его версию с БД
+CACHE_CONFIG = {
+    'check_every': float(os.getenv("EDU_CACHE_CHECK_SECONDS", "30")),
+}
+
+# Хранилище файлов планов и протоколов: размер куска (КБ) при записи и чтении
+FILESTORE_CONFIG = {
+    'chunk_kb': int(os.getenv("EDU_FILE_CHUNK_KB", "1024")),
+}
+
+# Текст документов для поиска: сколько процессов извлекают текст и сколько символов хранить
+DOCTEXT_CONFIG = {
+    'workers': int(os.getenv("EDU_TEXT_WORKERS", "2")),
+    'max_chars': int(os.getenv("EDU_TEXT_MAX_CHARS", "1000000")),
+}
+
+# Учёт запросов fetch_all/execute (Сервис → Диагностика запросов) и журнал медленных запросов
+QUERYLOG_CONFIG = {
+    'enabled': os.getenv("EDU_QUERY_STATS", "0") == "1",
+    'slow_ms': float(os.getenv("EDU_SLOW_QUERY_MS", "500")),
+    'slow_log': os.getenv("EDU_SLOW_QUERY_LOG", "slow_queries.log"),
+    'slow_log_kb': int(os.getenv("EDU_SLOW_QUERY_LOG_KB", "1024")),
+    'slow_log_backups': int(os.getenv("EDU_SLOW_QUERY_LOG_BACKUPS", "3")),
+    'top_n': int(os.getenv("EDU_QUERY_TOP_N", "20")),
+}
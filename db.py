@@ -0,0 +1,473 @@
+# db.py
+# Пул соединений с БД, единица работы transaction() и общие помощники fetch_all/execute.
+# БД — сервер MySQL или локальный файл SQLite (DB_BACKEND, см. sqlite_backend.py).
+
+import logging
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+
+from config import DB_BACKEND, DB_CONFIG, SQLITE_CONFIG, POOL_CONFIG, STATEMENT_CONFIG
+import querylog
+import sqlite_backend
+
+BACKEND = DB_BACKEND
+
+log = logging.getLogger("edu.db")
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул переиспользуемых соединений с БД."""
+
+    def __init__(self, size=5, timeout=10, ping_after=30, connect=None):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect = connect or get_connection
+        # LIFO: чаще берём "тёплые" соединения, редкие остаются простаивать
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'created': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'in_use': 0,
+        }
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def _healthy(self, conn, idle_for):
+        """Проверить соединение, простоявшее дольше ping_after, и переподключить при обрыве."""
+        if idle_for < self.ping_after:
+            return conn
+        session = getattr(conn, "connection_id", None)
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=0)
+        except mysql.connector.Error:
+            self._close_quietly(conn)
+            with self._lock:
+                self._stats['reconnects'] += 1
+            return self._new_connection()
+        if getattr(conn, "connection_id", None) != session:
+            # ping переподключился: новый сеанс сервера не знает подготовленных запросов
+            drop_statements(conn)
+            with self._lock:
+                self._stats['reconnects'] += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        _statements.pop(conn, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Взять соединение из пула (ждёт не дольше timeout секунд)."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"Нет свободных соединений в пуле ({self.size}) за {self.timeout} с")
+        waited = time.perf_counter() - started
+        try:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._new_connection()
+            else:
+                conn = self._healthy(conn, time.monotonic() - released_at)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+            self._stats['in_use'] += 1
+        return conn
+
+    def release(self, conn, broken=False):
+        """Вернуть соединение в пул; сломанные соединения закрываются."""
+        try:
+            if not broken and conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            broken = True
+        if broken:
+            self._close_quietly(conn)
+            with self._lock:
+                self._stats['discarded'] += 1
+        else:
+            self._idle.put((conn, time.monotonic()))
+        with self._lock:
+            self._stats['in_use'] -= 1
+        self._slots.release()
+
+    def stats(self):
+        """Снимок счётчиков пула для подбора его размера."""
+        with self._lock:
+            snap = dict(self._stats)
+        snap['size'] = self.size
+        snap['idle'] = self._idle.qsize()
+        snap['wait_avg'] = snap['wait_total'] / snap['checkouts'] if snap['checkouts'] else 0.0
+        return snap
+
+    def close(self):
+        """Закрыть все простаивающие соединения."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Вернуть общий пул приложения, создав его при первом обращении."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**POOL_CONFIG)
+    return _pool
+
+
+def pool_stats():
+    """Статистика общего пула (выдачи, ожидание, созданные соединения)."""
+    return get_pool().stats()
+
+
+def close_pool():
+    """Закрыть соединения общего пула (при выходе из приложения)."""
+    if _pool is not None:
+        _pool.close()
+
+
+def get_connection():
+    """Создать и вернуть новое соединение с БД (вне пула)."""
+    if BACKEND == "sqlite":
+        return sqlite_backend.connect(SQLITE_CONFIG)
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+# ---------- единица работы ----------
+# Текущая единица работы потока: её соединение, счётчик точек сохранения и
+# колбэки after_commit. Пока она открыта, fetch_all/execute и connection()
+# этого потока работают на её соединении.
+_local = threading.local()
+
+
+class _Unit:
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+        self.after = []
+
+
+def _unit():
+    return getattr(_local, 'unit', None)
+
+
+class _Savepoint:
+    """Соединение внешней единицы работы для вложенного блока: commit/rollback — в пределах точки сохранения."""
+
+    def __init__(self, unit):
+        self._unit = unit
+        self._conn = unit.conn
+        unit.depth += 1
+        self._name = f"uow_{unit.depth}"
+        self._mark()
+
+    def _run(self, sql):
+        cur = self._conn.cursor()
+        try:
+            cur.execute(sql)
+        finally:
+            cur.close()
+
+    def _mark(self):
+        self._run(f"SAVEPOINT {self._name}")
+        self._after = len(self._unit.after)
+
+    def commit(self):
+        self._run(f"RELEASE SAVEPOINT {self._name}")
+        self._mark()
+
+    def rollback(self):
+        self._run(f"ROLLBACK TO SAVEPOINT {self._name}")
+        del self._unit.after[self._after:]
+
+    def close(self, keep):
+        try:
+            if not keep:
+                self.rollback()
+            self._run(f"RELEASE SAVEPOINT {self._name}")
+        finally:
+            self._unit.depth -= 1
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@contextmanager
+def _savepoint(unit, keep):
+    sp = _Savepoint(unit)
+    try:
+        yield sp
+    except BaseException:
+        try:
+            sp.close(keep=False)
+        except mysql.connector.Error:
+            pass  # соединение сломано — внешняя единица работы откатится целиком
+        raise
+    sp.close(keep=keep)
+
+
+@contextmanager
+def transaction():
+    """Единица работы: запросы потока внутри блока идут через одно соединение и фиксируются один раз.
+
+    Вложенные transaction() и connection() присоединяются к внешней через SAVEPOINT:
+    ошибка внутри откатывает только их часть. Исключение из блока откатывает всё.
+    """
+    unit = _unit()
+    if unit is not None:
+        with _savepoint(unit, keep=True) as sp:
+            yield sp
+        return
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+        finally:
+            cur.close()
+        unit = _local.unit = _Unit(conn)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            _local.unit = None
+    for fn in unit.after:
+        try:
+            fn()
+        except Exception:
+            log.exception("Ошибка в обработчике после фиксации")
+
+
+def after_commit(fn):
+    """Вызвать fn после фиксации текущей единицы работы (сразу, если её нет); при откате — не вызывать."""
+    unit = _unit()
+    if unit is None:
+        fn()
+    else:
+        unit.after.append(fn)
+
+
+@contextmanager
+def connection():
+    """Взять соединение из пула на время блока with и вернуть обратно.
+
+    Внутри transaction() выдаётся соединение единицы работы: commit() фиксирует
+    точку сохранения, незафиксированное при выходе откатывается — как при возврате в пул.
+    """
+    unit = _unit()
+    if unit is not None:
+        with _savepoint(unit, keep=False) as sp:
+            yield sp
+        return
+    pool = get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.release(conn, broken=broken)
+
+
+# ---------- подготовленные запросы ----------
+# Реестр постоянных запросов приложения: загрузка вкладок без фильтра, поиск id
+# по имени, добавление/изменение/удаление. Такой запрос MySQL разбирает один раз
+# на соединение: курсор prepared=True хранится при соединении и выполняется снова
+# с новыми параметрами, строки приходят в двоичном протоколе. SQLite кэширует
+# разобранные запросы сам, там реестр не используется.
+_registry = set()
+_statements = weakref.WeakKeyDictionary()
+_statements_lock = threading.Lock()
+_statement_stats = {'prepared': 0, 'reused': 0}
+prepared = STATEMENT_CONFIG['prepared']
+
+
+def statement(sql):
+    """Зарегистрировать постоянный запрос (параметры только через %s) и вернуть его текст."""
+    _registry.add(sql)
+    return sql
+
+
+def set_prepared(value):
+    """Включить или выключить подготовку запросов из реестра (для замеров)."""
+    global prepared
+    prepared = bool(value)
+
+
+def _prepared_cursor(conn, query):
+    """(курсор, текст) для query на conn; подготовленный при первом выполнении на этом соединении.
+
+    Курсор mysql.connector готовит запрос заново, если текст — другой объект,
+    поэтому выполняется всегда тот текст, с которым курсор создан.
+    """
+    with _statements_lock:
+        cache = _statements.get(conn)
+        if cache is None:
+            cache = _statements[conn] = OrderedDict()
+    entry = cache.get(query)
+    if entry is not None:
+        cache.move_to_end(query)
+        with _statements_lock:
+            _statement_stats['reused'] += 1
+        return entry
+    if len(cache) >= STATEMENT_CONFIG['per_connection']:
+        _, (old, _) = cache.popitem(last=False)
+        _close_cursor(old)
+    entry = cache[query] = (conn.cursor(prepared=True), query)
+    with _statements_lock:
+        _statement_stats['prepared'] += 1
+    return entry
+
+
+def _close_cursor(cur):
+    try:
+        cur.close()
+    except mysql.connector.Error:
+        pass
+
+
+def _discard_statement(conn, query):
+    entry = _statements.get(conn, {}).pop(query, None)
+    if entry is not None:
+        _close_cursor(entry[0])
+
+
+def drop_statements(conn):
+    """Закрыть подготовленные запросы соединения."""
+    with _statements_lock:
+        cache = _statements.pop(conn, None)
+    for cur, _ in (cache or {}).values():
+        _close_cursor(cur)
+
+
+def statement_stats():
+    """Сколько запросов подготовлено и сколько раз подготовленные выполнены повторно."""
+    with _statements_lock:
+        return dict(_statement_stats, registered=len(_registry))
+
+
+# ---------- Helper utilities ----------
+# при включённом querylog замеряется ожидание соединения и выполнение запроса
+def _run(conn, query, params, started, fetch=False, commit=False):
+    """Выполнить запрос на conn: fetch — вернуть строки, иначе lastrowid (commit — зафиксировать)."""
+    acquired = time.perf_counter() if started is not None else None
+    reuse = prepared and BACKEND == "mysql" and query in _registry
+    if reuse:
+        cur, query = _prepared_cursor(conn, query)
+    else:
+        cur = conn.cursor()
+    try:
+        cur.execute(query, params or ())
+        result = cur.fetchall() if fetch else cur.lastrowid
+        if commit:
+            conn.commit()
+        if started is not None:
+            querylog.record(query, acquired - started, time.perf_counter() - acquired,
+                            len(result) if fetch else cur.rowcount)
+        return result
+    except mysql.connector.Error:
+        if reuse:
+            # состояние курсора после ошибки не гарантировано — подготовить заново
+            _discard_statement(conn, query)
+        raise
+    finally:
+        if not reuse:
+            cur.close()
+
+
+def fetch_all(query, params=None):
+    started = time.perf_counter() if querylog.enabled else None
+    unit = _unit()
+    if unit is not None:
+        # внутри единицы работы повтор невозможен: с обрывом теряется вся транзакция
+        return _run(unit.conn, query, params, started, fetch=True)
+    # чтение безопасно повторить один раз, если соединение оборвалось на сервере
+    for attempt in (1, 2):
+        try:
+            with connection() as conn:
+                return _run(conn, query, params, started, fetch=True)
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+            if attempt == 2:
+                raise
+
+
+def iter_rows(query, params=None, batch=1000):
+    """Потоково выдавать строки запроса пачками fetchmany, не загружая результат в память.
+
+    Соединение занято до конца перебора. Курсор MySQL небуферизованный: строки
+    читаются из сокета по мере перебора; при досрочном выходе остаток вычитывается.
+    """
+    started = time.perf_counter() if querylog.enabled else None
+    seen = 0
+    with connection() as conn:
+        acquired = time.perf_counter() if started is not None else None
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params or ())
+            while True:
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                seen += len(rows)
+                yield from rows
+        finally:
+            if getattr(conn, "unread_result", False):
+                conn.consume_results()
+            cur.close()
+    if started is not None:
+        querylog.record(query, acquired - started, time.perf_counter() - acquired, seen)
+
+
+def execute(query, params=None):
+    """Выполнить запрос и зафиксировать; внутри transaction() — фиксация в конце единицы работы."""
+    started = time.perf_counter() if querylog.enabled else None
+    unit = _unit()
+    if unit is not None:
+        return _run(unit.conn, query, params, started)
+    with connection() as conn:
+        return _run(conn, query, params, started, commit=True)
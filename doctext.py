@@ -0,0 +1,256 @@
+# doctext.py
+# Текст файлов планов и протоколов для поиска «в каком плане упоминается ...».
+#
+# Текст извлекается из DOCX (zip с word/document.xml — без зависимостей), PDF
+# (нужен pypdf) и TXT в отдельных процессах: разбор большого файла не занимает
+# интерпретатор окна. Текст хранится по хэшу содержимого в таблице file_text с
+# FULLTEXT-индексом, поэтому одинаковые файлы разбираются один раз, а новый файл
+# записи — новый хэш: переиндексируется только изменившийся. При изменении
+# извлечения поднимается EXTRACTOR_VERSION — index_pending() переразберёт всё.
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+
+from db import execute, fetch_all, statement
+from config import DOCTEXT_CONFIG
+import filestore
+
+EXTRACTOR_VERSION = 1
+
+log = logging.getLogger("edu.doctext")
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class ExtractError(Exception):
+    """Текст файла не извлечь (формат не поддерживается, файл повреждён)."""
+
+
+class ExtractorMissing(ExtractError):
+    """Для формата не установлена библиотека — файл разберётся после её установки."""
+
+
+# ---------- извлечение (выполняется в процессах пула) ----------
+def _docx_text(path):
+    parts = []
+    try:
+        with zipfile.ZipFile(path) as z, z.open("word/document.xml") as xml:
+            for _, el in ElementTree.iterparse(xml):
+                if el.tag == _W + "t":
+                    parts.append(el.text or "")
+                elif el.tag == _W + "tab":
+                    parts.append("\t")
+                elif el.tag in (_W + "p", _W + "br"):
+                    parts.append("\n")
+                if el.tag == _W + "p":
+                    el.clear()  # абзац разобран — не держать дерево документа в памяти
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractError(f"Файл DOCX повреждён: {e}")
+    return "".join(parts)
+
+
+def _pdf_text(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractorMissing("Для текста PDF установите pypdf: pip install pypdf")
+    try:
+        reader = PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        raise ExtractError(f"Файл PDF не прочитан: {e}")
+
+
+def _plain_text(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+EXTRACTORS = {
+    DOCX_MIME: _docx_text,
+    "application/pdf": _pdf_text,
+    "text/plain": _plain_text,
+}
+
+
+def extract_text(path, mime, max_chars=None):
+    """Текст файла path по его типу mime (не длиннее max_chars символов)."""
+    extract = EXTRACTORS.get(mime)
+    if extract is None:
+        raise ExtractError(f"Текст не извлекается из файлов {mime}")
+    text = extract(path)
+    return text[:max_chars] if max_chars else text
+
+
+# ---------- очередь разбора ----------
+class Indexer:
+    """Разбор файлов в пуле процессов; текст записывается в file_text по готовности."""
+
+    def __init__(self, workers=None, max_chars=None):
+        self.workers = workers or DOCTEXT_CONFIG['workers']
+        self.max_chars = max_chars or DOCTEXT_CONFIG['max_chars']
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = set()
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: процесс разбора не наследует потоки и соединения окна
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, sha256, path, mime, temporary=False):
+        """Поставить файл в разбор; temporary — удалить path после разбора. Вернуть False, если он уже в очереди."""
+        with self._lock:
+            if sha256 in self._pending:
+                if temporary:
+                    os.remove(path)
+                return False
+            self._pending.add(sha256)
+            future = self._pool().submit(extract_text, path, mime, self.max_chars)
+        future.add_done_callback(lambda f: self._store(sha256, f, path if temporary else None))
+        return True
+
+    def _store(self, sha256, future, temporary):
+        try:
+            if future.cancelled():
+                return  # пул остановлен при выходе — файл останется в index_pending()
+            try:
+                text = future.result()
+                status, error = ("ok" if text.strip() else "empty"), None
+            except BrokenProcessPool:
+                # процесс пула упал — файл не виноват: пул создаётся заново, файл ждёт index_pending()
+                log.exception("Пул разбора остановился, файл %s не разобран", sha256)
+                with self._lock:
+                    self._executor = None
+                return
+            except ExtractorMissing as e:
+                log.warning("Файл %s не разобран: %s", sha256, e)
+                return
+            except ExtractError as e:
+                text, status, error = None, "error", str(e)
+            except Exception as e:
+                # упавший процесс пула, неожиданная ошибка разбора
+                log.exception("Ошибка разбора файла %s", sha256)
+                text, status, error = None, "error", f"{type(e).__name__}: {e}"
+            store_text(sha256, status, text, error)
+        except Exception:
+            log.exception("Не удалось сохранить текст файла %s", sha256)
+        finally:
+            if temporary and os.path.exists(temporary):
+                os.remove(temporary)
+            with self._lock:
+                self._pending.discard(sha256)
+                self._idle.notify_all()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout=None):
+        """Дождаться разбора и записи всех поставленных файлов; вернуть True, если очередь пуста."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+
+def get_indexer():
+    """Общая очередь разбора приложения (пул процессов запускается при первом файле)."""
+    global _indexer
+    if _indexer is None:
+        with _indexer_lock:
+            if _indexer is None:
+                _indexer = Indexer()
+    return _indexer
+
+
+def close():
+    """Остановить процессы разбора (при выходе из приложения)."""
+    if _indexer is not None:
+        _indexer.close()
+
+
+# ---------- хранение и поиск ----------
+_STORE_SQL = statement("""
+    INSERT INTO file_text (sha256, extractor, status, content, error)
+    SELECT sha256, %s, %s, %s, %s FROM files WHERE sha256=%s
+    ON DUPLICATE KEY UPDATE extractor=VALUES(extractor), status=VALUES(status),
+        content=VALUES(content), error=VALUES(error), indexed_at=CURRENT_TIMESTAMP
+""")
+
+
+def store_text(sha256, status, text, error=None):
+    """Записать текст файла (если файл к этому времени не удалён из хранилища)."""
+    execute(_STORE_SQL, (EXTRACTOR_VERSION, status, text, error and error[:255], sha256))
+
+
+def is_indexed(sha256):
+    rows = fetch_all("SELECT extractor FROM file_text WHERE sha256=%s", (sha256,))
+    return bool(rows) and rows[0][0] >= EXTRACTOR_VERSION
+
+
+def schedule(sha256, path, mime):
+    """Разобрать только что загруженный файл с диска, если его текст ещё не извлечён."""
+    if mime not in EXTRACTORS or is_indexed(sha256):
+        return False
+    return get_indexer().submit(sha256, path, mime)
+
+
+def index_pending(limit=None):
+    """Поставить в разбор файлы хранилища без текста или разобранные прежней версией; вернуть их число."""
+    sql = """
+        SELECT f.sha256, f.mime FROM files f
+        LEFT JOIN file_text ft ON ft.sha256 = f.sha256
+        WHERE ft.sha256 IS NULL OR ft.extractor < %s
+        ORDER BY f.created_at
+    """
+    params = (EXTRACTOR_VERSION,)
+    if limit:
+        sql += " LIMIT %s"
+        params += (limit,)
+    indexer = get_indexer()
+    queued = 0
+    for sha256, mime in fetch_all(sql, params):
+        if mime not in EXTRACTORS:
+            store_text(sha256, "error", None, f"Текст не извлекается из файлов {mime}")
+            continue
+        # разбор в другом процессе: файл выгружается из БД во временный
+        fd, path = tempfile.mkstemp(prefix="edu-text-")
+        os.close(fd)
+        try:
+            filestore.get_file(sha256, path)
+        except Exception as e:
+            log.warning("Файл %s не выгружен для разбора: %s", sha256, e)
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        if indexer.submit(sha256, path, mime, temporary=True):
+            queued += 1
+    return queued
+
+
+def stats():
+    """Число файлов по состоянию разбора: {'ok': ..., 'empty': ..., 'error': ..., 'pending': ...}."""
+    counts = dict(fetch_all("SELECT status, COUNT(*) FROM file_text GROUP BY status"))
+    counts['pending'] = fetch_all("""
+        SELECT COUNT(*) FROM files f LEFT JOIN file_text ft ON ft.sha256 = f.sha256
+        WHERE ft.sha256 IS NULL OR ft.extractor < %s
+    """, (EXTRACTOR_VERSION,))[0][0]
+    return counts
@@ -4,300 +4,507 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import mysql.connector
-from datetime import datetime
+import logging
 import os
 import sys
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# ---------- DB connection ----------
-# Конфигурация подключения к базе данных MySQL — БЕЗ пароля в коде
-DB_CONFIG = {
-    'host': os.getenv("DB_HOST", "127.0.0.1"),
-    'user': os.getenv("DB_USER", "root"),
-    'password': os.getenv("DB_PASSWORD", ""),
-    'database': os.getenv("DB_NAME", "education_manager"),
-    'charset': 'utf8mb4'
-}
-
-def get_connection():
-    """Создать и вернуть новое соединение с БД."""
-    return mysql.connector.connect(**DB_CONFIG)
-
-# ---------- Helper utilities ----------
-def fetch_all(query, params=None):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(query, params or ())
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
-
-def execute(query, params=None):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(query, params or ())
-    conn.commit()
-    last = cur.lastrowid
-    cur.close()
-    conn.close()
-    return last
-
-
-# ---------- Ensure required tables exist ----------
-def create_tables_if_not_exist():
-    """Создать все необходимые таблицы, если их нет."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # module table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS module (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        code VARCHAR(50),
-        title VARCHAR(255),
-        total_hours INT
-    ) ENGINE=InnoDB;
-    """)
-
-    # ro_sections
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS ro_sections (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        module_id INT,
-        code VARCHAR(100),
-        title VARCHAR(255),
-        hours INT DEFAULT 0,
-        FOREIGN KEY (module_id) REFERENCES module(id)
-            ON DELETE RESTRICT ON UPDATE CASCADE
-    ) ENGINE=InnoDB;
-    """)
-
-    # lessons
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS lessons (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        ro_id INT,
-        number INT,
-        criteria TEXT,
-        total_hours INT,
-        type VARCHAR(100),
-        FOREIGN KEY (ro_id) REFERENCES ro_sections(id)
-            ON DELETE RESTRICT ON UPDATE CASCADE
-    ) ENGINE=InnoDB;
-    """)
-
-    # teachers
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS teachers (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        full_name VARCHAR(255),
-        position VARCHAR(255)
-    ) ENGINE=InnoDB;
-    """)
-
-    # students
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS students (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        full_name VARCHAR(255),
-        birthdate DATE,
-        class VARCHAR(50)
-    ) ENGINE=InnoDB;
-    """)
-
-    # class_plans
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS class_plans (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        teacher_id INT,
-        class VARCHAR(50),
-        year INT,
-        file_path TEXT,
-        FOREIGN KEY (teacher_id) REFERENCES teachers(id)
-            ON DELETE SET NULL ON UPDATE CASCADE
-    ) ENGINE=InnoDB;
-    """)
-
-    # social_passport (добавлена колонка many_children)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS social_passport (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        class VARCHAR(50),
-        year INT,
-        total_students INT,
-        full_families INT,
-        low_income INT,
-        disabilities INT,
-        orphaned INT,
-        many_children INT DEFAULT 0
-    ) ENGINE=InnoDB;
-    """)
-
-    # grade_reports (используем s1, s2 вместо q1..q4)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS grade_reports (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        student_id INT,
-        subject VARCHAR(255),
-        s1 INT,
-        s2 INT,
-        final_grade INT,
-        FOREIGN KEY (student_id) REFERENCES students(id)
-            ON DELETE CASCADE ON UPDATE CASCADE
-    ) ENGINE=InnoDB;
-    """)
-
-    # exam_protocols
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS exam_protocols (
-        id INT PRIMARY KEY AUTO_INCREMENT,
-        teacher_id INT,
-        subject VARCHAR(255),
-        class VARCHAR(50),
-        date DATE,
-        file_path TEXT,
-        FOREIGN KEY (teacher_id) REFERENCES teachers(id)
-            ON DELETE SET NULL ON UPDATE CASCADE
-    ) ENGINE=InnoDB;
-    """)
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    # Ensure at least one module exists (module_id=1) to avoid FK problems
-    ensure_module_exists()
-
-    # Ensure semester columns exist and migrate if needed
-    ensure_semesters_and_migrate_if_needed()
-
-def ensure_module_exists():
-    """Гарантировать наличие хотя бы одного модуля в таблице module."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM module LIMIT 1")
-    if not cur.fetchone():
-        # Вставляем автосозданный модуль, чтобы FK не ломались
-        cur.execute("INSERT INTO module (code, title, total_hours) VALUES ('ПМ6', 'Автосозданный модуль', 0)")
-        conn.commit()
-    cur.close()
-    conn.close()
-
-# ---------- Migration and column helpers ----------
-def ensure_semesters_and_migrate_if_needed():
-    """Добавить колонки s1/s2 и перенести данные из q1..q4 при необходимости."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # добавить s1/s2 если нет
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 's1'")
-    if not cur.fetchone():
-        cur.execute("ALTER TABLE grade_reports ADD COLUMN s1 INT DEFAULT NULL")
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 's2'")
-    if not cur.fetchone():
-        cur.execute("ALTER TABLE grade_reports ADD COLUMN s2 INT DEFAULT NULL")
-
-    # проверить, существуют ли колонки q1..q4
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 'q1'")
-    q1_exists = bool(cur.fetchone())
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 'q2'")
-    q2_exists = bool(cur.fetchone())
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 'q3'")
-    q3_exists = bool(cur.fetchone())
-    cur.execute("SHOW COLUMNS FROM grade_reports LIKE 'q4'")
-    q4_exists = bool(cur.fetchone())
-
-    # если четверти существуют — проверить, есть ли в них данные
-    if q1_exists or q2_exists or q3_exists or q4_exists:
-        # посчитать ненулевые значения в q1..q4
-        cur.execute("""
-            SELECT
-              SUM(q1 IS NOT NULL) AS q1_not_null,
-              SUM(q2 IS NOT NULL) AS q2_not_null,
-              SUM(q3 IS NOT NULL) AS q3_not_null,
-              SUM(q4 IS NOT NULL) AS q4_not_null
-            FROM grade_reports
-        """)
-        counts = cur.fetchone() or (0,0,0,0)
-        total_not_null = sum(counts)
-
-        if total_not_null > 0:
-            # переносим данные из q1..q4 в s1/s2 (логика усреднения)
-            cur.execute("""
-                UPDATE grade_reports
-                SET s1 = CASE WHEN q1 IS NULL AND q2 IS NULL THEN NULL
-                              WHEN q1 IS NULL THEN q2
-                              WHEN q2 IS NULL THEN q1
-                              ELSE ROUND((q1 + q2) / 2) END,
-                    s2 = CASE WHEN q3 IS NULL AND q4 IS NULL THEN NULL
-                              WHEN q3 IS NULL THEN q4
-                              WHEN q4 IS NULL THEN q3
-                              ELSE ROUND((q3 + q4) / 2) END
-            """)
-            # пересчитать final_grade по семестрам
-            cur.execute("""
-                UPDATE grade_reports
-                SET final_grade = CASE WHEN s1 IS NULL AND s2 IS NULL THEN NULL
-                                       WHEN s1 IS NULL THEN s2
-                                       WHEN s2 IS NULL THEN s1
-                                       ELSE ROUND((s1 + s2) / 2) END
-            """)
-            conn.commit()
-
-        else:
-            # если данных в q1..q4 нет — просто пересчитать final_grade по s1/s2
-            cur.execute("""
-                UPDATE grade_reports
-                SET final_grade = CASE WHEN s1 IS NULL AND s2 IS NULL THEN NULL
-                                       WHEN s1 IS NULL THEN s2
-                                       WHEN s2 IS NULL THEN s1
-                                       ELSE ROUND((s1 + s2) / 2) END
-            """)
-            conn.commit()
-
-    cur.close()
-    conn.close()
+import threading
+import time
+
+from db import connection, fetch_all, pool_stats, statement_stats, close_pool
+from widgets import PagedTree, FilterBar, GradeGrid
+import paging
+from tasks import BackgroundRunner, WriteBehind
+from importer import ImportFileError
+from exporter import ExportError, ExportCancelled
+import exporter
+import services
+import refcache
+import filestore
+import analytics
+import passport
+import grades
+import doctext
+import querylog
+import snapshot
+import changelog
+from schema import migrate, ensure_indexes, ensure_fulltext, check_hot_queries, find_duplicates, INDEXES, MIGRATIONS
+from config import UI_CONFIG, QUERYLOG_CONFIG, WRITE_CONFIG, SNAPSHOT_CONFIG, CHANGELOG_CONFIG
+
+log = logging.getLogger("edu")
+
+
+# ---------- Startup timing ----------
+class StartupTimer:
+    """Отметки этапов запуска для журнала (время до первой отрисовки данных)."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.parts = []
+        self.pending = True
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.parts.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        self.pending = False
+        breakdown = ", ".join(f"{name} {dt * 1000:.0f} мс" for name, dt in self.parts)
+        log.info("Запуск: %s; до первой отрисовки %.0f мс", breakdown, (self.last - self.started) * 1000)
 
 # ---------- GUI app ----------
 class AdminApp:
     """Главное приложение с вкладками для управления данными."""
-    def __init__(self, master):
+    def __init__(self, master, startup=None, snap=None, schema_ready=True):
         self.master = master
+        self.startup = startup or StartupTimer()
+        # снимок прошлого запуска (snapshot.py): справочники и первые страницы показываются сразу
+        self.snap = snap
+        self.schema_ready = schema_ready
+        if snap is not None:
+            for ref in refcache.ALL:
+                if snap.refs.get(ref.table):
+                    ref.restore(snap.refs[ref.table])
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
         master.title("ASPC админка")
         master.geometry("1100x620")
 
+        # меню сервисных функций
+        menubar = tk.Menu(master)
+        service = tk.Menu(menubar, tearoff=0)
+        service.add_command(label="Импорт учеников (CSV/XLSX)...", command=lambda: self.import_file('students'))
+        service.add_command(label="Импорт оценок (CSV/XLSX)...", command=lambda: self.import_file('grades'))
+        service.add_command(label="Пересчитать итоговые оценки...", command=self.recompute_grades)
+        service.add_command(label="Экспорт вкладки в CSV/XLSX...", command=self.export_current_tab)
+        service.add_separator()
+        service.add_command(label="Статистика пула соединений", command=self.show_pool_stats)
+        service.add_command(label="Индексы: проверка и досоздание", command=self.show_index_check)
+        service.add_command(label="Диагностика запросов", command=self.show_query_stats)
+        service.add_command(label="Текст файлов для поиска: доиндексировать", command=self.index_documents)
+        menubar.add_cascade(label="Сервис", menu=service)
+        master.config(menu=menubar)
+
+        # все запросы к БД выполняются в рабочих потоках, результаты — через after();
+        # правки при EDU_WRITE_BEHIND=1 копятся и фиксируются пакетом
+        writer = WriteBehind(WRITE_CONFIG['delay_ms'], WRITE_CONFIG['max_batch']) if WRITE_CONFIG['write_behind'] else None
+        self.runner = BackgroundRunner(master, on_error=self.show_db_error, writer=writer)
+
+        # правки других администраторов (changelog.py): первый опрос запоминает текущую
+        # версию журнала до загрузки вкладок, дальше — только изменения после неё
+        self.sync = changelog.ChangeSync()
+        self.seen_version = None  # версия, до которой изменения показаны во вкладках
+        if CHANGELOG_CONFIG['poll_ms'] > 0:
+            self.poll_changes()
+
         # create tabs
         self.tab_control = ttk.Notebook(master)
         self.tab_control.pack(fill=tk.BOTH, expand=True)
 
-        # prepare tabs
+        # prepare tabs: вкладка строится и загружает данные только при первом выборе
         self.tabs = {}
-        self.create_lessons_tab()
-        self.create_teachers_tab()
-        self.create_students_tab()
-        self.create_class_plans_tab()
-        self.create_social_passport_tab()
-        self.create_grade_reports_tab()
-        self.create_exam_protocols_tab()
+        self.views = {}
+        self.tab_builders = {}
+        for key, title, builder in (
+            ('lessons', "Уроки / КТП", self.create_lessons_tab),
+            ('teachers', "Педагоги", self.create_teachers_tab),
+            ('students', "Ученики", self.create_students_tab),
+            ('class_plans', "Планы группы", self.create_class_plans_tab),
+            ('social_passport', "Соц. паспорт", self.create_social_passport_tab),
+            ('grade_reports', "Успеваемость", self.create_grade_reports_tab),
+            ('exam_protocols', "Протоколы экзаменов", self.create_exam_protocols_tab),
+            ('analytics', "Статистика", self.create_analytics_tab),
+        ):
+            tab = ttk.Frame(self.tab_control)
+            self.tab_control.add(tab, text=title)
+            self.tabs[key] = tab
+            self.tab_builders[key] = builder
+        self.built_tabs = set()
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.startup.mark("окно")
+        self.on_tab_changed()
+
+    def on_tab_changed(self, event=None):
+        """Построить выбранную вкладку, если она ещё не создана."""
+        current = self.tab_control.select()
+        for key, tab in self.tabs.items():
+            if str(tab) == current:
+                self.build_tab(key)
+                break
+
+    def build_tab(self, key):
+        """Создать виджеты вкладки key и запустить загрузку её первой страницы."""
+        if key in self.built_tabs:
+            return
+        self.built_tabs.add(key)
+        started = time.perf_counter()
+        self.tab_builders[key](self.tabs[key])
+        log.debug("Вкладка %s построена за %.0f мс", key, (time.perf_counter() - started) * 1000)
+        if self.snap is not None and key in self.snap.tabs and key in self.views:
+            rows, total = self.snap.tabs[key]
+            self.views[key].show_cached(rows, total, self.snap.saved_at)
+            if self.startup.pending:
+                self.startup.mark(f"снимок {key}")
+        if self.startup.pending and key in self.views:
+            # первая открытая вкладка: отметить время до первой отрисовки данных
+            self.startup.mark(f"вкладка {key}")
+            self.views[key].on_loaded = self.on_first_paint
+
+    def on_first_paint(self):
+        """Первая вкладка показала данные: записать разбивку запуска и предзагрузить остальные."""
+        for view in self.views.values():
+            view.on_loaded = None
+        self.startup.mark("первая страница")
+        self.startup.report()
+        for ref in refcache.ALL:
+            self.runner.submit(ref.ensure_fresh)
+        if UI_CONFIG['prefetch_tabs']:
+            self.master.after(UI_CONFIG['prefetch_delay_ms'], self.prefetch_next_tab)
+
+    def prefetch_next_tab(self):
+        """Построить следующую непостроенную вкладку в фоне (по одной за шаг, чтобы не мешать вводу)."""
+        for key in self.tab_builders:
+            if key not in self.built_tabs:
+                self.build_tab(key)
+                self.master.after(UI_CONFIG['prefetch_delay_ms'], self.prefetch_next_tab)
+                return
+
+    def schema_checked(self, version):
+        """Схема БД проверена в фоне (запуск со снимком)."""
+        self.schema_ready = True
+
+    def save_snapshot(self):
+        """Записать снимок справочников и первых страниц вкладок для следующего запуска."""
+        old = self.snap
+        tabs = dict(old.tabs) if old is not None else {}
+        for key, view in self.views.items():
+            page = view.snapshot_page()
+            if page is not None:
+                tabs[key] = page
+        refs = {ref.table: ref.snapshot() for ref in refcache.ALL if ref.loaded}
+        # схема не проверена (нет связи с БД) — версия остаётся прежней
+        schema = MIGRATIONS[-1][0] if self.schema_ready else (old.schema if old is not None else 0)
+        snapshot.save(schema, refs, tabs)
+
+    def on_close(self):
+        if SNAPSHOT_CONFIG['enabled']:
+            try:
+                self.save_snapshot()
+            except Exception:
+                log.exception("Снимок для быстрого запуска не записан")
+        self.master.destroy()
+
+    # ---------- изменения других пользователей ----------
+    def poll_changes(self):
+        """Прочитать журнал изменений в фоне; следующий опрос — через poll_ms после ответа."""
+        def again():
+            if self.master.winfo_exists():
+                self.master.after(CHANGELOG_CONFIG['poll_ms'], self.poll_changes)
+        def done(changes):
+            self.apply_changes(changes)
+            again()
+        def failed(exc):
+            # без связи с БД опрос просто повторится; ошибку покажут загрузки вкладок
+            log.warning("Журнал изменений не прочитан: %s", exc)
+            again()
+        self.runner.submit(self.sync.poll, key='changes', on_done=done, on_error=failed)
+
+    def apply_changes(self, changes):
+        """Показать изменения из журнала в построенных вкладках (справочники обновлены в фоне)."""
+        if changes.overflow:
+            for view in self.views.values():
+                view.reload()
+            self.social_summary_load()
+            self.changes_shown(changes.version)
+            return
+        # после массовой операции таблица и зависящие от неё вкладки перечитываются целиком
+        reloaded = set(changes.reloaded)
+        for table in changes.reloaded:
+            reloaded.update(changelog.DEPENDENT.get(table, ()))
+        for table in reloaded:
+            if table in self.views:
+                self.views[table].reload()
+        calls = {}
+        for table, (inserted, updated, deleted) in changes.tables.items():
+            if table in self.views and table not in reloaded:
+                calls[table] = {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+            for child in changelog.DEPENDENT.get(table, ()):
+                if child in self.views and child not in reloaded:
+                    calls.setdefault(child, {})['visible'] = True
+        if 'students' in changes.tables or 'students' in changes.reloaded:
+            self.social_summary_load()
+        if not calls:
+            self.changes_shown(changes.version)
+            return
+        left = [len(calls)]
+        def one_done():
+            left[0] -= 1
+            if not left[0]:
+                self.changes_shown(changes.version)
+        for table, kwargs in calls.items():
+            self.views[table].apply_changes(on_done=one_done, **kwargs)
+
+    def changes_shown(self, version):
+        self.seen_version = max(self.seen_version or 0, version)
+
+    def seen(self, table, row_id):
+        """Версия журнала для проверки при сохранении записи, открытой в диалоге."""
+        return changelog.base_version(self.seen_version, table, row_id)
+
+    def show_db_error(self, exc):
+        """Показать ошибку фоновой операции с БД."""
+        messagebox.showerror("Ошибка БД", str(exc))
+
+    def save_in_background(self, win, work, on_done):
+        """Выполнить сохранение диалога в фоне; окно остаётся отзывчивым, повторное нажатие игнорируется."""
+        if getattr(win, "_saving", False):
+            return
+        win._saving = True
+        win.config(cursor="watch")
+        def done(result):
+            if win.winfo_exists(): win.destroy()
+            on_done(result)
+        def failed(exc):
+            win._saving = False
+            if win.winfo_exists():
+                win.config(cursor="")
+                if isinstance(exc, services.ValidationError):
+                    messagebox.showerror("Ошибка", str(exc), parent=win)
+                else:
+                    messagebox.showerror("Ошибка", f"Не удалось сохранить: {exc}", parent=win)
+        self.runner.submit_write(work, on_done=done, on_error=failed)
+
+    def download_file(self, table, row_id, file_name):
+        """Выгрузить файл записи из хранилища в выбранное место (копирование кусками в фоне)."""
+        def ask(rows):
+            sha256 = rows[0][0] if rows else None
+            if not sha256:
+                messagebox.showinfo("Инфо", "Содержимое файла не загружено в хранилище — выберите файл заново в окне редактирования")
+                return
+            # показать диалог сохранения с предложенным именем
+            dest = filedialog.asksaveasfilename(initialfile=file_name, defaultextension=os.path.splitext(file_name)[1] or "")
+            if not dest: return
+            self.runner.submit(filestore.get_file, sha256, dest,
+                               on_done=lambda size: messagebox.showinfo("Готово", f"Файл сохранён ({size} байт)"),
+                               on_error=lambda e: messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {e}"))
+        self.runner.submit(fetch_all, f"SELECT file_sha256 FROM {table} WHERE id=%s", (row_id,), on_done=ask)
+
+    # ---------------- import ----------------
+    def import_file(self, kind):
+        """Импорт учеников/оценок из файла: сначала пробный прогон с предпросмотром."""
+        path = filedialog.askopenfilename(filetypes=[("Таблицы", "*.csv *.xlsx"), ("All files", "*.*")])
+        if not path: return
+        self.runner.submit(services.import_file, kind, path, dry_run=True,
+                           on_done=self.show_import_preview, on_error=self.show_import_error)
+
+    def show_import_error(self, exc):
+        if isinstance(exc, ImportFileError):
+            messagebox.showerror("Импорт", str(exc))
+        else:
+            self.show_db_error(exc)
+
+    def show_import_preview(self, report):
+        """Окно предпросмотра импорта: первые строки, ошибки по строкам, кнопка загрузки."""
+        win = tk.Toplevel(self.master); win.title("Импорт: предпросмотр")
+        win.geometry("760x480")
+        tk.Label(win, anchor="w", text=f"{os.path.basename(report.path)}: строк {report.total}, к загрузке {report.valid}, "
+                                       f"с ошибками {len(report.errors)} (проверено за {report.elapsed:.2f} с)").pack(fill=tk.X, padx=6, pady=4)
+        if report.kind == 'students':
+            cols, headers = ("name", "birthdate", "class"), ["ФИО", "Дата рожд.", "Группа"]
+        else:
+            cols, headers = ("student_id", "subject", "s1", "s2", "final"), ["ID ученика", "Предмет", "Семестр 1", "Семестр 2", "Итог"]
+        tree = ttk.Treeview(win, columns=cols, show="headings", height=10)
+        for c, h in zip(cols, headers):
+            tree.heading(c, text=h); tree.column(c, width=140)
+        for values in report.preview: tree.insert("", tk.END, values=values)
+        tree.pack(fill=tk.BOTH, expand=True, padx=6)
+        if report.errors:
+            tk.Label(win, anchor="w", text="Ошибки:").pack(fill=tk.X, padx=6)
+            errors = tk.Listbox(win, height=8)
+            for line_no, msg in report.errors[:500]: errors.insert(tk.END, f"строка {line_no}: {msg}")
+            errors.pack(fill=tk.BOTH, padx=6)
+        def do():
+            self.save_in_background(win, lambda: services.import_file(report.kind, report.path), self.import_finished)
+        btn = tk.Button(win, text=f"Импортировать {report.valid} строк", command=do)
+        btn.pack(pady=6)
+        if not report.valid: btn.config(state=tk.DISABLED)
+
+    def import_finished(self, report):
+        messagebox.showinfo("Импорт", f"Загружено строк: {report.inserted} за {report.elapsed:.1f} с "
+                                      f"({report.rate:.0f} строк/с), пропущено с ошибками: {len(report.errors)}")
+        if report.kind == 'students':
+            self.social_summary_load()
+        view = self.views.get('students' if report.kind == 'students' else 'grade_reports')
+        if view: view.reload()
+
+    def export_current_tab(self):
+        """Выгрузить открытую вкладку с её текущим фильтром в CSV/XLSX (в фоне, с ходом и отменой)."""
+        current = self.tab_control.select()
+        key = next((k for k, tab in self.tabs.items() if str(tab) == current), None)
+        if key not in exporter.HEADERS or key not in self.views:
+            messagebox.showinfo("Экспорт", "Эту вкладку выгрузить нельзя")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", initialfile=f"{key}.csv",
+                                            filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx")])
+        if not path: return
+        win = tk.Toplevel(self.master); win.title("Экспорт")
+        status = tk.Label(win, text="Подсчёт строк…", width=60, anchor="w")
+        status.pack(padx=10, pady=10)
+        cancel = threading.Event()
+        tk.Button(win, text="Отмена", command=cancel.set).pack(pady=(0, 10))
+        progress = {}  # последний ход выгрузки из рабочего потока, показывается таймером
+        def on_progress(rows, total, elapsed):
+            progress['value'] = (rows, total, elapsed)
+        def show_progress():
+            if not win.winfo_exists(): return
+            if 'value' in progress:
+                rows, total, elapsed = progress['value']
+                status.config(text=f"Выгружено {rows} из {total} строк ({rows / elapsed if elapsed else 0:.0f} строк/с)")
+            win.after(200, show_progress)
+        def done(report):
+            if win.winfo_exists(): win.destroy()
+            messagebox.showinfo("Экспорт", f"Выгружено строк: {report.rows} за {report.elapsed:.1f} с "
+                                           f"({report.rate:.0f} строк/с)\n{report.path}")
+        def failed(exc):
+            if win.winfo_exists(): win.destroy()
+            if isinstance(exc, ExportCancelled):
+                return
+            if isinstance(exc, ExportError):
+                messagebox.showerror("Экспорт", str(exc))
+            else:
+                self.show_db_error(exc)
+        show_progress()
+        self.runner.submit(exporter.export, key, path, self.views[key].conditions,
+                           progress=on_progress, cancel=cancel, on_done=done, on_error=failed)
+
+    def fill_combo(self, combo, ref, extra=()):
+        """Заполнить выпадающий список из кэша справочника; сверка с БД — в фоне и не чаще раза в N секунд."""
+        def show(changed=True):
+            if changed and combo.winfo_exists():
+                combo.config(values=list(extra) + ref.names())
+        if ref.loaded:
+            show()
+        self.runner.submit(ref.ensure_fresh, on_done=show)
+
+    def ref_choice(self, ref):
+        """Заполнение выпадающего фильтра из справочника: пустое значение — «все», список обновляется при открытии."""
+        def fill(combo):
+            combo.config(postcommand=lambda: self.fill_combo(combo, ref, extra=("",)))
+            self.fill_combo(combo, ref, extra=("",))
+        return fill
+
+    def add_filter_bar(self, tab, view, key):
+        """Строка поиска и фильтров над таблицей вкладки (условия выполняются в SQL; столбцы — paging.FILTERS)."""
+        filters = [spec[:3] + (self.ref_choice(getattr(refcache, spec[3])),) if spec[1] == 'choice' else spec
+                   for spec in paging.FILTERS[key]]
+        bar = FilterBar(tab, view, filters)
+        bar.pack(fill=tk.X, padx=5, pady=(5, 0))
+        return bar
+
+    def show_index_check(self):
+        """Досоздать недостающие индексы, проверить EXPLAIN частых запросов и показать дубли имён."""
+        def work():
+            with connection() as conn:
+                cur = conn.cursor()
+                try:
+                    ensure_indexes(cur)
+                    ensure_fulltext(cur)
+                    dups = [(table, columns, find_duplicates(cur, table, columns, limit=5))
+                            for table, name, columns, unique in INDEXES if unique]
+                finally:
+                    cur.close()
+            return check_hot_queries(), dups
+        def show(result):
+            plans, dups = result
+            lines = [f"{'OK ' if ok else 'НЕТ'}  {title}: {key or 'полный просмотр'} ({access})"
+                     for title, ok, key, access in plans]
+            for table, columns, found in dups:
+                if found:
+                    lines.append(f"\nПовторы в {table} ({', '.join(columns)}): " + "; ".join(str(r[:-1]) + f" ×{r[-1]}" for r in found))
+            messagebox.showinfo("Проверка индексов", "\n".join(lines))
+        self.runner.submit(work, on_done=show)
+
+    def recompute_grades(self):
+        """Пересчитать итоговые оценки группы и/или предмета по текущему правилу (одним запросом)."""
+        win = tk.Toplevel(self.master); win.title("Пересчёт итоговых оценок")
+        tk.Label(win, text="Группа (пусто — все):").grid(row=0,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=0,column=1)
+        tk.Label(win, text="Предмет (пусто — все):").grid(row=1,column=0); ent_sub = tk.Entry(win); ent_sub.grid(row=1,column=1)
+        def do():
+            class_name, subject = ent_cl.get().strip(), ent_sub.get().strip()
+            scope = ", ".join(x for x in (class_name, subject) if x) or "все оценки"
+            if not messagebox.askyesno("Подтвердить", f"Пересчитать итоговые оценки: {scope}?", parent=win): return
+            def done(changed):
+                messagebox.showinfo("Готово", f"Изменено итоговых оценок: {changed}")
+                if 'grade_reports' in self.built_tabs:
+                    self.grades_view.reload()
+            self.save_in_background(win, lambda: services.recompute_grades(class_name, subject), done)
+        tk.Button(win, text="Пересчитать", command=do).grid(row=2,column=0,columnspan=2,pady=8)
+
+    def show_pool_stats(self):
+        """Показать счётчики пула соединений (для подбора DB_POOL_SIZE)."""
+        st = pool_stats()
+        prep = statement_stats()
+        messagebox.showinfo("Пул соединений",
+            f"Размер пула: {st['size']} (занято {st['in_use']}, свободно {st['idle']})\n"
+            f"Выдач соединений: {st['checkouts']}\n"
+            f"Ожидание: среднее {st['wait_avg']*1000:.1f} мс, макс. {st['wait_max']*1000:.1f} мс\n"
+            f"Создано соединений: {st['created']}\n"
+            f"Переподключений: {st['reconnects']}, закрыто сломанных: {st['discarded']}\n"
+            f"Подготовленных запросов: {prep['prepared']} (повторных выполнений {prep['reused']})")
+
+    def index_documents(self):
+        """Извлечь текст файлов, загруженных до поиска по документам или не разобранных (в фоне)."""
+        def work():
+            return doctext.index_pending(), doctext.stats()
+        def show(result):
+            count, st = result
+            messagebox.showinfo("Текст файлов",
+                f"Поставлено в разбор: {count}\n"
+                f"Разобрано: {st.get('ok', 0)}, без текста: {st.get('empty', 0)}, с ошибкой: {st.get('error', 0)}\n"
+                "Поиск по тексту — поле «В тексте файла» на вкладках планов и протоколов.")
+        self.runner.submit(work, on_done=show)
+
+    def show_query_stats(self):
+        """Окно учёта запросов: самые затратные по суммарному времени, включение учёта, сброс."""
+        win = tk.Toplevel(self.master); win.title("Диагностика запросов")
+        win.geometry("1000x420")
+        top_bar = tk.Frame(win); top_bar.pack(fill=tk.X, padx=6, pady=4)
+        on = tk.BooleanVar(value=querylog.enabled)
+        tk.Checkbutton(top_bar, text="Учитывать запросы", variable=on,
+                       command=lambda: querylog.set_enabled(on.get())).pack(side=tk.LEFT)
+        slow = QUERYLOG_CONFIG['slow_ms']
+        tk.Label(top_bar, text=f"медленные (от {slow:.0f} мс) — в {QUERYLOG_CONFIG['slow_log']}" if slow
+                 else "журнал медленных запросов выключен").pack(side=tk.LEFT, padx=10)
+        cols = ("total", "calls", "avg", "max", "wait", "rows", "actions", "sql")
+        headers = ["Всего, мс", "Вызовов", "Среднее", "Макс.", "Ожидание", "Строк", "Откуда", "Запрос"]
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c, h, w in zip(cols, headers, (80, 60, 70, 70, 70, 70, 160, 420)):
+            tree.heading(c, text=h); tree.column(c, width=w, anchor="w" if c in ('actions', 'sql') else "e")
+        tree.pack(fill=tk.BOTH, expand=True, padx=6)
+        def refresh():
+            tree.delete(*tree.get_children())
+            for st in querylog.top():
+                tree.insert("", tk.END, values=(f"{st['total']*1000:.1f}", st['calls'], f"{st['total']/st['calls']*1000:.1f}",
+                                                f"{st['max']*1000:.1f}", f"{st['wait']*1000:.1f}", st['rows'],
+                                                ", ".join(st['actions']), st['sql']))
+        def reset():
+            querylog.reset(); refresh()
+        buttons = tk.Frame(win); buttons.pack(pady=6)
+        tk.Button(buttons, text="Обновить", command=refresh).pack(side=tk.LEFT, padx=4)
+        tk.Button(buttons, text="Сбросить", command=reset).pack(side=tk.LEFT, padx=4)
+        refresh()
 
     # ---------------- lessons tab ----------------
-    def create_lessons_tab(self):
+    def create_lessons_tab(self, tab):
         """Создать вкладку Уроки / КТП."""
-        tab = ttk.Frame(self.tab_control)
-        self.tab_control.add(tab, text="Уроки / КТП")
-        self.tabs['lessons'] = tab
 
         cols = ("id", "section", "num", "crit", "hours", "type")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=18)
-        for c, txt in zip(cols, ["ID", "Раздел", "№", "Критерии", "Часы", "Тип"]):
-            tree.heading(c, text=txt)
-            tree.column(c, width=120 if c!='crit' else 350)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.lessons_tree = tree
+        view = PagedTree(tab, cols, ["ID", "Раздел", "№", "Критерии", "Часы", "Тип"],
+                         [120 if c!='crit' else 350 for c in cols], runner=self.runner, height=18, **paging.TABS['lessons'])
+        self.add_filter_bar(tab, view, 'lessons')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.lessons_view = view
+        self.views['lessons'] = view
+        self.lessons_tree = view.tree
 
         # кнопки управления
         f = tk.Frame(tab)
@@ -309,24 +516,8 @@ class AdminApp:
         self.lessons_load()
 
     def lessons_load(self):
-        """Загрузить список уроков в дерево."""
-        for i in self.lessons_tree.get_children(): self.lessons_tree.delete(i)
-        rows = fetch_all("""
-            SELECT lessons.id, ro_sections.title, lessons.number, lessons.criteria, lessons.total_hours, lessons.type
-            FROM lessons
-            LEFT JOIN ro_sections ON ro_sections.id = lessons.ro_id
-            ORDER BY lessons.id DESC
-        """)
-        for r in rows:
-            self.lessons_tree.insert("", tk.END, values=r)
-
-    def get_or_create_section_simple(self, title):
-        """Найти раздел по названию или создать новый и вернуть id."""
-        row = fetch_all("SELECT id FROM ro_sections WHERE title=%s", (title,))
-        if row:
-            return row[0][0]
-        last = execute("INSERT INTO ro_sections (module_id, code, title, hours) VALUES (1, %s, %s, 0)", (title[:10], title))
-        return last
+        """Загрузить первую страницу уроков в дерево."""
+        self.lessons_view.reload()
 
     def lessons_add(self):
         """Окно добавления урока."""
@@ -334,8 +525,8 @@ class AdminApp:
         win.title("Добавить урок")
         win.geometry("620x240")
         tk.Label(win, text="Раздел / предмет:").grid(row=0, column=0, sticky="e", padx=6, pady=6)
-        sections = ["РО 6.1", "РО 6.2", "РО 6.3"] + [r[0] for r in fetch_all("SELECT title FROM ro_sections ORDER BY title")]
-        combo_section = ttk.Combobox(win, values=sections)
+        combo_section = ttk.Combobox(win)
+        self.fill_combo(combo_section, refcache.sections, extra=["РО 6.1", "РО 6.2", "РО 6.3"])
         combo_section.grid(row=0, column=1, sticky="we", padx=6)
         combo_section.set("РО 6.1")
 
@@ -355,25 +546,9 @@ class AdminApp:
 
         def do_save():
             """Сохранить новый урок в БД."""
-            section = combo_section.get().strip()
-            if not section:
-                messagebox.showerror("Ошибка", "Раздел обязателен")
-                return
-            try:
-                number = int(ent_num.get())
-                hours = int(ent_hours.get())
-            except:
-                messagebox.showerror("Ошибка", "Номер и Часы должны быть числами")
-                return
-            title = ent_crit.get().strip()
-            if not title:
-                messagebox.showerror("Ошибка", "Введите тему/критерии")
-                return
-            ro_id = self.get_or_create_section_simple(section)
-            execute("INSERT INTO lessons (ro_id, number, criteria, total_hours, type) VALUES (%s,%s,%s,%s,%s)",
-                    (ro_id, number, title, hours, combo_type.get()))
-            win.destroy()
-            self.lessons_load()
+            values = (combo_section.get(), ent_num.get(), ent_crit.get(), ent_hours.get(), combo_type.get())
+            self.save_in_background(win, lambda: services.add_lesson(*values),
+                                    lambda new_id: self.lessons_view.row_inserted(new_id))
 
         tk.Button(win, text="Сохранить", command=do_save).grid(row=5, column=0, columnspan=2, pady=10)
 
@@ -385,13 +560,14 @@ class AdminApp:
             return
         item = self.lessons_tree.item(sel[0])['values']
         lesson_id = item[0]
+        seen = self.seen('lessons', lesson_id)
         win = tk.Toplevel(self.master)
         win.title("Редактировать урок")
         win.geometry("620x240")
 
         tk.Label(win, text="Раздел / предмет:").grid(row=0, column=0, sticky="e", padx=6, pady=6)
-        sections = ["РО 6.1", "РО 6.2", "РО 6.3"] + [r[0] for r in fetch_all("SELECT title FROM ro_sections ORDER BY title")]
-        combo_section = ttk.Combobox(win, values=sections)
+        combo_section = ttk.Combobox(win)
+        self.fill_combo(combo_section, refcache.sections, extra=["РО 6.1", "РО 6.2", "РО 6.3"])
         combo_section.grid(row=0, column=1, sticky="we", padx=6)
         combo_section.set(item[1])
 
@@ -414,22 +590,9 @@ class AdminApp:
 
         def do_save():
             """Сохранить изменения урока."""
-            section = combo_section.get().strip()
-            if not section:
-                messagebox.showerror("Ошибка", "Раздел обязателен")
-                return
-            try:
-                number = int(ent_num.get())
-                hours = int(ent_hours.get())
-            except:
-                messagebox.showerror("Ошибка", "Номер и Часы должны быть числами")
-                return
-            title = ent_crit.get().strip()
-            ro_id = self.get_or_create_section_simple(section)
-            execute("""UPDATE lessons SET ro_id=%s, number=%s, criteria=%s, total_hours=%s, type=%s WHERE id=%s""",
-                    (ro_id, number, title, hours, combo_type.get(), lesson_id))
-            win.destroy()
-            self.lessons_load()
+            values = (combo_section.get(), ent_num.get(), ent_crit.get(), ent_hours.get(), combo_type.get())
+            self.save_in_background(win, lambda: services.update_lesson(lesson_id, *values, seen=seen),
+                                    lambda _: self.lessons_view.row_updated(lesson_id))
 
         tk.Button(win, text="Сохранить", command=do_save).grid(row=5, column=0, columnspan=2, pady=10)
 
@@ -442,23 +605,19 @@ class AdminApp:
         if not messagebox.askyesno("Подтвердить", "Удалить урок?"):
             return
         lesson_id = self.lessons_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM lessons WHERE id=%s", (lesson_id,))
-        self.lessons_load()
+        self.runner.submit_write(services.delete_lesson, lesson_id, on_done=lambda _: self.lessons_view.row_deleted(lesson_id))
 
     # ---------------- teachers tab ----------------
-    def create_teachers_tab(self):
+    def create_teachers_tab(self, tab):
         """Создать вкладку Педагоги."""
-        tab = ttk.Frame(self.tab_control)
-        self.tab_control.add(tab, text="Педагоги")
-        self.tabs['teachers'] = tab
 
         cols = ("id", "name", "position")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=18)
-        for c, txt in zip(cols, ["ID", "ФИО", "Должность"]):
-            tree.heading(c, text=txt)
-            tree.column(c, width=200)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.teachers_tree = tree
+        view = PagedTree(tab, cols, ["ID", "ФИО", "Должность"], [200] * len(cols), runner=self.runner, height=18, **paging.TABS['teachers'])
+        self.add_filter_bar(tab, view, 'teachers')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.teachers_view = view
+        self.views['teachers'] = view
+        self.teachers_tree = view.tree
 
         # кнопки управления
         f = tk.Frame(tab)
@@ -470,10 +629,8 @@ class AdminApp:
         self.teachers_load()
 
     def teachers_load(self):
-        """Загрузить список педагогов."""
-        for i in self.teachers_tree.get_children(): self.teachers_tree.delete(i)
-        rows = fetch_all("SELECT id, full_name, position FROM teachers ORDER BY id DESC")
-        for r in rows: self.teachers_tree.insert("", tk.END, values=r)
+        """Загрузить первую страницу педагогов."""
+        self.teachers_view.reload()
 
     def teachers_add(self):
         """Окно добавления педагога."""
@@ -481,9 +638,9 @@ class AdminApp:
         tk.Label(win, text="ФИО:").grid(row=0, column=0); ent_name = tk.Entry(win); ent_name.grid(row=0, column=1)
         tk.Label(win, text="Должность:").grid(row=1, column=0); ent_pos = tk.Entry(win); ent_pos.grid(row=1, column=1)
         def do():
-            if not ent_name.get().strip(): messagebox.showerror("Ошибка","ФИО обязательно"); return
-            execute("INSERT INTO teachers (full_name, position) VALUES (%s,%s)", (ent_name.get().strip(), ent_pos.get().strip()))
-            win.destroy(); self.teachers_load()
+            params = (ent_name.get(), ent_pos.get())
+            self.save_in_background(win, lambda: services.add_teacher(*params),
+                                    lambda new_id: self.teachers_view.row_inserted(new_id))
         tk.Button(win, text="Сохранить", command=do).grid(row=2, column=0, columnspan=2, pady=8)
 
     def teachers_edit(self):
@@ -491,12 +648,14 @@ class AdminApp:
         sel = self.teachers_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         item = self.teachers_tree.item(sel[0])['values']; tid = item[0]
+        seen = self.seen('teachers', tid)
         win = tk.Toplevel(self.master); win.title("Редактировать педагога")
         tk.Label(win, text="ФИО:").grid(row=0, column=0); ent_name = tk.Entry(win); ent_name.grid(row=0, column=1); ent_name.insert(0, item[1])
         tk.Label(win, text="Должность:").grid(row=1, column=0); ent_pos = tk.Entry(win); ent_pos.grid(row=1, column=1); ent_pos.insert(0, item[2])
         def do():
-            execute("UPDATE teachers SET full_name=%s, position=%s WHERE id=%s", (ent_name.get().strip(), ent_pos.get().strip(), tid))
-            win.destroy(); self.teachers_load()
+            params = (ent_name.get(), ent_pos.get())
+            self.save_in_background(win, lambda: services.update_teacher(tid, *params, seen=seen),
+                                    lambda _: self.teachers_view.row_updated(tid))
         tk.Button(win, text="Сохранить", command=do).grid(row=2, column=0, columnspan=2, pady=8)
 
     def teachers_delete(self):
@@ -505,19 +664,18 @@ class AdminApp:
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         if not messagebox.askyesno("Подтвердить","Удалить педагога?"): return
         tid = self.teachers_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM teachers WHERE id=%s", (tid,))
-        self.teachers_load()
+        self.runner.submit_write(services.delete_teacher, tid, on_done=lambda _: self.teachers_view.row_deleted(tid))
 
     # ---------------- students tab ----------------
-    def create_students_tab(self):
+    def create_students_tab(self, tab):
         """Создать вкладку Ученики."""
-        tab = ttk.Frame(self.tab_control); self.tab_control.add(tab, text="Ученики"); self.tabs['students'] = tab
         cols = ("id", "name", "birthdate", "class")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=18)
-        for c, txt in zip(cols, ["ID", "ФИО", "Дата рожд.", "Группа"]):
-            tree.heading(c, text=txt); tree.column(c, width=200)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.students_tree = tree
+        view = PagedTree(tab, cols, ["ID", "ФИО", "Дата рожд.", "Группа"], [200] * len(cols), runner=self.runner, height=18, **paging.TABS['students'])
+        self.add_filter_bar(tab, view, 'students')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.students_view = view
+        self.views['students'] = view
+        self.students_tree = view.tree
         f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
         tk.Button(f, text="Добавить", command=self.students_add, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Редактировать", command=self.students_edit, width=14).pack(side=tk.LEFT, padx=5)
@@ -526,10 +684,8 @@ class AdminApp:
         self.students_load()
 
     def students_load(self):
-        """Загрузить список учеников."""
-        for i in self.students_tree.get_children(): self.students_tree.delete(i)
-        rows = fetch_all("SELECT id, full_name, birthdate, class FROM students ORDER BY id DESC")
-        for r in rows: self.students_tree.insert("", tk.END, values=r)
+        """Загрузить первую страницу учеников."""
+        self.students_view.reload()
 
     def students_add(self):
         """Окно добавления ученика."""
@@ -537,35 +693,52 @@ class AdminApp:
         tk.Label(win, text="ФИО:").grid(row=0,column=0); ent_name = tk.Entry(win); ent_name.grid(row=0,column=1)
         tk.Label(win, text="Дата рождения (YYYY-MM-DD):").grid(row=1,column=0); ent_bd = tk.Entry(win); ent_bd.grid(row=1,column=1)
         tk.Label(win, text="Класс:").grid(row=2,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=2,column=1)
+        flags = self.flag_checkboxes(win, 3)
         def do():
-            name=ent_name.get().strip()
-            if not name: messagebox.showerror("Ошибка","ФИО обязательно"); return
-            bd = ent_bd.get().strip()
-            try:
-                if bd: datetime.strptime(bd, "%Y-%m-%d")
-            except:
-                messagebox.showerror("Ошибка","Дата в формате YYYY-MM-DD"); return
-            execute("INSERT INTO students (full_name, birthdate, class) VALUES (%s,%s,%s)", (name, bd if bd else None, ent_cl.get().strip()))
-            win.destroy(); self.students_load()
-        tk.Button(win, text="Сохранить", command=do).grid(row=3,column=0,columnspan=2,pady=8)
+            params = (ent_name.get(), ent_bd.get(), ent_cl.get(), {f: v.get() for f, v in flags.items()})
+            def saved(new_id):
+                self.students_view.row_inserted(new_id)
+                self.social_summary_load()
+            self.save_in_background(win, lambda: services.add_student(*params), saved)
+        tk.Button(win, text="Сохранить", command=do).grid(row=3 + len(flags),column=0,columnspan=2,pady=8)
 
     def students_edit(self):
         """Окно редактирования ученика."""
         sel = self.students_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         item = self.students_tree.item(sel[0])['values']; sid=item[0]
+        seen = self.seen('students', sid)
         win = tk.Toplevel(self.master); win.title("Редактировать ученика")
         tk.Label(win, text="ФИО:").grid(row=0,column=0); ent_name = tk.Entry(win); ent_name.grid(row=0,column=1); ent_name.insert(0,item[1])
         tk.Label(win, text="Дата рождения (YYYY-MM-DD):").grid(row=1,column=0); ent_bd = tk.Entry(win); ent_bd.grid(row=1,column=1); ent_bd.insert(0,item[2] or "")
         tk.Label(win, text="Класс:").grid(row=2,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=2,column=1); ent_cl.insert(0,item[3] or "")
+        flags = self.flag_checkboxes(win, 3)
         def do():
-            bd = ent_bd.get().strip()
-            if bd:
-                try: datetime.strptime(bd, "%Y-%m-%d")
-                except: messagebox.showerror("Ошибка","Дата в формате YYYY-MM-DD"); return
-            execute("UPDATE students SET full_name=%s, birthdate=%s, class=%s WHERE id=%s", (ent_name.get().strip(), bd if bd else None, ent_cl.get().strip(), sid))
-            win.destroy(); self.students_load()
-        tk.Button(win, text="Сохранить", command=do).grid(row=3,column=0,columnspan=2,pady=8)
+            params = (ent_name.get(), ent_bd.get(), ent_cl.get(), {f: v.get() for f, v in flags.items()})
+            def saved(_):
+                self.students_view.row_updated(sid)
+                self.social_summary_load()
+            self.save_in_background(win, lambda: services.update_student(sid, *params, seen=seen), saved)
+        # до загрузки признаков флажки пусты: сохранение сбросило бы соц. паспорт ученика
+        btn = tk.Button(win, text="Сохранить", command=do, state=tk.DISABLED)
+        btn.grid(row=3 + len(flags),column=0,columnspan=2,pady=8)
+        def show_flags(values):
+            if win.winfo_exists():
+                for f, v in values.items(): flags[f].set(v)
+                btn.config(state=tk.NORMAL)
+        def flags_failed(exc):
+            if win.winfo_exists():
+                btn.config(text="Признаки не загружены")
+            self.show_db_error(exc)
+        self.runner.submit(passport.student_flags, sid, on_done=show_flags, on_error=flags_failed)
+
+    def flag_checkboxes(self, win, row):
+        """Флажки признаков соц. паспорта в диалоге ученика, начиная со строки row: {признак: IntVar}."""
+        flags = {}
+        for i, (flag, _, label) in enumerate(passport.ATTRIBUTES):
+            flags[flag] = tk.IntVar(win, 0)
+            tk.Checkbutton(win, text=label, variable=flags[flag]).grid(row=row + i, column=1, sticky="w")
+        return flags
 
     def students_delete(self):
         """Удалить ученика после подтверждения."""
@@ -573,20 +746,22 @@ class AdminApp:
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         if not messagebox.askyesno("Подтвердить","Удалить ученика?"): return
         sid = self.students_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM students WHERE id=%s", (sid,))
-        self.students_load()
+        def deleted(_):
+            self.students_view.row_deleted(sid)
+            self.social_summary_load()
+        self.runner.submit_write(services.delete_student, sid, on_done=deleted)
 
     # ---------------- class_plans tab ----------------
-    def create_class_plans_tab(self):
+    def create_class_plans_tab(self, tab):
         """Создать вкладку Планы группы."""
-        tab = ttk.Frame(self.tab_control); self.tab_control.add(tab, text="Планы группы"); self.tabs['class_plans'] = tab
         cols = ("id", "teacher", "class", "year", "file")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=14)
         headers = ["ID","Педагог","Группа","Год","Файл"]
-        for c, h in zip(cols, headers):
-            tree.heading(c, text=h); tree.column(c, width=200)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.class_plans_tree = tree
+        view = PagedTree(tab, cols, headers, [200] * len(cols), runner=self.runner, height=14, **paging.TABS['class_plans'])
+        self.add_filter_bar(tab, view, 'class_plans')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.class_plans_view = view
+        self.views['class_plans'] = view
+        self.class_plans_tree = view.tree
         f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
         tk.Button(f, text="Добавить", command=self.class_plans_add, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Редактировать", command=self.class_plans_edit, width=14).pack(side=tk.LEFT, padx=5)
@@ -596,39 +771,27 @@ class AdminApp:
         self.class_plans_load()
 
     def class_plans_load(self):
-        """Загрузить планы групп."""
-        for i in self.class_plans_tree.get_children(): self.class_plans_tree.delete(i)
-        rows = fetch_all("""
-            SELECT cp.id, t.full_name, cp.class, cp.year, cp.file_path
-            FROM class_plans cp
-            LEFT JOIN teachers t ON t.id = cp.teacher_id
-            ORDER BY cp.id DESC
-        """)
-        for r in rows: self.class_plans_tree.insert("", tk.END, values=r)
+        """Загрузить первую страницу планов групп."""
+        self.class_plans_view.reload()
 
     def class_plans_add(self):
         """Окно добавления плана класса."""
         win = tk.Toplevel(self.master); win.title("Добавить план класса")
-        tk.Label(win, text="Педагог:").grid(row=0,column=0); teachers = [r[1] for r in fetch_all("SELECT id, full_name FROM teachers")]; combo = ttk.Combobox(win, values=teachers); combo.grid(row=0,column=1)
+        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); self.fill_combo(combo, refcache.teachers)
         tk.Label(win, text="Класс:").grid(row=1,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=1,column=1)
         tk.Label(win, text="Год:").grid(row=2,column=0); ent_year = tk.Entry(win); ent_year.grid(row=2,column=1)
         tk.Label(win, text="Файл (pdf/docx) (необязательно):").grid(row=3,column=0); ent_file = tk.Entry(win); ent_file.grid(row=3,column=1)
+        chosen = {'path': None}
         def browse():
             # выбрать файл и показать только имя
             p = filedialog.askopenfilename(filetypes=[("PDF files","*.pdf"),("Word files","*.docx"),("All files","*.*")])
-            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p))
+            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p)); chosen['path'] = p
         tk.Button(win, text="Обзор...", command=browse).grid(row=3,column=2)
         def do():
             # сохранить запись плана
-            teacher_name = combo.get().strip()
-            teacher_id = None
-            if teacher_name:
-                row = fetch_all("SELECT id FROM teachers WHERE full_name=%s", (teacher_name,))
-                if row: teacher_id = row[0][0]
-            year = ent_year.get().strip()
-            if year and not year.isdigit(): messagebox.showerror("Ошибка","Год числом"); return
-            execute("INSERT INTO class_plans (teacher_id, class, year, file_path) VALUES (%s,%s,%s,%s)", (teacher_id, ent_cl.get().strip(), int(year) if year else None, ent_file.get().strip() or None))
-            win.destroy(); self.class_plans_load()
+            values = (combo.get(), ent_cl.get(), ent_year.get(), ent_file.get(), chosen['path'])
+            self.save_in_background(win, lambda: services.add_class_plan(*values),
+                                    lambda new_id: self.class_plans_view.row_inserted(new_id))
         tk.Button(win, text="Сохранить", command=do).grid(row=4,column=0,columnspan=3,pady=8)
 
     def class_plans_edit(self):
@@ -636,26 +799,23 @@ class AdminApp:
         sel = self.class_plans_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         item = self.class_plans_tree.item(sel[0])['values']; pid=item[0]
+        seen = self.seen('class_plans', pid)
         win = tk.Toplevel(self.master); win.title("Редактировать план")
-        teachers = [r[1] for r in fetch_all("SELECT id, full_name FROM teachers")]
-        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win, values=teachers); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        self.fill_combo(combo, refcache.teachers)
         tk.Label(win, text="Класс:").grid(row=1,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=1,column=1); ent_cl.insert(0,item[2] or "")
         tk.Label(win, text="Год:").grid(row=2,column=0); ent_year = tk.Entry(win); ent_year.grid(row=2,column=1); ent_year.insert(0,item[3] or "")
         tk.Label(win, text="Файл:").grid(row=3,column=0); ent_file = tk.Entry(win); ent_file.grid(row=3,column=1); ent_file.insert(0,item[4] or "")
+        chosen = {'path': None}
         def browse():
             p = filedialog.askopenfilename(filetypes=[("PDF files","*.pdf"),("Word files","*.docx"),("All files","*.*")])
-            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p))
+            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p)); chosen['path'] = p
         tk.Button(win, text="Обзор...", command=browse).grid(row=3,column=2)
         def do():
             # обновить запись плана
-            teacher_name = combo.get().strip(); teacher_id = None
-            if teacher_name:
-                row = fetch_all("SELECT id FROM teachers WHERE full_name=%s", (teacher_name,))
-                if row: teacher_id = row[0][0]
-            year = ent_year.get().strip()
-            if year and not year.isdigit(): messagebox.showerror("Ошибка","Год числом"); return
-            execute("UPDATE class_plans SET teacher_id=%s, class=%s, year=%s, file_path=%s WHERE id=%s", (teacher_id, ent_cl.get().strip(), int(year) if year else None, ent_file.get().strip() or None, pid))
-            win.destroy(); self.class_plans_load()
+            values = (combo.get(), ent_cl.get(), ent_year.get(), ent_file.get(), chosen['path'])
+            self.save_in_background(win, lambda: services.update_class_plan(pid, *values, seen=seen),
+                                    lambda _: self.class_plans_view.row_updated(pid))
         tk.Button(win, text="Сохранить", command=do).grid(row=4,column=0,columnspan=3,pady=8)
 
     def class_plans_delete(self):
@@ -664,8 +824,7 @@ class AdminApp:
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         if not messagebox.askyesno("Подтвердить","Удалить план?"): return
         pid = self.class_plans_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM class_plans WHERE id=%s", (pid,))
-        self.class_plans_load()
+        self.runner.submit_write(services.delete_class_plan, pid, on_done=lambda _: self.class_plans_view.row_deleted(pid))
 
     def class_plans_download(self):
         """Скачать файл плана (показать диалог сохранения)."""
@@ -676,136 +835,213 @@ class AdminApp:
         if not file_name:
             messagebox.showinfo("Инфо", "Файл не указан")
             return
-        # показать диалог сохранения с предложенным именем
-        dest = filedialog.asksaveasfilename(initialfile=file_name, defaultextension=os.path.splitext(file_name)[1] or "")
-        if dest:
-            # здесь предполагается, что файлы хранятся отдельно; просто создаём пустой файл как заглушку
-            try:
-                with open(dest, "wb") as f:
-                    f.write(b"")  # заглушка, реальная логика копирования файла зависит от хранения
-                messagebox.showinfo("Готово", "Файл сохранён")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {e}")
+        self.download_file("class_plans", item[0], str(file_name))
 
     # ---------------- social_passport tab ----------------
-    def create_social_passport_tab(self):
-        """Создать вкладку Социальный паспорт (заглушка интерфейса)."""
-        tab = ttk.Frame(self.tab_control); self.tab_control.add(tab, text="Соц. паспорт"); self.tabs['social_passport'] = tab
+    def create_social_passport_tab(self, tab):
+        """Создать вкладку Социальный паспорт: текущая сводка по признакам учеников и паспорта по годам."""
+        tk.Label(tab, text="Текущая сводка (по признакам учеников)", anchor="w").pack(fill=tk.X, padx=5, pady=(5, 0))
+        cols = ("class", "total", "full_families", "low_income", "disabilities", "orphaned", "many_children")
+        headers = ["Класс","Всего","Полные семьи","Малоимущие","Инвалидность","Сироты","Многодетные"]
+        self.social_summary_tree = ttk.Treeview(tab, columns=cols, show="headings", height=7)
+        for c, h in zip(cols, headers):
+            self.social_summary_tree.heading(c, text=h); self.social_summary_tree.column(c, width=120)
+        self.social_summary_tree.pack(fill=tk.X, padx=5)
+        f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
+        tk.Button(f, text="Зафиксировать за год...", command=self.social_snapshot, width=22).pack(side=tk.LEFT, padx=5)
+        tk.Button(f, text="Проверить сводку", command=self.social_check, width=18).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(tab, text="Паспорта по учебным годам", anchor="w").pack(fill=tk.X, padx=5)
         cols = ("id", "class", "year", "total", "full_families", "low_income", "disabilities", "orphaned", "many_children")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=14)
         headers = ["ID","Класс","Год","Всего","Полные семьи","Малоимущие","Инвалидность","Сироты","Многодетные"]
-        for c, h in zip(cols, headers):
-            tree.heading(c, text=h); tree.column(c, width=120)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.social_tree = tree
+        view = PagedTree(tab, cols, headers, [120] * len(cols), runner=self.runner, height=8, **paging.TABS['social_passport'])
+        self.add_filter_bar(tab, view, 'social_passport')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.social_view = view
+        self.views['social_passport'] = view
+        self.social_tree = view.tree
         f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
         tk.Button(f, text="Обновить", command=self.social_load, width=14).pack(side=tk.LEFT, padx=5)
-        tk.Button(f, text="Добавить (через SQL)", command=self.social_add_prompt, width=20).pack(side=tk.LEFT, padx=5)
         self.social_load()
 
     def social_load(self):
-        """Загрузить записи социального паспорта."""
-        for i in self.social_tree.get_children(): self.social_tree.delete(i)
-        rows = fetch_all("SELECT id, class, year, total_students, full_families, low_income, disabilities, orphaned, many_children FROM social_passport ORDER BY id DESC")
-        for r in rows: self.social_tree.insert("", tk.END, values=r)
-
-    def social_add_prompt(self):
-        """Простая форма добавления записи соц. паспорта (минимальная)."""
-        win = tk.Toplevel(self.master); win.title("Добавить соц. паспорт")
-        tk.Label(win, text="Класс:").grid(row=0,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=0,column=1)
-        tk.Label(win, text="Год:").grid(row=1,column=0); ent_year = tk.Entry(win); ent_year.grid(row=1,column=1)
-        tk.Label(win, text="Всего учеников:").grid(row=2,column=0); ent_total = tk.Entry(win); ent_total.grid(row=2,column=1)
+        """Загрузить сводку и первую страницу паспортов по годам."""
+        self.social_summary_load()
+        self.social_view.reload()
+
+    def social_summary_load(self):
+        """Перечитать текущую сводку (маленькая таблица, одно чтение по ключу)."""
+        if 'social_passport' not in self.built_tabs:
+            return
+        def show(rows):
+            self.social_summary_tree.delete(*self.social_summary_tree.get_children())
+            for r in rows:
+                self.social_summary_tree.insert("", tk.END, values=r)
+        self.runner.submit(passport.summary, key='social_summary', on_done=show)
+
+    def social_snapshot(self):
+        """Записать текущую сводку в паспорт за учебный год (строки этого года заменяются)."""
+        win = tk.Toplevel(self.master); win.title("Зафиксировать соц. паспорт")
+        tk.Label(win, text="Учебный год (начало):").grid(row=0,column=0); ent_year = tk.Entry(win); ent_year.grid(row=0,column=1)
+        ent_year.insert(0, str(passport.academic_year()))
         def do():
             year = ent_year.get().strip()
-            if year and not year.isdigit(): messagebox.showerror("Ошибка","Год числом"); return
-            execute("INSERT INTO social_passport (class, year, total_students) VALUES (%s,%s,%s)", (ent_cl.get().strip(), int(year) if year else None, int(ent_total.get().strip()) if ent_total.get().strip().isdigit() else None))
-            win.destroy(); self.social_load()
-        tk.Button(win, text="Сохранить", command=do).grid(row=3,column=0,columnspan=2,pady=8)
+            if not year.isdigit(): messagebox.showerror("Ошибка","Год числом", parent=win); return
+            if not messagebox.askyesno("Подтвердить", f"Заменить паспорт за {year} год текущей сводкой?", parent=win): return
+            def done(count):
+                messagebox.showinfo("Готово", f"Записано групп: {count}")
+                self.social_view.reload()
+            self.save_in_background(win, lambda: passport.snapshot(int(year)), done)
+        tk.Button(win, text="Сохранить", command=do).grid(row=1,column=0,columnspan=2,pady=8)
+
+    def social_check(self):
+        """Сверить сводку с учениками; при расхождениях предложить пересобрать её."""
+        def checked(mismatches):
+            if not mismatches:
+                messagebox.showinfo("Сводка", "Сводка совпадает с данными учеников")
+                return
+            lines = "\n".join(f"{g or '(без группы)'}: {name} — {have}, должно быть {want}"
+                              for g, name, have, want in mismatches[:20])
+            if messagebox.askyesno("Сводка", f"Найдены расхождения ({len(mismatches)}):\n{lines}\n\nПересобрать сводку?"):
+                self.runner.submit(passport.rebuild, on_done=lambda _: self.social_summary_load())
+        self.runner.submit(passport.check, on_done=checked)
 
     # ---------------- grade_reports tab ----------------
-    def create_grade_reports_tab(self):
+    def create_grade_reports_tab(self, tab):
         """Создать вкладку Табели/Оценки."""
-        tab = ttk.Frame(self.tab_control); self.tab_control.add(tab, text="Успеваемость"); self.tabs['grade_reports'] = tab
         cols = ("id", "student", "subject", "s1", "s2", "final")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=14)
         headers = ["ID","Ученик","Предмет","Семестр 1","Семестр 2","Итог"]
-        for c, h in zip(cols, headers):
-            tree.heading(c, text=h); tree.column(c, width=140)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.grades_tree = tree
+        view = PagedTree(tab, cols, headers, [140] * len(cols), runner=self.runner, height=14, **paging.TABS['grade_reports'])
+        self.add_filter_bar(tab, view, 'grade_reports')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.grades_view = view
+        self.views['grade_reports'] = view
+        self.grades_tree = view.tree
         f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
         tk.Button(f, text="Добавить", command=self.grade_add, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Редактировать", command=self.grade_edit, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Удалить", command=self.grade_delete, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Обновить", command=self.grade_load, width=14).pack(side=tk.LEFT, padx=5)
+        tk.Button(f, text="Ведомость группы...", command=self.grade_sheet, width=18).pack(side=tk.LEFT, padx=5)
         self.grade_load()
 
     def grade_load(self):
-        """Загрузить оценки из БД."""
-        for i in self.grades_tree.get_children(): self.grades_tree.delete(i)
-        rows = fetch_all("""
-            SELECT gr.id, s.full_name, gr.subject, gr.s1, gr.s2, gr.final_grade
-            FROM grade_reports gr
-            LEFT JOIN students s ON s.id = gr.student_id
-            ORDER BY gr.id DESC
-        """)
-        for r in rows: self.grades_tree.insert("", tk.END, values=r)
+        """Загрузить первую страницу оценок из БД."""
+        self.grades_view.reload()
 
     def grade_add(self):
         """Окно добавления оценки."""
         win = tk.Toplevel(self.master); win.title("Добавить оценку")
-        students = [r[1] for r in fetch_all("SELECT id, full_name FROM students")]
-        tk.Label(win, text="Ученик:").grid(row=0,column=0); combo = ttk.Combobox(win, values=students); combo.grid(row=0,column=1)
+        tk.Label(win, text="Ученик:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); self.fill_combo(combo, refcache.students)
         tk.Label(win, text="Предмет:").grid(row=1,column=0); ent_sub = tk.Entry(win); ent_sub.grid(row=1,column=1)
         tk.Label(win, text="Семестр 1:").grid(row=2,column=0); ent_s1 = tk.Entry(win); ent_s1.grid(row=2,column=1)
         tk.Label(win, text="Семестр 2:").grid(row=3,column=0); ent_s2 = tk.Entry(win); ent_s2.grid(row=3,column=1)
         def do():
-            student_name = combo.get().strip(); student_id = None
-            if student_name:
-                row = fetch_all("SELECT id FROM students WHERE full_name=%s", (student_name,))
-                if row: student_id = row[0][0]
-            s1 = ent_s1.get().strip(); s2 = ent_s2.get().strip()
-            s1v = int(s1) if s1.isdigit() else None
-            s2v = int(s2) if s2.isdigit() else None
-            final = None
-            if s1v is not None and s2v is not None:
-                final = round((s1v + s2v) / 2)
-            elif s1v is not None:
-                final = s1v
-            elif s2v is not None:
-                final = s2v
-            execute("INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES (%s,%s,%s,%s,%s)", (student_id, ent_sub.get().strip(), s1v, s2v, final))
-            win.destroy(); self.grade_load()
+            values = (combo.get(), ent_sub.get(), ent_s1.get(), ent_s2.get())
+            self.save_in_background(win, lambda: services.add_grade(*values),
+                                    lambda new_id: self.grades_view.row_inserted(new_id))
         tk.Button(win, text="Сохранить", command=do).grid(row=4,column=0,columnspan=2,pady=8)
 
+    def grade_sheet(self):
+        """Ввод оценок группы таблицей: ведомость грузится одним запросом и сохраняется одной транзакцией."""
+        win = tk.Toplevel(self.master); win.title("Ведомость группы")
+        win.geometry("1000x600")
+        bar = tk.Frame(win); bar.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(bar, text="Группа:").pack(side=tk.LEFT)
+        combo = ttk.Combobox(bar, width=18); combo.pack(side=tk.LEFT, padx=(2, 8))
+        self.runner.submit(analytics.classes, on_done=lambda groups: combo.winfo_exists() and combo.config(values=groups))
+        tk.Label(bar, text="Предмет:").pack(side=tk.LEFT)
+        ent_sub = tk.Entry(bar, width=20); ent_sub.pack(side=tk.LEFT, padx=2)
+        body = tk.Frame(win); body.pack(fill=tk.BOTH, expand=True, padx=5)
+        bottom = tk.Frame(win); bottom.pack(fill=tk.X, padx=5, pady=5)
+        status = tk.Label(bottom, anchor="w"); status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        state = {'grid': None, 'class': None}
+
+        def unsaved():
+            return state['grid'] is not None and bool(state['grid'].changes())
+
+        def show(result, class_name):
+            students, subjects, cells = result
+            for child in body.winfo_children():
+                child.destroy()
+            state['grid'] = GradeGrid(body, students, subjects, cells)
+            state['grid'].pack(fill=tk.BOTH, expand=True)
+            state['class'] = class_name
+            status.config(text=f"Учеников: {len(students)}, предметов: {len(subjects)}")
+
+        def load():
+            class_name = combo.get().strip()
+            if not class_name:
+                messagebox.showwarning("Ошибка", "Выберите группу", parent=win); return
+            if unsaved() and not messagebox.askyesno("Ведомость", "Есть несохранённые оценки. Загрузить заново?", parent=win):
+                return
+            self.runner.submit(grades.load_sheet, class_name, on_done=lambda r: win.winfo_exists() and show(r, class_name))
+
+        def add_subject():
+            subject = ent_sub.get().strip()
+            if state['grid'] is None or not subject: return
+            state['grid'].add_subject(subject)
+            ent_sub.delete(0, tk.END)
+
+        def save():
+            grid = state['grid']
+            if grid is None: return
+            if grid.invalid():
+                messagebox.showwarning("Ошибка", "Оценки должны быть целыми числами (неверные выделены красным)", parent=win)
+                return
+            changes = grid.changes()
+            if not changes:
+                status.config(text="Изменений нет"); return
+            def saved(count):
+                if win.winfo_exists():
+                    grid.mark_saved(changes)
+                    status.config(text=f"Сохранено оценок: {count}")
+                self.grades_view.reload()
+            def failed(exc):
+                if not win.winfo_exists():
+                    return
+                # изменённые ячейки остаются выделенными — их можно поправить и сохранить снова
+                status.config(text=f"Не сохранено: изменённых оценок {len(grid.changes())}")
+                if isinstance(exc, services.ValidationError):
+                    messagebox.showerror("Ошибка", str(exc), parent=win)
+                else:
+                    messagebox.showerror("Ошибка", f"Не удалось сохранить: {exc}", parent=win)
+            status.config(text=f"Сохранение {len(changes)} оценок...")
+            self.runner.submit_write(services.save_grade_sheet, state['class'], changes, on_done=saved, on_error=failed)
+
+        def close():
+            if unsaved() and not messagebox.askyesno("Ведомость", "Закрыть без сохранения изменений?", parent=win):
+                return
+            win.destroy()
+
+        tk.Button(bar, text="Добавить предмет", command=add_subject).pack(side=tk.LEFT, padx=2)
+        tk.Button(bar, text="Загрузить", command=load, width=12).pack(side=tk.LEFT, padx=8)
+        tk.Button(bottom, text="Сохранить", command=save, width=14).pack(side=tk.RIGHT)
+        combo.bind("<<ComboboxSelected>>", lambda e: load())
+        win.protocol("WM_DELETE_WINDOW", close)
+
     def grade_edit(self):
         """Окно редактирования оценки."""
         sel = self.grades_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         item = self.grades_tree.item(sel[0])['values']; gid=item[0]
+        seen = self.seen('grade_reports', gid)
         win = tk.Toplevel(self.master); win.title("Редактировать оценку")
-        students = [r[1] for r in fetch_all("SELECT id, full_name FROM students")]
-        tk.Label(win, text="Ученик:").grid(row=0,column=0); combo = ttk.Combobox(win, values=students); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        tk.Label(win, text="Ученик:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        self.fill_combo(combo, refcache.students)
+        def show_student(rows):
+            # в таблице только ФИО — подпись с группой, чтобы тёзки не путались
+            if rows and win.winfo_exists() and combo.get() == (item[1] or ""):
+                combo.set(refcache.students.label(*rows[0]))
+        self.runner.submit(fetch_all, "SELECT s.full_name, s.class FROM grade_reports gr JOIN students s ON s.id = gr.student_id WHERE gr.id=%s",
+                           (gid,), on_done=show_student)
         tk.Label(win, text="Предмет:").grid(row=1,column=0); ent_sub = tk.Entry(win); ent_sub.grid(row=1,column=1); ent_sub.insert(0,item[2] or "")
         tk.Label(win, text="Семестр 1:").grid(row=2,column=0); ent_s1 = tk.Entry(win); ent_s1.grid(row=2,column=1); ent_s1.insert(0,item[3] or "")
         tk.Label(win, text="Семестр 2:").grid(row=3,column=0); ent_s2 = tk.Entry(win); ent_s2.grid(row=3,column=1); ent_s2.insert(0,item[4] or "")
         def do():
-            student_name = combo.get().strip(); student_id = None
-            if student_name:
-                row = fetch_all("SELECT id FROM students WHERE full_name=%s", (student_name,))
-                if row: student_id = row[0][0]
-            s1 = ent_s1.get().strip(); s2 = ent_s2.get().strip()
-            s1v = int(s1) if s1.isdigit() else None
-            s2v = int(s2) if s2.isdigit() else None
-            final = None
-            if s1v is not None and s2v is not None:
-                final = round((s1v + s2v) / 2)
-            elif s1v is not None:
-                final = s1v
-            elif s2v is not None:
-                final = s2v
-            execute("UPDATE grade_reports SET student_id=%s, subject=%s, s1=%s, s2=%s, final_grade=%s WHERE id=%s", (student_id, ent_sub.get().strip(), s1v, s2v, final, gid))
-            win.destroy(); self.grade_load()
+            values = (combo.get(), ent_sub.get(), ent_s1.get(), ent_s2.get())
+            self.save_in_background(win, lambda: services.update_grade(gid, *values, old_subject=item[2], seen=seen),
+                                    lambda _: self.grades_view.row_updated(gid))
         tk.Button(win, text="Сохранить", command=do).grid(row=4,column=0,columnspan=2,pady=8)
 
     def grade_delete(self):
@@ -813,21 +1049,20 @@ class AdminApp:
         sel = self.grades_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         if not messagebox.askyesno("Подтвердить","Удалить запись?"): return
-        gid = self.grades_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM grade_reports WHERE id=%s", (gid,))
-        self.grade_load()
+        gid, subject = self.grades_tree.item(sel[0])['values'][0], self.grades_tree.item(sel[0])['values'][2]
+        self.runner.submit_write(services.delete_grade, gid, subject, on_done=lambda _: self.grades_view.row_deleted(gid))
 
     # ---------------- exam_protocols tab ----------------
-    def create_exam_protocols_tab(self):
+    def create_exam_protocols_tab(self, tab):
         """Создать вкладку Протоколы экзаменов."""
-        tab = ttk.Frame(self.tab_control); self.tab_control.add(tab, text="Протоколы экзаменов"); self.tabs['exam_protocols'] = tab
         cols = ("id", "teacher", "subject", "class", "date", "file")
-        tree = ttk.Treeview(tab, columns=cols, show="headings", height=14)
         headers = ["ID","Педагог","Предмет","Класс","Дата","Файл"]
-        for c, h in zip(cols, headers):
-            tree.heading(c, text=h); tree.column(c, width=140)
-        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.exam_tree = tree
+        view = PagedTree(tab, cols, headers, [140] * len(cols), runner=self.runner, height=14, **paging.TABS['exam_protocols'])
+        self.add_filter_bar(tab, view, 'exam_protocols')
+        view.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.exam_view = view
+        self.views['exam_protocols'] = view
+        self.exam_tree = view.tree
         f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
         tk.Button(f, text="Добавить", command=self.exam_add, width=14).pack(side=tk.LEFT, padx=5)
         tk.Button(f, text="Редактировать", command=self.exam_edit, width=14).pack(side=tk.LEFT, padx=5)
@@ -837,39 +1072,26 @@ class AdminApp:
         self.exam_load()
 
     def exam_load(self):
-        """Загрузить протоколы экзаменов."""
-        for i in self.exam_tree.get_children(): self.exam_tree.delete(i)
-        rows = fetch_all("""
-            SELECT ep.id, t.full_name, ep.subject, ep.class, ep.date, ep.file_path
-            FROM exam_protocols ep
-            LEFT JOIN teachers t ON t.id = ep.teacher_id
-            ORDER BY ep.id DESC
-        """)
-        for r in rows: self.exam_tree.insert("", tk.END, values=r)
+        """Загрузить первую страницу протоколов экзаменов."""
+        self.exam_view.reload()
 
     def exam_add(self):
         """Окно добавления протокола экзамена."""
         win = tk.Toplevel(self.master); win.title("Добавить протокол")
-        tk.Label(win, text="Педагог:").grid(row=0,column=0); teachers = [r[1] for r in fetch_all("SELECT id, full_name FROM teachers")]; combo = ttk.Combobox(win, values=teachers); combo.grid(row=0,column=1)
+        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); self.fill_combo(combo, refcache.teachers)
         tk.Label(win, text="Предмет:").grid(row=1,column=0); ent_sub = tk.Entry(win); ent_sub.grid(row=1,column=1)
         tk.Label(win, text="Класс:").grid(row=2,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=2,column=1)
         tk.Label(win, text="Дата (YYYY-MM-DD):").grid(row=3,column=0); ent_date = tk.Entry(win); ent_date.grid(row=3,column=1)
         tk.Label(win, text="Файл (необязательно):").grid(row=4,column=0); ent_file = tk.Entry(win); ent_file.grid(row=4,column=1)
+        chosen = {'path': None}
         def browse():
             p = filedialog.askopenfilename(filetypes=[("PDF files","*.pdf"),("Word files","*.docx"),("All files","*.*")])
-            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p))
+            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p)); chosen['path'] = p
         tk.Button(win, text="Обзор...", command=browse).grid(row=4,column=2)
         def do():
-            teacher_name = combo.get().strip(); teacher_id = None
-            if teacher_name:
-                row = fetch_all("SELECT id FROM teachers WHERE full_name=%s", (teacher_name,))
-                if row: teacher_id = row[0][0]
-            d = ent_date.get().strip()
-            if d:
-                try: datetime.strptime(d, "%Y-%m-%d")
-                except: messagebox.showerror("Ошибка","Дата в формате YYYY-MM-DD"); return
-            execute("INSERT INTO exam_protocols (teacher_id, subject, class, date, file_path) VALUES (%s,%s,%s,%s,%s)", (teacher_id, ent_sub.get().strip(), ent_cl.get().strip(), d if d else None, ent_file.get().strip() or None))
-            win.destroy(); self.exam_load()
+            values = (combo.get(), ent_sub.get(), ent_cl.get(), ent_date.get(), ent_file.get(), chosen['path'])
+            self.save_in_background(win, lambda: services.add_exam(*values),
+                                    lambda new_id: self.exam_view.row_inserted(new_id))
         tk.Button(win, text="Сохранить", command=do).grid(row=5,column=0,columnspan=3,pady=8)
 
     def exam_edit(self):
@@ -877,28 +1099,23 @@ class AdminApp:
         sel = self.exam_tree.selection()
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         item = self.exam_tree.item(sel[0])['values']; eid=item[0]
+        seen = self.seen('exam_protocols', eid)
         win = tk.Toplevel(self.master); win.title("Редактировать протокол")
-        teachers = [r[1] for r in fetch_all("SELECT id, full_name FROM teachers")]
-        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win, values=teachers); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        tk.Label(win, text="Педагог:").grid(row=0,column=0); combo = ttk.Combobox(win); combo.grid(row=0,column=1); combo.set(item[1] or "")
+        self.fill_combo(combo, refcache.teachers)
         tk.Label(win, text="Предмет:").grid(row=1,column=0); ent_sub = tk.Entry(win); ent_sub.grid(row=1,column=1); ent_sub.insert(0,item[2] or "")
         tk.Label(win, text="Класс:").grid(row=2,column=0); ent_cl = tk.Entry(win); ent_cl.grid(row=2,column=1); ent_cl.insert(0,item[3] or "")
         tk.Label(win, text="Дата (YYYY-MM-DD):").grid(row=3,column=0); ent_date = tk.Entry(win); ent_date.grid(row=3,column=1); ent_date.insert(0,item[4] or "")
         tk.Label(win, text="Файл:").grid(row=4,column=0); ent_file = tk.Entry(win); ent_file.grid(row=4,column=1); ent_file.insert(0,item[5] or "")
+        chosen = {'path': None}
         def browse():
             p = filedialog.askopenfilename(filetypes=[("PDF files","*.pdf"),("Word files","*.docx"),("All files","*.*")])
-            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p))
+            if p: ent_file.delete(0,tk.END); ent_file.insert(0, os.path.basename(p)); chosen['path'] = p
         tk.Button(win, text="Обзор...", command=browse).grid(row=4,column=2)
         def do():
-            teacher_name = combo.get().strip(); teacher_id = None
-            if teacher_name:
-                row = fetch_all("SELECT id FROM teachers WHERE full_name=%s", (teacher_name,))
-                if row: teacher_id = row[0][0]
-            d = ent_date.get().strip()
-            if d:
-                try: datetime.strptime(d, "%Y-%m-%d")
-                except: messagebox.showerror("Ошибка","Дата в формате YYYY-MM-DD"); return
-            execute("UPDATE exam_protocols SET teacher_id=%s, subject=%s, class=%s, date=%s, file_path=%s WHERE id=%s", (teacher_id, ent_sub.get().strip(), ent_cl.get().strip(), d if d else None, ent_file.get().strip() or None, eid))
-            win.destroy(); self.exam_load()
+            values = (combo.get(), ent_sub.get(), ent_cl.get(), ent_date.get(), ent_file.get(), chosen['path'])
+            self.save_in_background(win, lambda: services.update_exam(eid, *values, seen=seen),
+                                    lambda _: self.exam_view.row_updated(eid))
         tk.Button(win, text="Сохранить", command=do).grid(row=5,column=0,columnspan=3,pady=8)
 
     def exam_delete(self):
@@ -907,8 +1124,7 @@ class AdminApp:
         if not sel: messagebox.showwarning("Ошибка","Выберите строку"); return
         if not messagebox.askyesno("Подтвердить","Удалить протокол?"): return
         eid = self.exam_tree.item(sel[0])['values'][0]
-        execute("DELETE FROM exam_protocols WHERE id=%s", (eid,))
-        self.exam_load()
+        self.runner.submit_write(services.delete_exam, eid, on_done=lambda _: self.exam_view.row_deleted(eid))
 
     def exam_download(self):
         """Скачать файл протокола (показать диалог сохранения)."""
@@ -919,25 +1135,96 @@ class AdminApp:
         if not file_name:
             messagebox.showinfo("Инфо", "Файл не указан")
             return
-        dest = filedialog.asksaveasfilename(initialfile=file_name, defaultextension=os.path.splitext(file_name)[1] or "")
-        if dest:
-            try:
-                with open(dest, "wb") as f:
-                    f.write(b"")  # заглушка
-                messagebox.showinfo("Готово", "Файл сохранён")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {e}")
+        self.download_file("exam_protocols", item[0], str(file_name))
+
+    # ---------------- analytics tab ----------------
+    def create_analytics_tab(self, tab):
+        """Создать вкладку Статистика: сводка по группам и предметам, распределение оценок, слабейшие ученики."""
+        f = tk.Frame(tab); f.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(f, text="Группа:").pack(side=tk.LEFT, padx=(5, 2))
+        self.stats_class = ttk.Combobox(f, width=16); self.stats_class.pack(side=tk.LEFT)
+        tk.Label(f, text="Предмет:").pack(side=tk.LEFT, padx=(5, 2))
+        self.stats_subject = ttk.Combobox(f, width=24); self.stats_subject.pack(side=tk.LEFT)
+        for combo in (self.stats_class, self.stats_subject):
+            combo.bind("<<ComboboxSelected>>", lambda e: self.stats_load())
+        tk.Button(f, text="Показать", command=self.stats_load, width=14).pack(side=tk.LEFT, padx=5)
+        tk.Button(f, text="Обновить", command=lambda: self.stats_load(refresh=True), width=14).pack(side=tk.LEFT, padx=5)
+
+        cols = ("class", "subject", "count", "s1", "s2", "final", "pass")
+        self.stats_tree = ttk.Treeview(tab, columns=cols, show="headings", height=10)
+        for c, h, w in zip(cols, ["Группа","Предмет","Оценок","Ср. сем. 1","Ср. сем. 2","Ср. итог","Успевающих"],
+                           (100, 220, 80, 90, 90, 90, 100)):
+            self.stats_tree.heading(c, text=h); self.stats_tree.column(c, width=w)
+        self.stats_tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        bottom = tk.Frame(tab); bottom.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.stats_hist = ttk.Treeview(bottom, columns=("grade", "count", "bar"), show="headings", height=7)
+        for c, h, w in (("grade", "Итог", 60), ("count", "Кол-во", 80), ("bar", "Распределение", 260)):
+            self.stats_hist.heading(c, text=h); self.stats_hist.column(c, width=w)
+        self.stats_hist.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.stats_weak = ttk.Treeview(bottom, columns=("name", "class", "avg", "count"), show="headings", height=7)
+        for c, h, w in (("name", "Слабейшие ученики", 220), ("class", "Группа", 80), ("avg", "Ср. итог", 80), ("count", "Предметов", 80)):
+            self.stats_weak.heading(c, text=h); self.stats_weak.column(c, width=w)
+        self.stats_weak.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        self.stats_status = tk.Label(tab, anchor="w")
+        self.stats_status.pack(fill=tk.X, padx=5)
+
+        def fill(values):
+            classes, subjects = values
+            self.stats_class.config(values=[""] + classes)
+            self.stats_subject.config(values=[""] + subjects)
+        self.runner.submit(lambda: (analytics.classes(), analytics.subjects()), on_done=fill)
+        self.stats_load()
+
+    def stats_load(self, refresh=False):
+        """Показать статистику выбранного среза (из кэша или запросами GROUP BY в фоне)."""
+        class_name, subject = self.stats_class.get().strip(), self.stats_subject.get().strip()
+        self.stats_status.config(text="Загрузка…")
+        self.runner.submit(analytics.cache.get, class_name, subject, refresh=refresh, key='analytics',
+                           on_done=self.stats_show)
+
+    def stats_show(self, stats):
+        """Заполнить таблицы вкладки Статистика."""
+        def num(v, fmt="{:.2f}"):
+            return "" if v is None else fmt.format(float(v))
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for cls, subject, count, s1, s2, final, passed in stats['summary']:
+            self.stats_tree.insert("", tk.END, values=(cls or "", subject or "", count, num(s1), num(s2), num(final),
+                                                       num(passed, "{:.0%}")))
+        self.stats_hist.delete(*self.stats_hist.get_children())
+        top = max((count for _, count in stats['histogram']), default=0)
+        for grade, count in stats['histogram']:
+            self.stats_hist.insert("", tk.END, values=(grade, count, "█" * max(1, round(40 * count / top))))
+        self.stats_weak.delete(*self.stats_weak.get_children())
+        for name, cls, avg, count in stats['weakest']:
+            self.stats_weak.insert("", tk.END, values=(name, cls or "", num(avg), count))
+        pct = ", ".join(f"P{p}: {'—' if v is None else v}" for p, v in stats['percentiles'].items())
+        self.stats_status.config(text=f"Перцентили итоговой оценки — {pct}; успевающих: {num(stats['pass_rate'], '{:.0%}')}")
 
 # ---------- Запуск приложения ----------
 if __name__ == "__main__":
-    # Создать таблицы при старте, если нужно
-    try:
-        create_tables_if_not_exist()
-    except Exception as e:
-        # Если не удалось подключиться к БД — показать ошибку и выйти
-        print("Ошибка при инициализации БД:", e)
-        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    startup = StartupTimer()
+    snap = snapshot.load() if SNAPSHOT_CONFIG['enabled'] else None
+    # Привести схему БД к текущей версии (если уже актуальна — один запрос).
+    # Снимок с актуальной версией схемы — окно показывается сразу, проверка идёт в фоне
+    schema_ready = snap is None or snap.schema < MIGRATIONS[-1][0]
+    if schema_ready:
+        try:
+            migrate()
+        except Exception as e:
+            # Если не удалось подключиться к БД — показать ошибку и выйти
+            print("Ошибка при инициализации БД:", e)
+            sys.exit(1)
+        startup.mark("БД")
 
     root = tk.Tk()
-    app = AdminApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = AdminApp(root, startup, snap, schema_ready)
+    if not schema_ready:
+        app.runner.submit(migrate, on_done=app.schema_checked, on_error=app.show_db_error)
+    try:
+        root.mainloop()
+    finally:
+        app.runner.shutdown()
+        doctext.close()
+        close_pool()
\ No newline at end of file
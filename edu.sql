@@ -30,6 +30,7 @@ CREATE TABLE `class_plans` (
   `file_path` text,
   PRIMARY KEY (`id`),
   KEY `teacher_id` (`teacher_id`),
+  KEY `ix_class_plans_class_year` (`class`,`year`),
   CONSTRAINT `class_plans_ibfk_1` FOREIGN KEY (`teacher_id`) REFERENCES `teachers` (`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -60,6 +61,7 @@ CREATE TABLE `exam_protocols` (
   `file_path` text,
   PRIMARY KEY (`id`),
   KEY `teacher_id` (`teacher_id`),
+  KEY `ix_exam_protocols_class_date` (`class`,`date`),
   CONSTRAINT `exam_protocols_ibfk_1` FOREIGN KEY (`teacher_id`) REFERENCES `teachers` (`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -89,6 +91,7 @@ CREATE TABLE `grade_reports` (
   `s1` int DEFAULT NULL,
   `s2` int DEFAULT NULL,
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_grade_reports_student_subject` (`student_id`,`subject`),
   KEY `student_id` (`student_id`),
   CONSTRAINT `grade_reports_ibfk_1` FOREIGN KEY (`student_id`) REFERENCES `students` (`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -228,6 +231,7 @@ CREATE TABLE `ro_sections` (
   `title` varchar(255) DEFAULT NULL,
   `hours` int DEFAULT NULL,
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_ro_sections_title` (`title`),
   KEY `module_id` (`module_id`),
   CONSTRAINT `ro_sections_ibfk_1` FOREIGN KEY (`module_id`) REFERENCES `module` (`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=3 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -260,7 +264,8 @@ CREATE TABLE `social_passport` (
   `disabilities` int DEFAULT NULL,
   `orphaned` int DEFAULT NULL,
   `many_children` int DEFAULT '0',
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `ix_social_passport_class_year` (`class`,`year`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -286,7 +291,9 @@ CREATE TABLE `students` (
   `full_name` varchar(255) DEFAULT NULL,
   `birthdate` date DEFAULT NULL,
   `class` varchar(20) DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_students_name_class` (`full_name`,`class`),
+  KEY `ix_students_class` (`class`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -311,7 +318,8 @@ CREATE TABLE `teachers` (
   `id` int NOT NULL AUTO_INCREMENT,
   `full_name` varchar(255) DEFAULT NULL,
   `position` varchar(255) DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_teachers_full_name` (`full_name`)
 ) ENGINE=InnoDB AUTO_INCREMENT=2 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -0,0 +1,151 @@
+# exporter.py
+# Выгрузка вкладки с её текущим фильтром в CSV или XLSX потоком.
+#
+# Строки читаются пачками из небуферизованного курсора (db.iter_rows) и сразу
+# пишутся в файл, поэтому память не зависит от размера таблицы. Файл пишется
+# под временным именем *.part и переименовывается только после успеха.
+
+import csv
+import os
+import time
+
+from db import iter_rows
+import paging
+
+BATCH_ROWS = 2000
+# как часто (строк) сообщать ход выгрузки и проверять отмену
+PROGRESS_EVERY = 5000
+# строк на листе XLSX (предел Excel 1 048 576 вместе с заголовком)
+XLSX_SHEET_ROWS = 1048575
+
+# заголовки столбцов в порядке полей paging.TABS
+HEADERS = {
+    'lessons': ["ID", "Раздел", "№", "Критерии", "Часы", "Тип"],
+    'teachers': ["ID", "ФИО", "Должность"],
+    'students': ["ID", "ФИО", "Дата рожд.", "Группа"],
+    'class_plans': ["ID", "Педагог", "Группа", "Год", "Файл"],
+    'social_passport': ["ID", "Класс", "Год", "Всего", "Полные семьи", "Малоимущие", "Инвалидность", "Сироты", "Многодетные"],
+    'grade_reports': ["ID", "Ученик", "Предмет", "Семестр 1", "Семестр 2", "Итог"],
+    'exam_protocols': ["ID", "Педагог", "Предмет", "Класс", "Дата", "Файл"],
+}
+
+
+class ExportError(Exception):
+    """Выгрузку нельзя выполнить (формат файла, нет openpyxl)."""
+
+
+class ExportCancelled(Exception):
+    """Выгрузка прервана пользователем."""
+
+
+class ExportReport:
+    """Итог выгрузки: сколько строк записано из скольких и за какое время."""
+
+    def __init__(self, tab, path):
+        self.tab = tab
+        self.path = path
+        self.rows = 0
+        self.total = None
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """Пропускная способность, строк в секунду."""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+# ---------- запись файлов ----------
+class _CsvWriter:
+    # BOM и «;» — чтобы Excel открывал файл с кириллицей без мастера импорта
+    def __init__(self, path, header):
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file, delimiter=";")
+        self._writer.writerow(header)
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def finish(self):
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+
+
+class _XlsxWriter:
+    # режим write_only: строки сразу уходят во временный файл, а не в память
+    def __init__(self, path, header):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ExportError("Для выгрузки XLSX установите openpyxl: pip install openpyxl")
+        self._path = path
+        self._header = header
+        self._book = openpyxl.Workbook(write_only=True)
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheet = self._book.create_sheet(f"Лист{len(self._book.worksheets) + 1}")
+        self._sheet.append(self._header)
+        self._left = XLSX_SHEET_ROWS
+
+    def write(self, row):
+        if not self._left:
+            self._new_sheet()
+        self._sheet.append(row)
+        self._left -= 1
+
+    def finish(self):
+        self._book.save(self._path)
+
+    def discard(self):
+        self._book.close()
+
+
+WRITERS = {".csv": _CsvWriter, ".xlsx": _XlsxWriter}
+
+
+def writer_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in WRITERS:
+        raise ExportError(f"Неподдерживаемый формат выгрузки: {ext or path} (нужен .csv или .xlsx)")
+    return WRITERS[ext]
+
+
+# ---------- выгрузка ----------
+def export(tab, path, conditions=paging.NO_FILTER, progress=None, cancel=None):
+    """Выгрузить вкладку tab (ключ paging.TABS) с фильтром conditions в path; вернуть ExportReport.
+
+    progress(строк, всего, секунд) вызывается каждые PROGRESS_EVERY строк и в конце
+    (в потоке выгрузки); cancel — threading.Event для отмены.
+    """
+    make = writer_for(path)
+    query = paging.KeysetQuery(**paging.TABS[tab])
+    report = ExportReport(tab, path)
+    started = time.perf_counter()
+    report.total = query.count(conditions)
+    part = path + ".part"
+    out = make(part, HEADERS[tab])
+    rows = iter_rows(*query.scan(conditions), batch=BATCH_ROWS)
+    try:
+        for row in rows:
+            out.write(row)
+            report.rows += 1
+            if report.rows % PROGRESS_EVERY == 0:
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled("Выгрузка прервана")
+                if progress:
+                    progress(report.rows, report.total, time.perf_counter() - started)
+        out.finish()
+    except BaseException:
+        out.discard()
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    finally:
+        rows.close()
+    os.replace(part, path)
+    report.elapsed = time.perf_counter() - started
+    if progress:
+        progress(report.rows, report.total, report.elapsed)
+    return report
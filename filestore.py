@@ -0,0 +1,162 @@
+# filestore.py
+# Хранилище файлов планов и протоколов в MySQL: по хэшу содержимого, кусками.
+#
+# Файл никогда не читается в память целиком: SHA-256 считается потоково,
+# содержимое пишется и читается кусками CHUNK_SIZE байт (таблица file_chunks).
+# Одинаковые файлы хранятся один раз.
+
+import hashlib
+import mimetypes
+import os
+
+import mysql.connector
+
+from db import connection, execute, fetch_all, transaction
+from config import FILESTORE_CONFIG
+
+CHUNK_SIZE = FILESTORE_CONFIG['chunk_kb'] * 1024
+
+
+class FileIntegrityError(Exception):
+    """Содержимое файла не совпало с сохранённым хэшем."""
+
+
+def _read_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def file_digest(path):
+    """SHA-256 и размер файла (потоково)."""
+    h = hashlib.sha256()
+    size = 0
+    for block in _read_chunks(path):
+        h.update(block)
+        size += len(block)
+    return h.hexdigest(), size
+
+
+def exists(sha256):
+    return bool(fetch_all("SELECT 1 FROM files WHERE sha256=%s", (sha256,)))
+
+
+def put_file(path):
+    """Сохранить файл в хранилище и вернуть (sha256, размер, mime); повторная загрузка не пишет данные."""
+    sha256, size = file_digest(path)
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if exists(sha256):
+        return sha256, size, mime
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            h = hashlib.sha256()
+            for seq, block in enumerate(_read_chunks(path)):
+                h.update(block)
+                cur.execute("INSERT INTO file_chunks (sha256, seq, data) VALUES (%s, %s, %s)", (sha256, seq, block))
+            if h.hexdigest() != sha256:
+                # файл изменился между подсчётом хэша и загрузкой
+                conn.rollback()
+                raise FileIntegrityError(f"Файл {os.path.basename(path)} изменился во время загрузки")
+            cur.execute("INSERT INTO files (sha256, size, mime) VALUES (%s, %s, %s)", (sha256, size, mime))
+            conn.commit()
+        except mysql.connector.IntegrityError:
+            # тот же файл параллельно загрузил другой пользователь
+            conn.rollback()
+        finally:
+            cur.close()
+    return sha256, size, mime
+
+
+def get_file(sha256, dest):
+    """Выгрузить файл в dest по кускам, проверяя хэш; при несовпадении dest удаляется."""
+    meta = fetch_all("SELECT size FROM files WHERE sha256=%s", (sha256,))
+    if not meta:
+        raise FileNotFoundError("Файл отсутствует в хранилище")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest, "wb") as out, connection() as conn:
+            cur = conn.cursor()
+            try:
+                seq = 0
+                while True:
+                    cur.execute("SELECT data FROM file_chunks WHERE sha256=%s AND seq=%s", (sha256, seq))
+                    row = cur.fetchone()
+                    if row is None:
+                        break
+                    block = bytes(row[0])
+                    h.update(block)
+                    size += len(block)
+                    out.write(block)
+                    seq += 1
+            finally:
+                cur.close()
+        if h.hexdigest() != sha256 or size != meta[0][0]:
+            raise FileIntegrityError("Содержимое файла в хранилище повреждено")
+    except Exception:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise
+    return size
+
+
+def release(sha256):
+    """Удалить файл из хранилища, если на него больше не ссылается ни один план или протокол."""
+    if not sha256:
+        return
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT sha256 FROM files WHERE sha256=%s FOR UPDATE", (sha256,))
+            if cur.fetchone() is None:
+                conn.rollback()
+                return
+            cur.execute("""
+                SELECT (SELECT COUNT(*) FROM class_plans WHERE file_sha256=%s)
+                     + (SELECT COUNT(*) FROM exam_protocols WHERE file_sha256=%s)
+            """, (sha256, sha256))
+            if cur.fetchone()[0] == 0:
+                cur.execute("DELETE FROM file_chunks WHERE sha256=%s", (sha256,))
+                cur.execute("DELETE FROM file_text WHERE sha256=%s", (sha256,))
+                cur.execute("DELETE FROM files WHERE sha256=%s", (sha256,))
+            conn.commit()
+        finally:
+            cur.close()
+
+
+# ---------- привязка к записям планов и протоколов ----------
+def attach(table, row_id, file_name, path=None):
+    """Обновить файл записи: path — новый файл с диска, иначе только имя (пустое имя — отвязать файл).
+
+    Вернуть (sha256, размер, mime) загруженного файла или None.
+    """
+    with transaction():
+        old = fetch_all(f"SELECT file_sha256 FROM {table} WHERE id=%s", (row_id,))
+        old = old[0][0] if old else None
+        stored = None
+        if path:
+            stored = sha256, size, mime = put_file(path)
+            execute(f"UPDATE {table} SET file_path=%s, file_sha256=%s, file_size=%s, file_mime=%s WHERE id=%s",
+                    (file_name or os.path.basename(path), sha256, size, mime, row_id))
+        elif not file_name:
+            sha256 = None
+            execute(f"UPDATE {table} SET file_path=NULL, file_sha256=NULL, file_size=NULL, file_mime=NULL WHERE id=%s", (row_id,))
+        else:
+            execute(f"UPDATE {table} SET file_path=%s WHERE id=%s", (file_name, row_id))
+            return
+        if old and old != sha256:
+            release(old)
+    return stored
+
+
+def delete_row(table, row_id):
+    """Удалить запись и её файл, если он больше нигде не используется."""
+    with transaction():
+        old = fetch_all(f"SELECT file_sha256 FROM {table} WHERE id=%s", (row_id,))
+        execute(f"DELETE FROM {table} WHERE id=%s", (row_id,))
+        if old and old[0][0]:
+            release(old[0][0])
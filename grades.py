@@ -0,0 +1,167 @@
+# grades.py
+# Правило расчёта итоговой оценки по семестрам, его пересчёт в БД и ведомость
+# группы (все ученики × предметы) для ввода оценок таблицей.
+#
+# Правило задано здесь дважды — для Python (одна строка в диалоге, импорт)
+# и как SQL-выражение (массовый пересчёт); обе формы дают одинаковый результат.
+
+from db import BACKEND, connection, fetch_all, statement
+import changelog
+
+# минимальная итоговая оценка, считающаяся положительной
+PASS_GRADE = 3
+# строк в одном INSERT ... ON DUPLICATE KEY UPDATE при сохранении ведомости
+SHEET_BATCH = 500
+
+
+def final_grade(s1, s2):
+    """Итоговая оценка: среднее s1 и s2 (половина округляется вверх), либо единственная выставленная."""
+    if s1 is not None and s2 is not None:
+        return (s1 + s2 + 1) // 2
+    if s1 is not None:
+        return s1
+    return s2
+
+
+def final_grade_sql(s1="s1", s2="s2"):
+    """То же правило SQL-выражением над столбцами s1 и s2."""
+    return f"COALESCE(({s1} + {s2} + 1) DIV 2, {s1}, {s2})"
+
+
+def recompute(class_name=None, subject=None):
+    """Пересчитать итоговые оценки одним UPDATE в одной транзакции; вернуть число изменённых строк.
+
+    class_name и subject сужают пересчёт до группы и/или предмета, без них — вся таблица.
+    """
+    where, params = [], []
+    if class_name:
+        where.append("s.class = %s")
+        params.append(class_name)
+    if subject:
+        where.append("gr.subject = %s")
+        params.append(subject)
+    expr = final_grade_sql('gr.s1', 'gr.s2')
+    # без фильтра по группе пересчитываются и оценки без ученика
+    join = "JOIN" if class_name else "LEFT JOIN"
+    sql = f"UPDATE grade_reports gr {join} students s ON s.id = gr.student_id SET gr.final_grade = {expr}"
+    # пишутся только строки с другим итогом: SQLite иначе считает в rowcount все совпавшие
+    changed = f"NOT (gr.final_grade <=> {expr})"
+    if BACKEND == "sqlite":
+        # в SQLite нет UPDATE ... JOIN: группа подключается через UPDATE ... FROM
+        sql = f"UPDATE grade_reports AS gr SET final_grade = {expr}"
+        changed = f"gr.final_grade IS NOT {expr}"
+        if class_name:
+            sql += " FROM students s"
+            where.insert(0, "s.id = gr.student_id")
+    where.append(changed)
+    sql += " WHERE " + " AND ".join(where)
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            with changelog.bulk(cur, "grade_reports"):
+                cur.execute(sql, tuple(params))
+                changed = cur.rowcount
+            conn.commit()
+            return changed
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+# ---------- ведомость группы ----------
+_SHEET_SQL = statement("""
+    SELECT s.id, s.full_name, gr.subject, gr.s1, gr.s2, gr.final_grade
+    FROM students s LEFT JOIN grade_reports gr ON gr.student_id = s.id
+    WHERE s.class = %s
+    ORDER BY s.full_name, s.id
+""")
+
+
+def load_sheet(class_name):
+    """Ведомость группы одним запросом: ([(id, ФИО)], [предметы], {(id ученика, предмет): (s1, s2, итог)})."""
+    students, subjects, cells = [], set(), {}
+    for sid, name, subject, s1, s2, final in fetch_all(_SHEET_SQL, (class_name,)):
+        if not students or students[-1][0] != sid:
+            students.append((sid, name))
+        if subject is not None:
+            subjects.add(subject)
+            cells[(sid, subject)] = (s1, s2, final)
+    return students, sorted(subjects), cells
+
+
+# уникальный ключ ведомости (schema.INDEXES); при повторах в данных ensure_indexes
+# создаёт вместо него обычный индекс, и upsert по ключу невозможен
+UNIQUE_KEY = "uq_grade_reports_student_subject"
+_has_unique_key = False
+
+
+def _unique_key_exists(cur):
+    if BACKEND == "sqlite":
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s", (UNIQUE_KEY,))
+    else:
+        cur.execute("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'grade_reports' AND INDEX_NAME = %s LIMIT 1
+        """, (UNIQUE_KEY,))
+    return bool(cur.fetchall())
+
+
+def _upsert(cur, chunk):
+    marks = ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))
+    cur.execute(f"INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES {marks} "
+                "ON DUPLICATE KEY UPDATE s1=VALUES(s1), s2=VALUES(s2), final_grade=VALUES(final_grade)",
+                tuple(v for row in chunk for v in row))
+
+
+def _update_then_insert(cur, chunk):
+    """Запись без уникального ключа: существующие пары — UPDATE (все повторы), остальные — INSERT."""
+    ids = sorted({row[0] for row in chunk})
+    cur.execute(f"SELECT student_id, subject FROM grade_reports WHERE student_id IN ({', '.join(['%s'] * len(ids))}) "
+                "FOR UPDATE", tuple(ids))
+    present = set(cur.fetchall())
+    updates = [(s1, s2, final, sid, subject) for sid, subject, s1, s2, final in chunk if (sid, subject) in present]
+    inserts = [row for row in chunk if (row[0], row[1]) not in present]
+    if updates:
+        cur.executemany("UPDATE grade_reports SET s1=%s, s2=%s, final_grade=%s WHERE student_id=%s AND subject=%s",
+                        updates)
+    if inserts:
+        marks = ", ".join(["(%s, %s, %s, %s, %s)"] * len(inserts))
+        cur.execute(f"INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES {marks}",
+                    tuple(v for row in inserts for v in row))
+
+
+def save_sheet(changes):
+    """Записать ячейки ведомости [(id ученика, предмет, s1, s2)] в одной транзакции; вернуть их число.
+
+    Заполненные ячейки пишутся пакетным upsert по уникальному ключу (student_id, subject)
+    с итогом по final_grade, ячейки без обеих оценок удаляются. Пока ключа нет (в данных
+    повторы) — UPDATE существующих пар и INSERT остальных.
+    """
+    global _has_unique_key
+    upserts = [(sid, subject, s1, s2, final_grade(s1, s2))
+               for sid, subject, s1, s2 in changes if s1 is not None or s2 is not None]
+    deletes = [(sid, subject) for sid, subject, s1, s2 in changes if s1 is None and s2 is None]
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            if upserts and not _has_unique_key:
+                # ключ, однажды найденный, не удаляется — проверка до первого успеха
+                _has_unique_key = _unique_key_exists(cur)
+            write = _upsert if _has_unique_key else _update_then_insert
+            with changelog.bulk(cur, "grade_reports"):
+                for i in range(0, len(upserts), SHEET_BATCH):
+                    write(cur, upserts[i:i + SHEET_BATCH])
+                for i in range(0, len(deletes), SHEET_BATCH):
+                    chunk = deletes[i:i + SHEET_BATCH]
+                    marks = ", ".join(["(%s, %s)"] * len(chunk))
+                    cur.execute(f"DELETE FROM grade_reports WHERE (student_id, subject) IN ({marks})",
+                                tuple(v for row in chunk for v in row))
+            conn.commit()
+            return len(changes)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
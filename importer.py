@@ -0,0 +1,295 @@
+# importer.py
+# Пакетный импорт учеников и оценок из CSV/XLSX.
+#
+# Файл читается потоково в два прохода: сначала собираются ФИО для одного
+# пакетного поиска id, затем строки проверяются и пишутся executemany
+# пачками в одной транзакции.
+
+import csv
+import os
+import time
+from datetime import date, datetime
+
+from db import connection, fetch_all, after_commit
+from grades import final_grade
+import refcache
+import passport
+import changelog
+
+BATCH_SIZE = 1000
+PREVIEW_ROWS = 50
+LOOKUP_CHUNK = 1000
+
+# допустимые заголовки столбцов (без учёта регистра)
+FIELD_ALIASES = {
+    'full_name': ('full_name', 'фио', 'ученик', 'студент'),
+    'birthdate': ('birthdate', 'дата рождения', 'дата рожд.'),
+    'class': ('class', 'группа', 'класс'),
+    'subject': ('subject', 'предмет'),
+    's1': ('s1', 'семестр 1'),
+    's2': ('s2', 'семестр 2'),
+}
+
+REQUIRED = {
+    'students': ('full_name',),
+    'grades': ('full_name', 'subject'),
+}
+
+
+class ImportFileError(Exception):
+    """Файл нельзя импортировать целиком (формат, заголовки)."""
+
+
+class ImportReport:
+    """Итог импорта или пробного прогона: счётчики, предпросмотр, ошибки по строкам."""
+
+    def __init__(self, kind, path, dry_run):
+        self.kind = kind
+        self.path = path
+        self.dry_run = dry_run
+        self.total = 0
+        self.valid = 0
+        self.inserted = 0
+        self.preview = []
+        self.errors = []  # (номер строки, сообщение)
+        self.classes = set()  # группы загруженных учеников
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """Пропускная способность, строк в секунду."""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+# ---------- чтение файлов ----------
+def _map_header(header):
+    mapping = {}
+    for i, name in enumerate(header):
+        key = str(name or "").strip().lower()
+        for field, aliases in FIELD_ALIASES.items():
+            if key in aliases and field not in mapping:
+                mapping[field] = i
+    return mapping
+
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _iter_xlsx(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFileError("Для импорта XLSX установите openpyxl: pip install openpyxl")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_records(path, kind):
+    """Потоково выдавать (номер строки, dict поля→значение) из CSV или XLSX."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        rows = _iter_xlsx(path)
+    elif ext in (".csv", ".txt"):
+        rows = _iter_csv(path)
+    else:
+        raise ImportFileError(f"Неподдерживаемый формат файла: {ext or path}")
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError("Файл пуст")
+    mapping = _map_header(header)
+    missing = [f for f in REQUIRED[kind] if f not in mapping]
+    if missing:
+        raise ImportFileError("Нет обязательных столбцов: " + ", ".join(missing))
+    for line_no, row in enumerate(rows, start=2):
+        if not any(v not in (None, "") for v in row):
+            continue
+        yield line_no, {f: (row[i] if i < len(row) else None) for f, i in mapping.items()}
+
+
+# ---------- разбор значений ----------
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def _grade(value):
+    if value is None or _text(value) == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = _text(value)
+    if not text.isdigit():
+        raise ValueError(f"оценка должна быть целым числом: {text!r}")
+    return int(text)
+
+
+def _birthdate(value):
+    if value is None or _text(value) == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"дата в формате YYYY-MM-DD или ДД.ММ.ГГГГ: {text!r}")
+
+
+# ---------- поиск id ----------
+def resolve_students(names):
+    """Один пакетный поиск учеников по ФИО: {ФИО: [(id, группа), ...]}."""
+    found = {}
+    names = list(names)
+    for i in range(0, len(names), LOOKUP_CHUNK):
+        chunk = names[i:i + LOOKUP_CHUNK]
+        marks = ",".join(["%s"] * len(chunk))
+        for sid, name, cls in fetch_all(f"SELECT id, full_name, class FROM students WHERE full_name IN ({marks})", tuple(chunk)):
+            found.setdefault(name, []).append((sid, cls))
+    return found
+
+
+def existing_grades(student_ids):
+    """Пары (id ученика, предмет), по которым оценка уже есть в БД."""
+    pairs = set()
+    ids = sorted(student_ids)
+    for i in range(0, len(ids), LOOKUP_CHUNK):
+        chunk = ids[i:i + LOOKUP_CHUNK]
+        marks = ",".join(["%s"] * len(chunk))
+        pairs.update(fetch_all(f"SELECT student_id, subject FROM grade_reports WHERE student_id IN ({marks})", tuple(chunk)))
+    return pairs
+
+
+def _pick_student(candidates, cls):
+    if not candidates:
+        raise ValueError("ученик не найден")
+    if cls:
+        candidates = [c for c in candidates if c[1] == cls]
+        if not candidates:
+            raise ValueError(f"ученик не найден в группе {cls}")
+    if len(candidates) > 1:
+        raise ValueError("несколько учеников с таким ФИО — укажите группу")
+    return candidates[0][0]
+
+
+# ---------- подготовка строк ----------
+def _student_rows(path, existing):
+    seen = set()
+    for line_no, rec in iter_records(path, 'students'):
+        try:
+            name = _text(rec.get('full_name'))
+            if not name:
+                raise ValueError("ФИО обязательно")
+            cls = _text(rec.get('class'))
+            if any(c[1] == cls for c in existing.get(name, ())):
+                raise ValueError("ученик уже есть в этой группе")
+            if (name, cls) in seen:
+                raise ValueError("повтор строки в файле")
+            seen.add((name, cls))
+            yield line_no, (name, _birthdate(rec.get('birthdate')), cls), None
+        except ValueError as e:
+            yield line_no, None, str(e)
+
+
+def _grade_rows(path, students, existing):
+    # у ученика одна строка оценок по предмету (уникальный ключ student_id, subject)
+    seen = set()
+    for line_no, rec in iter_records(path, 'grades'):
+        try:
+            sid = _pick_student(students.get(_text(rec.get('full_name'))), _text(rec.get('class')))
+            subject = _text(rec.get('subject'))
+            if not subject:
+                raise ValueError("предмет обязателен")
+            if (sid, subject) in existing:
+                raise ValueError("оценка по этому предмету у ученика уже есть — измените её в программе")
+            if (sid, subject) in seen:
+                raise ValueError("повтор ученика и предмета в файле")
+            seen.add((sid, subject))
+            s1, s2 = _grade(rec.get('s1')), _grade(rec.get('s2'))
+            yield line_no, (sid, subject, s1, s2, final_grade(s1, s2)), None
+        except ValueError as e:
+            yield line_no, None, str(e)
+
+
+INSERT_TABLE = {'students': "students", 'grades': "grade_reports"}
+INSERT_SQL = {
+    'students': "INSERT INTO students (full_name, birthdate, class) VALUES (%s,%s,%s)",
+    'grades': "INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES (%s,%s,%s,%s,%s)",
+}
+
+
+def run_import(kind, path, dry_run=False):
+    """Импортировать учеников ('students') или оценки ('grades') из файла; dry_run — только проверка."""
+    started = time.perf_counter()
+    report = ImportReport(kind, path, dry_run)
+
+    # проход 1: только ФИО, для одного пакетного поиска
+    names = {_text(rec.get('full_name')) for _, rec in iter_records(path, kind)}
+    names.discard("")
+    lookup = resolve_students(names)
+    if kind == 'students':
+        rows = _student_rows(path, lookup)
+    else:
+        existing = existing_grades(sid for found in lookup.values() for sid, _ in found)
+        rows = _grade_rows(path, lookup, existing)
+
+    # проход 2: проверка и запись пачками в одной транзакции
+    if dry_run:
+        _consume(kind, rows, report, None)
+    else:
+        with connection() as conn:
+            cur = conn.cursor()
+            try:
+                with changelog.bulk(cur, INSERT_TABLE[kind]):
+                    _consume(kind, rows, report, cur)
+                if kind == 'students':
+                    # сводка соц. паспорта — в той же транзакции, по затронутым группам
+                    passport.refresh_classes(cur, report.classes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+        if kind == 'students':
+            # внутри внешней единицы работы — только после её фиксации
+            after_commit(refcache.students.invalidate)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _consume(kind, rows, report, cur):
+    batch = []
+    for line_no, values, error in rows:
+        report.total += 1
+        if error:
+            report.errors.append((line_no, error))
+            continue
+        report.valid += 1
+        if len(report.preview) < PREVIEW_ROWS:
+            report.preview.append(values)
+        if cur is None:
+            continue
+        if kind == 'students':
+            report.classes.add(values[2])
+        batch.append(values)
+        if len(batch) >= BATCH_SIZE:
+            cur.executemany(INSERT_SQL[kind], batch)
+            report.inserted += len(batch)
+            batch = []
+    if batch:
+        cur.executemany(INSERT_SQL[kind], batch)
+        report.inserted += len(batch)
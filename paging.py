@@ -0,0 +1,148 @@
+# paging.py
+# Запросы страниц таблиц вкладок (keyset по id) и условия поиска — без интерфейса.
+# Ими пользуются PagedTree/FilterBar (widgets.py) и замеры bench.py.
+
+from db import fetch_all, statement
+
+# innodb_ft_min_token_size по умолчанию: более короткие слова FULLTEXT не индексирует
+FT_MIN_TOKEN = 3
+_FT_OPERATORS = str.maketrans({c: " " for c in '+-<>()~*"@'})
+
+NO_FILTER = ([], [])
+
+# что показывает каждая вкладка: таблица, соединения, столбцы, ключ для keyset
+TABS = {
+    'lessons': dict(table="lessons", joins="LEFT JOIN ro_sections ON ro_sections.id = lessons.ro_id",
+                    fields="lessons.id, ro_sections.title, lessons.number, lessons.criteria, lessons.total_hours, lessons.type",
+                    id_column="lessons.id"),
+    'teachers': dict(table="teachers", fields="id, full_name, position", id_column="id"),
+    'students': dict(table="students", fields="id, full_name, birthdate, class", id_column="id"),
+    # file_text — текст прикреплённого файла для поиска по документам (doctext.py)
+    'class_plans': dict(table="class_plans cp",
+                        joins="LEFT JOIN teachers t ON t.id = cp.teacher_id LEFT JOIN file_text ft ON ft.sha256 = cp.file_sha256",
+                        fields="cp.id, t.full_name, cp.class, cp.year, cp.file_path", id_column="cp.id"),
+    'social_passport': dict(table="social_passport",
+                            fields="id, class, year, total_students, full_families, low_income, disabilities, orphaned, many_children",
+                            id_column="id"),
+    'grade_reports': dict(table="grade_reports gr", joins="LEFT JOIN students s ON s.id = gr.student_id",
+                          fields="gr.id, s.full_name, gr.subject, gr.s1, gr.s2, gr.final_grade", id_column="gr.id"),
+    'exam_protocols': dict(table="exam_protocols ep",
+                           joins="LEFT JOIN teachers t ON t.id = ep.teacher_id LEFT JOIN file_text ft ON ft.sha256 = ep.file_sha256",
+                           fields="ep.id, t.full_name, ep.subject, ep.class, ep.date, ep.file_path", id_column="ep.id"),
+}
+
+# строка фильтров каждой вкладки: (подпись, вид, столбец[, справочник refcache для 'choice']);
+# виды — в widgets.FilterBar; по тем же столбцам фильтрует выгрузка cli.py export
+FILTERS = {
+    'lessons': [("Критерии", 'text', "lessons.criteria"),
+                ("Раздел", 'choice', "ro_sections.title", "sections"),
+                ("Тип", 'equals', "lessons.type")],
+    'teachers': [("ФИО", 'text', "full_name"),
+                 ("Должность", 'equals', "position")],
+    'students': [("ФИО", 'text', "full_name"),
+                 ("Группа", 'equals', "class")],
+    'class_plans': [("Педагог", 'choice', "t.full_name", "teachers"),
+                    ("Группа", 'equals', "cp.class"),
+                    ("Год", 'number', "cp.year"),
+                    ("В тексте файла", 'text', "ft.content")],
+    'social_passport': [("Группа", 'equals', "class"),
+                        ("Год", 'number', "year")],
+    'grade_reports': [("Ученик", 'text', "s.full_name"),
+                      ("Предмет", 'text', "gr.subject"),
+                      ("Группа", 'equals', "s.class")],
+    'exam_protocols': [("Предмет", 'text', "ep.subject"),
+                       ("Педагог", 'choice', "t.full_name", "teachers"),
+                       ("Группа", 'equals', "ep.class"),
+                       ("с", 'from', "ep.date"),
+                       ("по", 'to', "ep.date"),
+                       ("В тексте файла", 'text', "ft.content")],
+}
+
+
+def filter_columns(tab, kinds):
+    """Столбцы фильтров вкладки указанных видов, в порядке строки фильтров."""
+    return [spec[2] for spec in FILTERS[tab] if spec[1] in kinds]
+
+
+def text_condition(column, text):
+    """Условия поиска всех слов text в column: FULLTEXT по префиксам, короткие слова — через LIKE."""
+    words = text.translate(_FT_OPERATORS).split()
+    where, params = [], []
+    long_words = [w for w in words if len(w) >= FT_MIN_TOKEN]
+    if long_words:
+        where.append(f"MATCH({column}) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(" ".join(f"+{w}*" for w in long_words))
+    for w in words:
+        if len(w) < FT_MIN_TOKEN:
+            w = w.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append(f"{column} LIKE %s")
+            params.append(f"%{w}%")
+    return where, params
+
+
+class KeysetQuery:
+    """Страницы одной таблицы по id: новые сверху, фильтр conditions — пара (условия, параметры)."""
+
+    def __init__(self, table, fields, id_column, joins="", page_size=200):
+        self.table = table
+        self.joins = joins
+        self.fields = fields
+        self.id_column = id_column
+        self.page_size = page_size
+        # запросы страниц без фильтра постоянны — они идут в реестр подготовленных;
+        # запросы с фильтром и списком id каждый раз разные и выполняются текстом,
+        # чтобы не вытеснять постоянные из LRU
+        self._fixed = {}
+        self._count_sql = statement(f"SELECT COUNT(*) FROM {table}")
+
+    def _select_sql(self, where, order):
+        sql = f"SELECT {self.fields} FROM {self.table} {self.joins}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + f" ORDER BY {self.id_column} {order} LIMIT %s"
+
+    def select(self, where, params, order, limit, conditions=NO_FILTER, fixed=True):
+        """Строки по условиям where; fixed=False — форма запроса разовая, без подготовки."""
+        if conditions[0] or not fixed:
+            sql = self._select_sql(conditions[0] + list(where), order)
+            return fetch_all(sql, tuple(conditions[1]) + tuple(params) + (limit,))
+        key = (tuple(where), order)
+        sql = self._fixed.get(key)
+        if sql is None:
+            sql = self._fixed[key] = statement(self._select_sql(where, order))
+        return fetch_all(sql, tuple(params) + (limit,))
+
+    def scan(self, conditions=NO_FILTER):
+        """Запрос всех строк фильтра по возрастанию id для выгрузки потоком: (sql, params)."""
+        where, params = conditions
+        sql = f"SELECT {self.fields} FROM {self.table} {self.joins}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + f" ORDER BY {self.id_column}", tuple(params)
+
+    def count(self, conditions=NO_FILTER):
+        where, params = conditions
+        if not where:
+            return fetch_all(self._count_sql)[0][0]
+        sql = f"SELECT COUNT(*) FROM {self.table} {self.joins} WHERE " + " AND ".join(where)
+        return fetch_all(sql, tuple(params))[0][0]
+
+    def first_page(self, conditions=NO_FILTER):
+        return self.select([], [], "DESC", self.page_size, conditions)
+
+    def older_page(self, before_id, conditions=NO_FILTER):
+        return self.select([f"{self.id_column} < %s"], [before_id], "DESC", self.page_size, conditions)
+
+    def newer_page(self, after_id, conditions=NO_FILTER):
+        rows = self.select([f"{self.id_column} > %s"], [after_id], "ASC", self.page_size, conditions)
+        return list(reversed(rows))
+
+    def row(self, row_id, conditions=NO_FILTER):
+        rows = self.select([f"{self.id_column} = %s"], [row_id], "DESC", 1, conditions)
+        return rows[0] if rows else None
+
+    def rows(self, row_ids, conditions=NO_FILTER):
+        """Строки с указанными id (одним запросом), подходящие под фильтр."""
+        marks = ", ".join(["%s"] * len(row_ids))
+        return self.select([f"{self.id_column} IN ({marks})"], list(row_ids), "DESC", len(row_ids), conditions,
+                           fixed=False)
@@ -0,0 +1,165 @@
+# passport.py
+# Социальный паспорт по признакам учеников: сводка social_summary по группам.
+#
+# Сводка обновляется приращениями в той же транзакции, что и запись ученика
+# (+1/-1 к счётчикам старой и новой группы), поэтому отчёт — это чтение
+# маленькой таблицы по ключу, а не пересчёт. check()/rebuild() сверяют и
+# пересобирают её целиком одним GROUP BY.
+
+from datetime import date
+
+from db import connection, fetch_all
+
+# (признак ученика, счётчик в сводке и паспорте, подпись)
+ATTRIBUTES = [
+    ("full_family", "full_families", "Полная семья"),
+    ("low_income", "low_income", "Малоимущая семья"),
+    ("disability", "disabilities", "Инвалидность"),
+    ("orphaned", "orphaned", "Сирота"),
+    ("many_children", "many_children", "Многодетная семья"),
+]
+
+FLAGS = [a for a, _, _ in ATTRIBUTES]
+COUNTERS = ["total_students"] + [c for _, c, _ in ATTRIBUTES]
+
+
+def academic_year(today=None):
+    """Учебный год по дате начала: с сентября — текущий календарный, до сентября — предыдущий."""
+    today = today or date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+
+def _group(class_name):
+    # ключ сводки не может быть NULL: ученики без группы считаются в группе ''
+    return class_name or ""
+
+
+def _apply(cur, class_name, flags, sign):
+    """Прибавить (sign=1) или вычесть (sign=-1) одного ученика с признаками flags к сводке группы."""
+    deltas = [sign] + [sign * (1 if flags.get(f) else 0) for f in FLAGS]
+    cols = ", ".join(COUNTERS)
+    marks = ", ".join(["%s"] * (len(COUNTERS) + 1))
+    updates = ", ".join(f"{c} = {c} + %s" for c in COUNTERS)
+    cur.execute(f"INSERT INTO social_summary (class, {cols}) VALUES ({marks}) ON DUPLICATE KEY UPDATE {updates}",
+                [_group(class_name)] + deltas + deltas)
+
+
+def _locked_student(cur, sid):
+    cur.execute(f"SELECT class, {', '.join(FLAGS)} FROM students WHERE id=%s FOR UPDATE", (sid,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return row[0], dict(zip(FLAGS, row[1:]))
+
+
+def _write(work):
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            result = work(cur)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+# ---------- запись учеников со сводкой в одной транзакции ----------
+def insert_student(full_name, birthdate, class_name, flags):
+    """Добавить ученика и учесть его в сводке; вернуть id."""
+    def work(cur):
+        cur.execute(f"INSERT INTO students (full_name, birthdate, class, {', '.join(FLAGS)}) "
+                    f"VALUES (%s, %s, %s{', %s' * len(FLAGS)})",
+                    [full_name, birthdate, class_name] + [1 if flags.get(f) else 0 for f in FLAGS])
+        sid = cur.lastrowid  # до записи сводки: после неё lastrowid относится к social_summary
+        _apply(cur, class_name, flags, 1)
+        return sid
+    return _write(work)
+
+
+def update_student(sid, full_name, birthdate, class_name, flags):
+    """Изменить ученика и перенести его из сводки старой группы/признаков в новую."""
+    def work(cur):
+        old = _locked_student(cur, sid)
+        cur.execute(f"UPDATE students SET full_name=%s, birthdate=%s, class=%s, "
+                    f"{', '.join(f + '=%s' for f in FLAGS)} WHERE id=%s",
+                    [full_name, birthdate, class_name] + [1 if flags.get(f) else 0 for f in FLAGS] + [sid])
+        if old is not None:
+            _apply(cur, old[0], old[1], -1)
+            _apply(cur, class_name, flags, 1)
+    _write(work)
+
+
+def delete_student(sid):
+    """Удалить ученика и вычесть его из сводки."""
+    def work(cur):
+        old = _locked_student(cur, sid)
+        cur.execute("DELETE FROM students WHERE id=%s", (sid,))
+        if old is not None:
+            _apply(cur, old[0], old[1], -1)
+    _write(work)
+
+
+def student_flags(sid):
+    """Признаки ученика {признак: 0/1}."""
+    rows = fetch_all(f"SELECT {', '.join(FLAGS)} FROM students WHERE id=%s", (sid,))
+    return dict(zip(FLAGS, rows[0])) if rows else {}
+
+
+# ---------- пересчёт и сверка ----------
+_AGGREGATE = "COUNT(*), " + ", ".join(f"COALESCE(SUM({f}), 0)" for f in FLAGS)
+
+
+def refresh_classes(cur, classes):
+    """Пересчитать сводку указанных групп по таблице students (после массовой загрузки)."""
+    groups = sorted({_group(c) for c in classes})
+    if not groups:
+        return
+    marks = ", ".join(["%s"] * len(groups))
+    cur.execute(f"DELETE FROM social_summary WHERE class IN ({marks})", groups)
+    cur.execute(f"INSERT INTO social_summary (class, {', '.join(COUNTERS)}) "
+                f"SELECT COALESCE(class, ''), {_AGGREGATE} FROM students "
+                f"WHERE COALESCE(class, '') IN ({marks}) GROUP BY COALESCE(class, '')", groups)
+
+
+def rebuild_summary(cur):
+    cur.execute("DELETE FROM social_summary")
+    cur.execute(f"INSERT INTO social_summary (class, {', '.join(COUNTERS)}) "
+                f"SELECT COALESCE(class, ''), {_AGGREGATE} FROM students GROUP BY COALESCE(class, '')")
+
+
+def rebuild():
+    """Пересобрать сводку целиком одним GROUP BY в одной транзакции."""
+    _write(rebuild_summary)
+
+
+def check():
+    """Сверить сводку с таблицей students: [(группа, счётчик, в сводке, фактически)]."""
+    stored = {r[0]: r[1:] for r in fetch_all(f"SELECT class, {', '.join(COUNTERS)} FROM social_summary")}
+    actual = {r[0]: r[1:] for r in fetch_all(
+        f"SELECT COALESCE(class, ''), {_AGGREGATE} FROM students GROUP BY COALESCE(class, '')")}
+    zero = (0,) * len(COUNTERS)
+    mismatches = []
+    for group in sorted(set(stored) | set(actual)):
+        have, want = stored.get(group, zero), actual.get(group, zero)
+        for name, h, w in zip(COUNTERS, have, want):
+            if int(h) != int(w):
+                mismatches.append((group, name, int(h), int(w)))
+    return mismatches
+
+
+def summary():
+    """Текущая сводка по группам: [(группа, всего, счётчики...)] без пустых групп."""
+    return fetch_all(f"SELECT class, {', '.join(COUNTERS)} FROM social_summary WHERE total_students > 0 ORDER BY class")
+
+
+def snapshot(year):
+    """Записать текущую сводку в social_passport за учебный год year (строки этого года заменяются)."""
+    def work(cur):
+        cur.execute("DELETE FROM social_passport WHERE year=%s", (year,))
+        cur.execute(f"INSERT INTO social_passport (class, year, {', '.join(COUNTERS)}) "
+                    f"SELECT class, %s, {', '.join(COUNTERS)} FROM social_summary WHERE total_students > 0", (year,))
+        return cur.rowcount
+    return _write(work)
@@ -0,0 +1,117 @@
+# querylog.py
+# Необязательный учёт запросов, проходящих через db.fetch_all/execute: время
+# выполнения, число строк, ожидание соединения из пула и действие (вкладка,
+# кнопка), из которого запрос вызван. Запросы дольше slow_ms пишутся в
+# ротируемый файл журнала. Выключенный учёт стоит одной проверки флага.
+
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+from config import QUERYLOG_CONFIG
+
+enabled = QUERYLOG_CONFIG['enabled']
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+_slow_log = None
+
+_SPACES = re.compile(r"\s+")
+# списки IN (%s, %s, ...) разной длины считаются одним запросом
+_PLACEHOLDER_RUN = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+def set_enabled(value):
+    """Включить или выключить учёт (накопленная статистика сохраняется)."""
+    global enabled
+    enabled = bool(value)
+
+
+# ---------- действие, из которого идут запросы ----------
+def current_action():
+    return getattr(_local, 'action', None)
+
+
+@contextmanager
+def action(label):
+    """Помечать запросы этого потока внутри блока with действием label."""
+    previous = current_action()
+    _local.action = label
+    try:
+        yield
+    finally:
+        _local.action = previous
+
+
+def labelled(label, fn):
+    """Обернуть fn так, чтобы её запросы помечались label; при выключенном учёте вернуть fn как есть."""
+    if not enabled:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        with action(label):
+            return fn(*args, **kwargs)
+    return run
+
+
+# ---------- учёт ----------
+def normalize(sql):
+    """Текст запроса без лишних пробелов и с одним %s вместо списка параметров."""
+    return _PLACEHOLDER_RUN.sub("%s, ...", _SPACES.sub(" ", sql).strip())
+
+
+def _slow_logger():
+    global _slow_log
+    if _slow_log is None:
+        logger = logging.getLogger("edu.slow")
+        with _lock:
+            if not logger.handlers:
+                handler = RotatingFileHandler(QUERYLOG_CONFIG['slow_log'],
+                                              maxBytes=QUERYLOG_CONFIG['slow_log_kb'] * 1024,
+                                              backupCount=QUERYLOG_CONFIG['slow_log_backups'],
+                                              encoding="utf-8", delay=True)
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(handler)
+                logger.setLevel(logging.WARNING)
+            _slow_log = logger
+    return _slow_log
+
+
+def record(sql, wait, elapsed, rows):
+    """Учесть выполненный запрос: wait — ожидание соединения, elapsed — выполнение (секунды)."""
+    label = current_action()
+    key = normalize(sql)
+    with _lock:
+        st = _stats.get(key)
+        if st is None:
+            st = _stats[key] = {'sql': key, 'calls': 0, 'total': 0.0, 'max': 0.0,
+                                'rows': 0, 'wait': 0.0, 'actions': set()}
+        st['calls'] += 1
+        st['total'] += elapsed
+        st['max'] = max(st['max'], elapsed)
+        st['rows'] += rows if rows and rows > 0 else 0
+        st['wait'] += wait
+        if label:
+            st['actions'].add(label)
+    slow_ms = QUERYLOG_CONFIG['slow_ms']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        _slow_logger().warning("%.1f мс (ожидание соединения %.1f мс), строк %s, %s: %s",
+                               elapsed * 1000, wait * 1000, rows, label or "-", key)
+
+
+def top(n=None, by='total'):
+    """Самые затратные запросы: список снимков, отсортированный по полю by по убыванию."""
+    with _lock:
+        items = [dict(st, actions=sorted(st['actions'])) for st in _stats.values()]
+    items.sort(key=lambda st: st[by], reverse=True)
+    return items[:n or QUERYLOG_CONFIG['top_n']]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,232 @@
+# refcache.py
+# Кэш справочников (педагоги, ученики, разделы) для выпадающих списков и поиска id по имени.
+
+import re
+import threading
+import time
+
+from db import fetch_all, statement
+from config import CACHE_CONFIG
+
+
+class AmbiguousName(LookupError):
+    """По имени без группы находится несколько записей (тёзки в разных группах)."""
+
+
+# подпись записи справочника с группой: «ФИО (группа)»
+_LABEL = re.compile(r"^(.*) \(([^()]*)\)$")
+NO_GROUP = "без группы"
+
+
+class RefTable:
+    """Кэш name ↔ id одной таблицы-справочника.
+
+    Загружается один раз, обновляется нашими же записями (added/renamed/removed)
+    и сверяется с БД по дешёвой версии (COUNT(*), MAX(id)) не чаще check_every секунд.
+    В справочнике с group_column имена уникальны только вместе с группой: в списках
+    показывается «ФИО (группа)», а имя без группы находит запись, только если тёзок нет.
+    """
+
+    def __init__(self, table, name_column, group_column=None, check_every=None):
+        self.table = table
+        self.name_column = name_column
+        self.group_column = group_column
+        columns = f"{name_column}, {group_column}" if group_column else name_column
+        self._columns = columns
+        self._version_sql = statement(f"SELECT COUNT(*), MAX(id) FROM {table}")
+        self._load_sql = statement(f"SELECT id, {columns} FROM {table} ORDER BY id")
+        # две строки — чтобы заметить тёзок
+        self._lookup_sql = statement(f"SELECT id, {columns} FROM {table} WHERE {name_column}=%s ORDER BY id LIMIT 2")
+        self._lookup_group_sql = statement(
+            f"SELECT id, {columns} FROM {table} WHERE {name_column}=%s AND COALESCE({group_column}, '')=%s "
+            f"ORDER BY id LIMIT 1") if group_column else None
+        self.check_every = CACHE_CONFIG['check_every'] if check_every is None else check_every
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._rows = {}  # id → (имя, группа)
+        self._by_id = {}  # id → подпись
+        self._by_name = {}  # подпись → id
+        self._plain = {}  # имя без группы → {id} (только с group_column)
+        self._sorted = None
+        self._version = None
+        self._checked_at = 0.0
+
+    # ---------- загрузка и сверка ----------
+    def _db_version(self):
+        return tuple(fetch_all(self._version_sql)[0])
+
+    def reload(self):
+        """Перечитать справочник целиком."""
+        version = self._db_version()
+        rows = fetch_all(self._load_sql)
+        self._fill(rows, version, time.monotonic())
+
+    def _fill(self, rows, version, checked_at):
+        with self._lock:
+            self._rows, self._by_id, self._by_name, self._plain = {}, {}, {}, {}
+            self._sorted = None
+            # строки по возрастанию id: при тёзках по имени находится запись с меньшим id
+            for row in rows:
+                self._put(*row)
+            self._version = version
+            self._checked_at = checked_at
+            self.loaded = True
+
+    def ensure_fresh(self):
+        """Загрузить или сверить версию, если пора; вернуть True, если данные перечитаны."""
+        if not self.loaded:
+            self.reload()
+            return True
+        if time.monotonic() - self._checked_at < self.check_every:
+            return False
+        version = self._db_version()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version == self._version:
+                return False
+        self.reload()
+        return True
+
+    # ---------- снимок на диске (snapshot.py) ----------
+    def snapshot(self):
+        """Содержимое кэша для снимка: {'rows': [[id, имя(, группа)], ...], 'version': [COUNT, MAX(id)]}; None — не загружен."""
+        with self._lock:
+            if not self.loaded:
+                return None
+            width = 3 if self.group_column else 2
+            return {'rows': [[rid, *row][:width] for rid, row in sorted(self._rows.items())],
+                    'version': list(self._version) if self._version else None}
+
+    def restore(self, data):
+        """Заполнить кэш из снимка; версия сверяется с БД при первом ensure_fresh."""
+        self._fill(data['rows'], tuple(data['version']) if data['version'] else None, float("-inf"))
+
+    def invalidate(self):
+        """Сбросить кэш (после массовых изменений в обход него)."""
+        with self._lock:
+            self.loaded = False
+
+    # ---------- чтение ----------
+    def label(self, name, group=None):
+        """Подпись записи в выпадающем списке."""
+        if not self.group_column:
+            return name
+        return f"{name} ({group or NO_GROUP})"
+
+    def names(self):
+        """Отсортированный список подписей для выпадающего списка."""
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(n for n in self._by_name if n)
+            return list(self._sorted)
+
+    def id_for(self, name):
+        """id по подписи или имени: из кэша, при промахе — запросом к БД.
+
+        Имя без группы, которое носят несколько записей, — AmbiguousName.
+        """
+        if not name:
+            return None
+        with self._lock:
+            rid = self._by_name.get(name)
+            # о тёзках знает только загруженный целиком справочник
+            if rid is None and self.group_column and self.loaded:
+                ids = self._plain.get(name, ())
+                if len(ids) > 1:
+                    raise AmbiguousName(name)
+                rid = next(iter(ids), None)
+        if rid is not None:
+            return rid
+        rows = fetch_all(self._lookup_sql, (name,))
+        if len(rows) > 1 and self.group_column:
+            raise AmbiguousName(name)
+        if not rows and self.group_column:
+            match = _LABEL.match(name)
+            if match:
+                group = "" if match.group(2) == NO_GROUP else match.group(2)
+                rows = fetch_all(self._lookup_group_sql, (match.group(1), group))
+        if not rows:
+            return None
+        with self._lock:
+            if rows[0][0] not in self._rows:
+                self._put(*rows[0])
+        return rows[0][0]
+
+    def name_for(self, rid):
+        """Подпись записи по id."""
+        with self._lock:
+            return self._by_id.get(rid)
+
+    # ---------- наши собственные записи ----------
+    # повторный вызов для той же записи (наша правка, вернувшаяся через журнал
+    # изменений) версию не сдвигает
+    def added(self, rid, name, group=None):
+        with self._lock:
+            known = rid in self._rows
+            self._put(rid, name, group)
+            if self._version is not None and not known:
+                count, max_id = self._version
+                self._version = (count + 1, max(max_id or 0, rid))
+
+    def renamed(self, rid, name, group=None):
+        with self._lock:
+            self._put(rid, name, group)
+
+    def removed(self, rid):
+        with self._lock:
+            known = self._drop(rid)
+            if self._version is not None and known:
+                count, max_id = self._version
+                # MAX(id) после удаления неизвестен — при удалении последней записи
+                # следующая сверка просто перечитает справочник
+                self._version = (count - 1, max_id)
+
+    def _put(self, rid, name, group=None):
+        self._drop(rid)
+        label = self.label(name, group)
+        self._rows[rid] = (name, group)
+        self._by_id[rid] = label
+        self._by_name.setdefault(label, rid)
+        if self.group_column:
+            self._plain.setdefault(name, set()).add(rid)
+        self._sorted = None
+
+    def _drop(self, rid):
+        row = self._rows.pop(rid, None)
+        if row is None:
+            return False
+        label = self._by_id.pop(rid)
+        if self._by_name.get(label) == rid:
+            del self._by_name[label]
+        ids = self._plain.get(row[0])
+        if ids is not None:
+            ids.discard(rid)
+            if not ids:
+                del self._plain[row[0]]
+        self._sorted = None
+        return True
+
+    # ---------- изменения других пользователей (changelog.py) ----------
+    def apply_changes(self, changed, deleted):
+        """Перечитать только изменённые записи из журнала и удалить удалённые; версия — по БД."""
+        if not self.loaded:
+            return
+        changed = sorted(changed)
+        rows = fetch_all(f"SELECT id, {self._columns} FROM {self.table} WHERE id IN "
+                         f"({', '.join(['%s'] * len(changed))})", changed) if changed else []
+        version = self._db_version()
+        found = {row[0] for row in rows}
+        with self._lock:
+            for rid in set(deleted) | (set(changed) - found):
+                self._drop(rid)
+            for row in rows:
+                self._put(*row)
+            self._version = version
+            self._checked_at = time.monotonic()
+
+
+teachers = RefTable("teachers", "full_name")
+students = RefTable("students", "full_name", group_column="class")
+sections = RefTable("ro_sections", "title")
+
+ALL = (teachers, students, sections)
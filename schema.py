@@ -0,0 +1,565 @@
+# schema.py
+# Версионированные миграции схемы БД, индексы и проверка их использования через EXPLAIN.
+#
+# Каждая миграция выполняется один раз и записывается в schema_version; при
+# актуальной схеме запуск стоит один запрос MAX(version).
+
+import logging
+
+import mysql.connector
+
+from db import BACKEND, connection
+import passport
+import changelog
+import grades
+import sqlite_backend
+
+log = logging.getLogger("edu.schema")
+
+# строк за одну транзакцию при переносе данных, чтобы не держать блокировку на всей таблице
+CHUNK_ROWS = 5000
+
+# (таблица, имя индекса, столбцы, уникальный); индексы миграции 4 — как при её выпуске,
+# более поздние создают свои миграции, а INDEXES — полный список для «Проверки индексов»
+INDEXES_V4 = [
+    ("teachers", "uq_teachers_full_name", ("full_name",), True),
+    ("students", "uq_students_name_class", ("full_name", "class"), True),
+    ("students", "ix_students_class", ("class",), False),
+    ("ro_sections", "uq_ro_sections_title", ("title",), True),
+    ("class_plans", "ix_class_plans_class_year", ("class", "year"), False),
+    ("exam_protocols", "ix_exam_protocols_class_date", ("class", "date"), False),
+    ("social_passport", "ix_social_passport_class_year", ("class", "year"), False),
+    ("grade_reports", "uq_grade_reports_student_subject", ("student_id", "subject"), True),
+]
+SUBJECT_INDEX = ("grade_reports", "ix_grade_reports_subject", ("subject",), False)  # миграция 7
+CHANGE_LOG_AGE_INDEX = ("change_log", "ix_change_log_changed_at", ("changed_at",), False)  # миграция 12
+INDEXES = INDEXES_V4 + [SUBJECT_INDEX, CHANGE_LOG_AGE_INDEX]
+
+# полнотекстовые индексы строк поиска: (таблица, имя индекса, столбец)
+FULLTEXT_INDEXES = [
+    ("lessons", "ft_lessons_criteria", "criteria"),
+    ("grade_reports", "ft_grade_reports_subject", "subject"),
+    ("exam_protocols", "ft_exam_protocols_subject", "subject"),
+    ("teachers", "ft_teachers_full_name", "full_name"),
+    ("students", "ft_students_full_name", "full_name"),
+    ("ro_sections", "ft_ro_sections_title", "title"),
+    ("file_text", "ft_file_text_content", "content"),
+]
+
+# частые запросы приложения: (описание, таблица в плане, запрос, параметры, ожидаемые индексы)
+HOT_QUERIES = [
+    ("Педагог по ФИО", "teachers", "SELECT id FROM teachers WHERE full_name=%s", ("x",),
+     ("uq_teachers_full_name", "ix_teachers_full_name")),
+    ("Ученик по ФИО", "students", "SELECT id FROM students WHERE full_name=%s", ("x",),
+     ("uq_students_name_class", "ix_students_name_class")),
+    ("Раздел по названию", "ro_sections", "SELECT id FROM ro_sections WHERE title=%s", ("x",),
+     ("uq_ro_sections_title", "ix_ro_sections_title")),
+    ("Ученики группы", "students", "SELECT id FROM students WHERE class=%s", ("x",),
+     ("ix_students_class",)),
+    ("Планы группы", "class_plans", "SELECT id FROM class_plans WHERE class=%s", ("x",),
+     ("ix_class_plans_class_year",)),
+    ("Протоколы группы", "exam_protocols", "SELECT id FROM exam_protocols WHERE class=%s", ("x",),
+     ("ix_exam_protocols_class_date",)),
+    ("Соц. паспорт группы", "social_passport", "SELECT id FROM social_passport WHERE class=%s", ("x",),
+     ("ix_social_passport_class_year",)),
+    ("Оценка ученика по предмету", "grade_reports",
+     "SELECT id FROM grade_reports WHERE student_id=%s AND subject=%s", (1, "x"),
+     ("uq_grade_reports_student_subject", "ix_grade_reports_student_subject")),
+    ("Оценки по предмету", "grade_reports", "SELECT id FROM grade_reports WHERE subject=%s", ("x",),
+     ("ix_grade_reports_subject",)),
+    ("Поиск оценок по предмету", "grade_reports",
+     "SELECT id FROM grade_reports WHERE MATCH(subject) AGAINST (%s IN BOOLEAN MODE)", ("+мат*",),
+     ("ft_grade_reports_subject",)),
+    ("Поиск занятий по критериям", "lessons",
+     "SELECT id FROM lessons WHERE MATCH(criteria) AGAINST (%s IN BOOLEAN MODE)", ("+x*",),
+     ("ft_lessons_criteria",)),
+    ("Поиск учеников по ФИО", "students",
+     "SELECT id FROM students WHERE MATCH(full_name) AGAINST (%s IN BOOLEAN MODE)", ("+x*",),
+     ("ft_students_full_name",)),
+    ("Поиск по тексту документов", "file_text",
+     "SELECT sha256 FROM file_text WHERE MATCH(content) AGAINST (%s IN BOOLEAN MODE)", ("+x*",),
+     ("ft_file_text_content",)),
+]
+
+
+# проверки схемы идут через курсор вызывающего: migrate() держит соединение из
+# пула, и второе соединение при DB_POOL_SIZE=1 ждало бы его до таймаута
+def existing_indexes(cur):
+    """Множество (таблица, индекс) текущей БД — одним запросом к information_schema."""
+    if BACKEND == "sqlite":
+        cur.execute(sqlite_backend.INDEXES_SQL)
+    else:
+        cur.execute("""
+            SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+        """)
+    return {(t, i) for t, i in cur.fetchall()}
+
+
+def existing_tables(cur):
+    """Имена таблиц текущей БД."""
+    if BACKEND == "sqlite":
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    else:
+        cur.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+    return {r[0] for r in cur.fetchall()}
+
+
+def find_duplicates(cur, table, columns, limit=20):
+    """Значения columns, встречающиеся в table больше одного раза: [(значения..., количество)]."""
+    cols = ", ".join(columns)
+    cur.execute(f"""
+        SELECT {cols}, COUNT(*) FROM {table}
+        GROUP BY {cols} HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC LIMIT %s
+    """, (limit,))
+    return cur.fetchall()
+
+
+def ensure_indexes(cur, indexes=None):
+    """Создать недостающие индексы (по умолчанию — все INDEXES); уникальные — только если в данных нет дублей.
+
+    При дублях вместо уникального создаётся обычный индекс ix_* (поиск всё равно
+    ускоряется), а дубли пишутся в журнал. После их устранения уникальный ключ
+    добавит повторный вызов (меню «Сервис → Индексы: проверка и досоздание»).
+    """
+    present = existing_indexes(cur)
+    for table, name, columns, unique in INDEXES if indexes is None else indexes:
+        if (table, name) in present:
+            continue
+        cols = ", ".join(columns)
+        if unique:
+            dups = find_duplicates(cur, table, columns)
+            if dups:
+                log.warning("В %s есть повторы (%s), уникальный ключ %s не создан: %s",
+                            table, cols, name, dups)
+                plain = "ix_" + name[3:]
+                if (table, plain) not in present:
+                    cur.execute(f"CREATE INDEX {plain} ON {table} ({cols})")
+                continue
+            if (table, "ix_" + name[3:]) in present:
+                # дубли устранены: заменить обычный индекс уникальным
+                cur.execute(f"DROP INDEX ix_{name[3:]} ON {table}")
+            cur.execute(f"CREATE UNIQUE INDEX {name} ON {table} ({cols})")
+        else:
+            cur.execute(f"CREATE INDEX {name} ON {table} ({cols})")
+        log.info("Создан индекс %s.%s (%s)", table, name, cols)
+
+
+def ensure_fulltext(cur):
+    """Создать недостающие FULLTEXT-индексы для строк поиска (по одному: каждый перестраивает таблицу)."""
+    if BACKEND == "sqlite":
+        return  # в SQLite поиск MATCH ... AGAINST выполняется просмотром (sqlite_backend)
+    present = existing_indexes(cur)
+    tables = existing_tables(cur)
+    for table, name, column in FULLTEXT_INDEXES:
+        if (table, name) in present or table not in tables:
+            continue  # таблицу ещё создаст более поздняя миграция, она и добавит индекс
+        cur.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({column})")
+        log.info("Создан полнотекстовый индекс %s.%s (%s)", table, name, column)
+
+
+def check_hot_queries():
+    """EXPLAIN для частых запросов: [(описание, ok, использованный индекс, тип доступа)]."""
+    results = []
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            for title, table, sql, params, expected in HOT_QUERIES:
+                if BACKEND == "sqlite":
+                    if not any(name.startswith("ft_") for name in expected):
+                        key, access = sqlite_backend.explain(cur, sql, params)
+                        results.append((title, key in expected, key, access))
+                    continue
+                cur.execute("EXPLAIN " + sql, params)
+                names = cur.column_names
+                plan = [dict(zip(names, row)) for row in cur.fetchall()]
+                step = next((p for p in plan if p.get("table") == table), plan[0] if plan else {})
+                key = step.get("key")
+                if key is None and "const table" in str(step.get("Extra") or ""):
+                    # искомого значения нет: MySQL понял это по уникальному индексу, но key не показывает
+                    key = (step.get("possible_keys") or "").split(",")[0] or None
+                results.append((title, key in expected, key, step.get("type")))
+        finally:
+            cur.close()
+    return results
+
+
+# ---------- миграции ----------
+def update_in_chunks(conn, table, assignments, where=None, chunk=CHUNK_ROWS):
+    """UPDATE table SET assignments по диапазонам id с фиксацией после каждого диапазона."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+        lo, hi = cur.fetchone()
+        if lo is None:
+            return
+        extra = f" AND ({where})" if where else ""
+        for start in range(lo, hi + 1, chunk):
+            cur.execute(f"UPDATE {table} SET {assignments} WHERE id >= %s AND id < %s{extra}",
+                        (start, start + chunk))
+            conn.commit()
+    finally:
+        cur.close()
+
+
+def _columns(cur, table):
+    if BACKEND == "sqlite":
+        return sqlite_backend.columns(cur, table)
+    cur.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return {r[0] for r in cur.fetchall()}
+
+
+def _m001_base_tables(conn, cur):
+    """Создать все необходимые таблицы, если их нет."""
+    # module table
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS module (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        code VARCHAR(50),
+        title VARCHAR(255),
+        total_hours INT
+    ) ENGINE=InnoDB;
+    """)
+
+    # ro_sections
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ro_sections (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        module_id INT,
+        code VARCHAR(100),
+        title VARCHAR(255),
+        hours INT DEFAULT 0,
+        FOREIGN KEY (module_id) REFERENCES module(id)
+            ON DELETE RESTRICT ON UPDATE CASCADE
+    ) ENGINE=InnoDB;
+    """)
+
+    # lessons
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS lessons (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        ro_id INT,
+        number INT,
+        criteria TEXT,
+        total_hours INT,
+        type VARCHAR(100),
+        FOREIGN KEY (ro_id) REFERENCES ro_sections(id)
+            ON DELETE RESTRICT ON UPDATE CASCADE
+    ) ENGINE=InnoDB;
+    """)
+
+    # teachers
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS teachers (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        full_name VARCHAR(255),
+        position VARCHAR(255)
+    ) ENGINE=InnoDB;
+    """)
+
+    # students
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS students (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        full_name VARCHAR(255),
+        birthdate DATE,
+        class VARCHAR(50)
+    ) ENGINE=InnoDB;
+    """)
+
+    # class_plans
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS class_plans (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        teacher_id INT,
+        class VARCHAR(50),
+        year INT,
+        file_path TEXT,
+        FOREIGN KEY (teacher_id) REFERENCES teachers(id)
+            ON DELETE SET NULL ON UPDATE CASCADE
+    ) ENGINE=InnoDB;
+    """)
+
+    # social_passport (добавлена колонка many_children)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS social_passport (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        class VARCHAR(50),
+        year INT,
+        total_students INT,
+        full_families INT,
+        low_income INT,
+        disabilities INT,
+        orphaned INT,
+        many_children INT DEFAULT 0
+    ) ENGINE=InnoDB;
+    """)
+
+    # grade_reports (используем s1, s2 вместо q1..q4)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS grade_reports (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        student_id INT,
+        subject VARCHAR(255),
+        s1 INT,
+        s2 INT,
+        final_grade INT,
+        FOREIGN KEY (student_id) REFERENCES students(id)
+            ON DELETE CASCADE ON UPDATE CASCADE
+    ) ENGINE=InnoDB;
+    """)
+
+    # exam_protocols
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS exam_protocols (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        teacher_id INT,
+        subject VARCHAR(255),
+        class VARCHAR(50),
+        date DATE,
+        file_path TEXT,
+        FOREIGN KEY (teacher_id) REFERENCES teachers(id)
+            ON DELETE SET NULL ON UPDATE CASCADE
+    ) ENGINE=InnoDB;
+    """)
+
+
+def _m002_default_module(conn, cur):
+    """Гарантировать наличие хотя бы одного модуля (module_id=1 используется разделами)."""
+    cur.execute("SELECT id FROM module LIMIT 1")
+    if not cur.fetchone():
+        cur.execute("INSERT INTO module (code, title, total_hours) VALUES ('ПМ6', 'Автосозданный модуль', 0)")
+
+
+def _m003_semesters(conn, cur):
+    """Колонки s1/s2 вместо четвертей q1..q4; перенос данных и пересчёт итога — порциями."""
+    columns = _columns(cur, "grade_reports")
+    for col in ("s1", "s2"):
+        if col not in columns:
+            cur.execute(f"ALTER TABLE grade_reports ADD COLUMN {col} INT DEFAULT NULL")
+            columns.add(col)
+
+    def half(a, b):
+        # правило итоговой оценки из grades.py; отсутствующая колонка считается пустой
+        return grades.final_grade_sql(a if a in columns else "NULL", b if b in columns else "NULL")
+
+    quarters = [q for q in ("q1", "q2", "q3", "q4") if q in columns]
+    if quarters:
+        # заполняем только пустые семестры, выставленные вручную оценки не трогаем
+        update_in_chunks(conn, "grade_reports",
+                         f"s1 = COALESCE(s1, {half('q1', 'q2')}), s2 = COALESCE(s2, {half('q3', 'q4')})",
+                         where=" OR ".join(f"{q} IS NOT NULL" for q in quarters))
+    update_in_chunks(conn, "grade_reports", f"final_grade = {half('s1', 's2')}")
+
+
+def _m004_indexes(conn, cur):
+    """Индексы для поиска по ФИО, названию и фильтров по группе."""
+    ensure_indexes(cur, INDEXES_V4)
+
+
+def _m005_file_store(conn, cur):
+    """Хранилище файлов по хэшу содержимого и ссылки на него из планов и протоколов."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            sha256 CHAR(64) PRIMARY KEY,
+            size BIGINT NOT NULL,
+            mime VARCHAR(100),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS file_chunks (
+            sha256 CHAR(64) NOT NULL,
+            seq INT NOT NULL,
+            data MEDIUMBLOB NOT NULL,
+            PRIMARY KEY (sha256, seq)
+        ) ENGINE=InnoDB
+    """)
+    for table in ("class_plans", "exam_protocols"):
+        columns = _columns(cur, table)
+        if "file_sha256" not in columns and BACKEND == "sqlite":
+            # SQLite добавляет по одному столбцу за ALTER TABLE
+            for column in ("file_sha256 CHAR(64)", "file_size BIGINT", "file_mime VARCHAR(100)"):
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} DEFAULT NULL")
+            cur.execute(f"CREATE INDEX ix_{table}_file_sha256 ON {table} (file_sha256)")
+        elif "file_sha256" not in columns:
+            cur.execute(f"""
+                ALTER TABLE {table}
+                    ADD COLUMN file_sha256 CHAR(64) DEFAULT NULL,
+                    ADD COLUMN file_size BIGINT DEFAULT NULL,
+                    ADD COLUMN file_mime VARCHAR(100) DEFAULT NULL,
+                    ADD INDEX ix_{table}_file_sha256 (file_sha256)
+            """)
+
+
+def _m006_fulltext(conn, cur):
+    """Полнотекстовые индексы для поиска по критериям, предметам и именам."""
+    ensure_fulltext(cur)
+
+
+def _m007_subject_index(conn, cur):
+    """Индекс по предмету для статистики и пересчёта оценок по предмету."""
+    ensure_indexes(cur, [SUBJECT_INDEX])
+
+
+def _m008_social_summary(conn, cur):
+    """Признаки учеников для соц. паспорта и сводка social_summary по группам."""
+    columns = _columns(cur, "students")
+    for flag in passport.FLAGS:
+        if flag not in columns:
+            cur.execute(f"ALTER TABLE students ADD COLUMN {flag} TINYINT NOT NULL DEFAULT 0")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS social_summary (
+            class VARCHAR(50) PRIMARY KEY,
+            {", ".join(c + " INT NOT NULL DEFAULT 0" for c in passport.COUNTERS)}
+        ) ENGINE=InnoDB
+    """)
+    passport.rebuild_summary(cur)
+
+
+def _m009_file_text(conn, cur):
+    """Текст файлов планов и протоколов (doctext.py) с полнотекстовым индексом."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS file_text (
+            sha256 CHAR(64) PRIMARY KEY,
+            extractor INT NOT NULL,
+            status VARCHAR(10) NOT NULL,
+            content MEDIUMTEXT,
+            error VARCHAR(255),
+            indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+    ensure_fulltext(cur)
+
+
+def _m010_change_log(conn, cur):
+    """Журнал изменений change_log, который ведут триггеры таблиц вкладок (changelog.py)."""
+    if BACKEND == "sqlite":
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                version BIGINT PRIMARY KEY AUTO_INCREMENT,
+                table_name VARCHAR(32) NOT NULL,
+                row_id INT NOT NULL,
+                op CHAR(1) NOT NULL,
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_change_log_row ON change_log (table_name, row_id, version)")
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                version BIGINT PRIMARY KEY AUTO_INCREMENT,
+                table_name VARCHAR(32) NOT NULL,
+                row_id INT NOT NULL,
+                op CHAR(1) NOT NULL,
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                INDEX ix_change_log_row (table_name, row_id, version)
+            ) ENGINE=InnoDB
+        """)
+    _change_log_triggers(cur, quiet_bulk=False)
+
+
+def _change_log_triggers(cur, quiet_bulk):
+    """(Пере)создать триггеры журнала; quiet_bulk — не писать строки во время массовой операции."""
+    for table in changelog.TRACKED:
+        for op, event, row in (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"), ("D", "DELETE", "OLD")):
+            name = f"trg_{table}_log_{op.lower()}"
+            body = f"INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {row}.id, '{op}')"
+            if BACKEND == "sqlite":
+                body = f"BEGIN {body}; END"  # в SQLite тело триггера — всегда блок
+                if quiet_bulk:
+                    body = "WHEN NOT EXISTS (SELECT 1 FROM change_log_bulk) " + body
+            elif quiet_bulk:
+                body = f"IF @edu_bulk IS NULL THEN {body}; END IF"
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cur.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW {body}")
+
+
+def _m011_bulk_changes(conn, cur):
+    """Массовые операции пишут в журнал один маркер на таблицу вместо строки на каждую запись (changelog.bulk)."""
+    if BACKEND == "sqlite":
+        # флаг массовой операции: строка живёт только внутри транзакции записи
+        cur.execute("CREATE TABLE IF NOT EXISTS change_log_bulk (active INT NOT NULL)")
+    _change_log_triggers(cur, quiet_bulk=True)
+
+
+def _m012_change_log_age(conn, cur):
+    """Индекс по времени записи для удаления старого журнала (changelog.prune)."""
+    ensure_indexes(cur, [CHANGE_LOG_AGE_INDEX])
+
+
+# (версия, описание, шаг) — только добавлять в конец, уже выпущенные шаги не менять
+MIGRATIONS = [
+    (1, "Базовые таблицы", _m001_base_tables),
+    (2, "Модуль по умолчанию", _m002_default_module),
+    (3, "Семестры s1/s2 вместо четвертей", _m003_semesters),
+    (4, "Индексы для поиска по ФИО, названию и группе", _m004_indexes),
+    (5, "Хранилище файлов планов и протоколов", _m005_file_store),
+    (6, "Полнотекстовые индексы для поиска", _m006_fulltext),
+    (7, "Индекс оценок по предмету", _m007_subject_index),
+    (8, "Сводка соц. паспорта по признакам учеников", _m008_social_summary),
+    (9, "Текст файлов для поиска по документам", _m009_file_text),
+    (10, "Журнал изменений для нескольких администраторов", _m010_change_log),
+    (11, "Маркеры массовых операций в журнале изменений", _m011_bulk_changes),
+    (12, "Индекс журнала изменений по времени записи", _m012_change_log_age),
+]
+
+ER_NO_SUCH_TABLE = 1146
+# сколько секунд ждать, пока миграции выполняет другая копия программы
+LOCK_TIMEOUT = 60
+
+
+class MigrationError(Exception):
+    """Миграции не выполнены (блокировка схемы занята другой копией программы)."""
+
+
+def current_version(cur):
+    """Версия схемы из schema_version (0 — таблицы ещё нет)."""
+    try:
+        cur.execute("SELECT MAX(version) FROM schema_version")
+    except mysql.connector.ProgrammingError as e:
+        if e.errno != ER_NO_SUCH_TABLE:
+            raise
+        return 0
+    return cur.fetchone()[0] or 0
+
+
+def migrate():
+    """Применить недостающие миграции по порядку; вернуть итоговую версию схемы."""
+    latest = MIGRATIONS[-1][0]
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            if current_version(cur) >= latest:
+                return latest
+            # несколько копий приложения могут стартовать одновременно: миграции
+            # выполняет та, что получила блокировку (в SQLite GET_LOCK — заглушка)
+            cur.execute("SELECT GET_LOCK('edu_schema_migrate', %s)", (LOCK_TIMEOUT,))
+            if cur.fetchone()[0] != 1:
+                raise MigrationError(f"Схему БД обновляет другая копия программы: блокировка не получена за {LOCK_TIMEOUT} с")
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        name VARCHAR(255),
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB
+                """)
+                version = current_version(cur)
+                for number, name, step in MIGRATIONS:
+                    if number <= version:
+                        continue
+                    log.info("Миграция %s: %s", number, name)
+                    step(conn, cur)
+                    cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (number, name))
+                    conn.commit()
+                return latest
+            finally:
+                cur.execute("SELECT RELEASE_LOCK('edu_schema_migrate')")
+                cur.fetchone()
+        finally:
+            cur.close()
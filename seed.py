@@ -0,0 +1,188 @@
+# seed.py
+# Генератор синтетических данных для замеров: заполняет схему в заданном масштабе.
+#
+# Данные детерминированы зерном seed: один и тот же запуск на пустой БД даёт
+# одинаковые строки, поэтому замеры bench.py сравнимы между версиями.
+# Строки генерируются потоково и пишутся многострочными INSERT пачками по
+# BATCH_SIZE с фиксацией после каждой — память не зависит от масштаба.
+
+import logging
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from db import connection
+from grades import final_grade
+import passport
+import changelog
+
+log = logging.getLogger("edu.seed")
+
+BATCH_SIZE = 5000
+
+# масштаб по умолчанию: (students, grades, lessons) из задания на нагрузочные замеры
+DEFAULT_SCALE = {
+    'teachers': 500,
+    'sections': 200,
+    'students': 50000,
+    'grades': 2000000,
+    'lessons': 20000,
+    'class_plans': 5000,
+    'exam_protocols': 20000,
+}
+
+SURNAMES = ("Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Васильев", "Соколов",
+            "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов",
+            "Егоров", "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров",
+            "Никитин", "Захаров", "Зайцев", "Соловьёв", "Борисов", "Яковлев", "Григорьев", "Романов",
+            "Воробьёв", "Сергеев", "Кузьмин", "Фролов", "Александров", "Дмитриев", "Королёв", "Гусев")
+FIRST_NAMES = ("Александр", "Дмитрий", "Максим", "Сергей", "Андрей", "Алексей", "Артём", "Илья",
+               "Кирилл", "Михаил", "Никита", "Матвей", "Роман", "Егор", "Арсений", "Иван",
+               "Денис", "Евгений", "Даниил", "Тимофей", "Владислав", "Игорь", "Владимир", "Павел",
+               "Руслан", "Марк", "Константин", "Тимур", "Олег", "Ярослав")
+PATRONYMICS = ("Александрович", "Дмитриевич", "Сергеевич", "Андреевич", "Алексеевич", "Иванович",
+               "Михайлович", "Николаевич", "Петрович", "Владимирович", "Евгеньевич", "Олегович",
+               "Игоревич", "Павлович", "Юрьевич", "Викторович", "Романович", "Максимович")
+SUBJECTS = ("Математика", "Физика", "Химия", "Информатика", "История", "Обществознание", "Литература",
+            "Русский язык", "Английский язык", "Казахский язык", "Биология", "География",
+            "Физическая культура", "Основы права", "Экономика", "Черчение", "Электротехника",
+            "Материаловедение", "Охрана труда", "Метрология", "Программирование", "Базы данных",
+            "Компьютерные сети", "Операционные системы", "Web-дизайн", "Графика", "Менеджмент",
+            "Маркетинг", "Бухгалтерский учёт", "Статистика", "Психология", "Философия", "Этика",
+            "Технология отрасли", "Производственная практика", "Учебная практика", "Экология",
+            "Инженерная графика", "Техническая механика", "Гидравлика", "Автоматика", "Электроника",
+            "Микропроцессоры", "Схемотехника", "Культурология", "Делопроизводство")
+WORDS = ("анализ", "выполнение", "задание", "контроль", "практика", "расчёт", "схема", "чертёж",
+         "измерение", "проверка", "отчёт", "методика", "изучение", "монтаж", "настройка", "испытание",
+         "документация", "моделирование", "проект", "лабораторная", "работа", "тема", "оценка", "навык")
+POSITIONS = ("преподаватель", "мастер п/о", "куратор", "методист", "заведующий отделением")
+LESSON_TYPES = ("комбинированный", "практический")
+
+
+def _classes(rng, count):
+    """Названия групп вида П22-4ЖК."""
+    letters = "АБВГДЕЖИКЛМНП"
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice('ПТЭМС')}{rng.randint(20, 25)}-{rng.randint(1, 9)}"
+                  f"{rng.choice(letters)}{rng.choice(letters)}")
+    return sorted(names)
+
+
+def _person(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}"
+
+
+def _insert(conn, table, sql, rows):
+    """Вставить строки из итератора пачками (executemany собирает их в многострочные INSERT).
+
+    Каждая пачка фиксируется со своим маркером журнала изменений вместо строки на каждую запись.
+    """
+    cur = conn.cursor()
+    inserted = 0
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            with changelog.bulk(cur, table):
+                cur.executemany(sql, batch)
+                inserted += cur.rowcount
+            conn.commit()
+    finally:
+        cur.close()
+    return inserted
+
+
+def _ids(conn, table, after_id):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT id FROM {table} WHERE id > %s ORDER BY id", (after_id,))
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def _max_id(conn, table):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+def generate(scale=None, seed=42):
+    """Добавить синтетические данные в масштабе scale (см. DEFAULT_SCALE); вернуть {таблица: строк}."""
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    counts = {}
+    started = time.perf_counter()
+    with connection() as conn:
+        def step(table, sql, rows):
+            t = time.perf_counter()
+            counts[table] = _insert(conn, table, sql, rows)
+            log.info("%s: %d строк за %.1f с", table, counts[table], time.perf_counter() - t)
+
+        # справочники: повторы имён с уже существующими пропускает INSERT IGNORE
+        before = _max_id(conn, "teachers")
+        names = sorted({_person(rng) for _ in range(scale['teachers'])})
+        step("teachers", "INSERT IGNORE INTO teachers (full_name, position) VALUES (%s, %s)",
+             [(n, rng.choice(POSITIONS)) for n in names])
+        teacher_ids = _ids(conn, "teachers", before) or _ids(conn, "teachers", 0)
+
+        before = _max_id(conn, "ro_sections")
+        step("ro_sections", "INSERT IGNORE INTO ro_sections (module_id, code, title, hours) VALUES (1, %s, %s, %s)",
+             [(f"РО {seed}.{i}", f"РО {seed}.{i} {rng.choice(SUBJECTS)}", rng.randint(20, 120))
+              for i in range(1, scale['sections'] + 1)])
+        section_ids = _ids(conn, "ro_sections", before) or _ids(conn, "ro_sections", 0)
+
+        # ученики: по ~25 в группе, уникальность (ФИО, группа)
+        classes = _classes(rng, max(1, scale['students'] // 25))
+        seen = set()
+        students = []
+        born = date(2003, 1, 1)
+        while len(students) < scale['students']:
+            name, cls = _person(rng), rng.choice(classes)
+            if (name, cls) in seen:
+                continue
+            seen.add((name, cls))
+            flags = [int(rng.random() < p) for p in (0.7, 0.15, 0.03, 0.02, 0.12)]
+            students.append((name, born + timedelta(days=rng.randint(0, 2500)), cls, *flags))
+        before = _max_id(conn, "students")
+        step("students", f"INSERT IGNORE INTO students (full_name, birthdate, class, {', '.join(passport.FLAGS)}) "
+                         f"VALUES (%s, %s, %s{', %s' * len(passport.FLAGS)})", students)
+        student_ids = _ids(conn, "students", before)
+
+        # оценки: у каждого ученика свой набор предметов, пара (ученик, предмет) уникальна
+        per_student = min(len(SUBJECTS), -(-scale['grades'] // max(1, len(student_ids))))
+        marks = (None, 2, 3, 3, 4, 4, 4, 5, 5)
+
+        def grade_rows():
+            for sid in student_ids:
+                for subject in rng.sample(SUBJECTS, per_student):
+                    s1, s2 = rng.choice(marks), rng.choice(marks)
+                    yield sid, subject, s1, s2, final_grade(s1, s2)
+        step("grade_reports", "INSERT IGNORE INTO grade_reports (student_id, subject, s1, s2, final_grade) "
+                              "VALUES (%s, %s, %s, %s, %s)", islice(grade_rows(), scale['grades']))
+
+        step("lessons", "INSERT INTO lessons (ro_id, number, criteria, total_hours, type) VALUES (%s, %s, %s, %s, %s)",
+             ((rng.choice(section_ids), i % 60 + 1, " ".join(rng.sample(WORDS, rng.randint(3, 8))),
+               rng.randint(1, 6), rng.choice(LESSON_TYPES)) for i in range(scale['lessons'])))
+        step("class_plans", "INSERT INTO class_plans (teacher_id, class, year) VALUES (%s, %s, %s)",
+             ((rng.choice(teacher_ids), rng.choice(classes), rng.randint(2020, 2026))
+              for _ in range(scale['class_plans'])))
+        step("exam_protocols", "INSERT INTO exam_protocols (teacher_id, subject, class, date) VALUES (%s, %s, %s, %s)",
+             ((rng.choice(teacher_ids), rng.choice(SUBJECTS), rng.choice(classes),
+               date(2020, 1, 1) + timedelta(days=rng.randint(0, 2400))) for _ in range(scale['exam_protocols'])))
+
+        cur = conn.cursor()
+        try:
+            passport.refresh_classes(cur, classes)
+            conn.commit()
+        finally:
+            cur.close()
+    log.info("Генерация завершена за %.1f с", time.perf_counter() - started)
+    return counts
@@ -0,0 +1,319 @@
+# services.py
+# Операции с данными без интерфейса: проверка ввода, поиск id по имени, запись,
+# обновление кэшей. Их вызывают окна AdminApp (в фоне) и командная строка cli.py;
+# модуль не импортирует tkinter.
+#
+# Операция из нескольких запросов выполняется одной транзакцией (db.transaction),
+# кэши обновляются только после её фиксации (db.after_commit).
+#
+# Изменение записи из окна передаёт seen — версию журнала изменений (changelog),
+# на которой запись была показана: если её с тех пор изменил или удалил другой
+# пользователь, сохранение отклоняется ConflictError, а не затирает его правку.
+
+from datetime import datetime
+
+from db import execute, fetch_all, statement, transaction, after_commit
+import changelog
+import grades
+import refcache
+import filestore
+import doctext
+import passport
+import analytics
+import importer
+
+
+class ValidationError(ValueError):
+    """Неверные входные данные; текст исключения предназначен для пользователя."""
+
+
+class ConflictError(ValidationError):
+    """Запись изменил или удалил другой пользователь после того, как она была показана."""
+
+
+# ---------- разбор значений ----------
+def _text(value):
+    return str(value).strip() if value is not None else ""
+
+
+def _required(value, message):
+    value = _text(value)
+    if not value:
+        raise ValidationError(message)
+    return value
+
+
+def _int(value, message):
+    """Целое число или None для пустого значения."""
+    value = _text(value)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError(message)
+
+
+def _date(value):
+    """Дата YYYY-MM-DD строкой или None для пустого значения."""
+    value = _text(value)
+    if not value:
+        return None
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValidationError("Дата в формате YYYY-MM-DD")
+    return value
+
+
+def _ref_id(ref, name, message):
+    """id по имени из справочника; пустое имя — None, неизвестное или неоднозначное — ошибка."""
+    name = _text(name)
+    if not name:
+        return None
+    try:
+        rid = ref.id_for(name)
+    except refcache.AmbiguousName:
+        raise ValidationError(f"{message}: {name} — таких несколько, выберите «ФИО (группа)» из списка")
+    if rid is None:
+        raise ValidationError(f"{message}: {name}")
+    return rid
+
+
+# ---------- оптимистическая блокировка ----------
+def _check_unchanged(table, row_id, seen):
+    """Внутри транзакции: заблокировать строку и убедиться, что после версии seen её не меняли."""
+    if seen is None:
+        return
+    # строка заблокирована до конца транзакции: чужая правка не вклинится между проверкой и записью
+    if not fetch_all(f"SELECT id FROM {table} WHERE id=%s FOR UPDATE", (row_id,)):
+        raise ConflictError("Запись удалена другим пользователем")
+    if changelog.row_version(table, row_id, lock=True) > seen:
+        raise ConflictError("Запись изменил другой пользователь — его правка появится в таблице, "
+                            "откройте запись и внесите изменения заново")
+
+
+def _note_saved(table, row_id, seen):
+    """Запомнить версию своей правки строки, чтобы следующее изменение не сочло её чужой."""
+    if seen is None:
+        return
+    version = changelog.row_version(table, row_id)
+    after_commit(lambda: changelog.saved(table, row_id, version))
+
+
+# ---------- уроки ----------
+def section_id(title):
+    """Найти раздел по названию или создать новый и вернуть id."""
+    ro_id = refcache.sections.id_for(title)
+    if ro_id is not None:
+        return ro_id
+    last = execute(statement("INSERT INTO ro_sections (module_id, code, title, hours) VALUES (1, %s, %s, 0)"), (title[:10], title))
+    after_commit(lambda: refcache.sections.added(last, title))
+    return last
+
+
+def _lesson_values(section, number, criteria, hours, lesson_type):
+    section = _required(section, "Раздел обязателен")
+    number = _int(number, "Номер и Часы должны быть числами")
+    hours = _int(hours, "Номер и Часы должны быть числами")
+    if number is None or hours is None:
+        raise ValidationError("Номер и Часы должны быть числами")
+    criteria = _required(criteria, "Введите тему/критерии")
+    return section, number, criteria, hours, _text(lesson_type)
+
+
+def add_lesson(section, number, criteria, hours, lesson_type):
+    """Добавить урок; вернуть id."""
+    section, *values = _lesson_values(section, number, criteria, hours, lesson_type)
+    with transaction():
+        return execute(statement("INSERT INTO lessons (ro_id, number, criteria, total_hours, type) VALUES (%s,%s,%s,%s,%s)"),
+                       [section_id(section)] + values)
+
+
+def update_lesson(lesson_id, section, number, criteria, hours, lesson_type, seen=None):
+    """Изменить урок."""
+    section, *values = _lesson_values(section, number, criteria, hours, lesson_type)
+    with transaction():
+        _check_unchanged("lessons", lesson_id, seen)
+        execute(statement("UPDATE lessons SET ro_id=%s, number=%s, criteria=%s, total_hours=%s, type=%s WHERE id=%s"),
+                [section_id(section)] + values + [lesson_id])
+        _note_saved("lessons", lesson_id, seen)
+
+
+def delete_lesson(lesson_id):
+    execute(statement("DELETE FROM lessons WHERE id=%s"), (lesson_id,))
+
+
+# ---------- педагоги ----------
+def add_teacher(full_name, position):
+    """Добавить педагога; вернуть id."""
+    full_name = _required(full_name, "ФИО обязательно")
+    tid = execute(statement("INSERT INTO teachers (full_name, position) VALUES (%s,%s)"), (full_name, _text(position)))
+    after_commit(lambda: refcache.teachers.added(tid, full_name))
+    return tid
+
+
+def update_teacher(tid, full_name, position, seen=None):
+    full_name = _required(full_name, "ФИО обязательно")
+    with transaction():
+        _check_unchanged("teachers", tid, seen)
+        execute(statement("UPDATE teachers SET full_name=%s, position=%s WHERE id=%s"), (full_name, _text(position), tid))
+        _note_saved("teachers", tid, seen)
+        after_commit(lambda: refcache.teachers.renamed(tid, full_name))
+
+
+def delete_teacher(tid):
+    execute(statement("DELETE FROM teachers WHERE id=%s"), (tid,))
+    after_commit(lambda: refcache.teachers.removed(tid))
+
+
+# ---------- ученики ----------
+def add_student(full_name, birthdate, class_name, flags=None):
+    """Добавить ученика (со сводкой соц. паспорта); вернуть id."""
+    full_name = _required(full_name, "ФИО обязательно")
+    class_name = _text(class_name)
+    sid = passport.insert_student(full_name, _date(birthdate), class_name, flags or {})
+    after_commit(lambda: refcache.students.added(sid, full_name, class_name))
+    after_commit(analytics.cache.invalidate)
+    return sid
+
+
+def update_student(sid, full_name, birthdate, class_name, flags=None, seen=None):
+    full_name = _required(full_name, "ФИО обязательно")
+    birthdate = _date(birthdate)
+    class_name = _text(class_name)
+    with transaction():
+        _check_unchanged("students", sid, seen)
+        passport.update_student(sid, full_name, birthdate, class_name, flags or {})
+        _note_saved("students", sid, seen)
+        after_commit(lambda: refcache.students.renamed(sid, full_name, class_name))
+        after_commit(analytics.cache.invalidate)  # группа ученика могла смениться
+
+
+def delete_student(sid):
+    passport.delete_student(sid)
+    after_commit(lambda: refcache.students.removed(sid))
+    after_commit(analytics.cache.invalidate)
+
+
+# ---------- планы групп ----------
+def _index_text(stored, path):
+    """После фиксации отдать загруженный файл на извлечение текста для поиска по документам."""
+    if stored and stored[0]:
+        after_commit(lambda: doctext.schedule(stored[0], path, stored[2]))
+
+
+def add_class_plan(teacher_name, class_name, year, file_name=None, path=None):
+    """Добавить план; path — файл с диска для хранилища. Вернуть id."""
+    teacher_id = _ref_id(refcache.teachers, teacher_name, "Педагог не найден")
+    year = _int(year, "Год числом")
+    with transaction():
+        stored = filestore.put_file(path) if path else (None, None, None)
+        _index_text(stored, path)
+        return execute(statement("INSERT INTO class_plans (teacher_id, class, year, file_path, file_sha256, file_size, file_mime) "
+                                 "VALUES (%s,%s,%s,%s,%s,%s,%s)"), (teacher_id, _text(class_name), year, _text(file_name) or None) + stored)
+
+
+def update_class_plan(pid, teacher_name, class_name, year, file_name=None, path=None, seen=None):
+    teacher_id = _ref_id(refcache.teachers, teacher_name, "Педагог не найден")
+    year = _int(year, "Год числом")
+    with transaction():
+        _check_unchanged("class_plans", pid, seen)
+        execute(statement("UPDATE class_plans SET teacher_id=%s, class=%s, year=%s WHERE id=%s"),
+                (teacher_id, _text(class_name), year, pid))
+        _index_text(filestore.attach("class_plans", pid, _text(file_name), path), path)
+        _note_saved("class_plans", pid, seen)
+
+
+def delete_class_plan(pid):
+    filestore.delete_row("class_plans", pid)
+
+
+# ---------- оценки ----------
+def _grade_values(student_name, subject, s1, s2):
+    student_id = _ref_id(refcache.students, student_name, "Ученик не найден")
+    s1 = _int(s1, "Оценка должна быть целым числом")
+    s2 = _int(s2, "Оценка должна быть целым числом")
+    return student_id, _text(subject), s1, s2, grades.final_grade(s1, s2)
+
+
+def add_grade(student_name, subject, s1, s2):
+    """Добавить оценку (итог — по правилу grades.final_grade); вернуть id."""
+    values = _grade_values(student_name, subject, s1, s2)
+    gid = execute(statement("INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES (%s,%s,%s,%s,%s)"), values)
+    after_commit(lambda: analytics.cache.invalidate(subject=values[1]))
+    return gid
+
+
+def update_grade(gid, student_name, subject, s1, s2, old_subject=None, seen=None):
+    values = _grade_values(student_name, subject, s1, s2)
+    with transaction():
+        _check_unchanged("grade_reports", gid, seen)
+        execute(statement("UPDATE grade_reports SET student_id=%s, subject=%s, s1=%s, s2=%s, final_grade=%s WHERE id=%s"), values + (gid,))
+        _note_saved("grade_reports", gid, seen)
+        after_commit(lambda: analytics.cache.invalidate(subject=values[1]))
+        if old_subject:
+            after_commit(lambda: analytics.cache.invalidate(subject=old_subject))
+
+
+def delete_grade(gid, subject=None):
+    execute(statement("DELETE FROM grade_reports WHERE id=%s"), (gid,))
+    after_commit(lambda: analytics.cache.invalidate(subject=subject or None))
+
+
+def save_grade_sheet(class_name, changes):
+    """Сохранить изменённые ячейки ведомости группы [(id ученика, предмет, s1, s2)] одной транзакцией."""
+    rows = []
+    for sid, subject, s1, s2 in changes:
+        subject = _required(subject, "Укажите предмет")
+        rows.append((sid, subject,
+                     _int(s1, f"{subject}: оценка должна быть целым числом"),
+                     _int(s2, f"{subject}: оценка должна быть целым числом")))
+    with transaction():
+        saved = grades.save_sheet(rows)
+        after_commit(lambda: analytics.cache.invalidate(_text(class_name) or None))
+    return saved
+
+
+def recompute_grades(class_name=None, subject=None):
+    """Пересчитать итоговые оценки группы и/или предмета; вернуть число изменённых строк."""
+    changed = grades.recompute(_text(class_name) or None, _text(subject) or None)
+    after_commit(lambda: analytics.cache.invalidate(_text(class_name) or None, _text(subject) or None))
+    return changed
+
+
+# ---------- протоколы экзаменов ----------
+def add_exam(teacher_name, subject, class_name, exam_date, file_name=None, path=None):
+    """Добавить протокол; path — файл с диска для хранилища. Вернуть id."""
+    teacher_id = _ref_id(refcache.teachers, teacher_name, "Педагог не найден")
+    exam_date = _date(exam_date)
+    with transaction():
+        stored = filestore.put_file(path) if path else (None, None, None)
+        _index_text(stored, path)
+        return execute(statement("INSERT INTO exam_protocols (teacher_id, subject, class, date, file_path, file_sha256, file_size, file_mime) "
+                                 "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)"),
+                       (teacher_id, _text(subject), _text(class_name), exam_date, _text(file_name) or None) + stored)
+
+
+def update_exam(eid, teacher_name, subject, class_name, exam_date, file_name=None, path=None, seen=None):
+    teacher_id = _ref_id(refcache.teachers, teacher_name, "Педагог не найден")
+    exam_date = _date(exam_date)
+    with transaction():
+        _check_unchanged("exam_protocols", eid, seen)
+        execute(statement("UPDATE exam_protocols SET teacher_id=%s, subject=%s, class=%s, date=%s WHERE id=%s"),
+                (teacher_id, _text(subject), _text(class_name), exam_date, eid))
+        _index_text(filestore.attach("exam_protocols", eid, _text(file_name), path), path)
+        _note_saved("exam_protocols", eid, seen)
+
+
+def delete_exam(eid):
+    filestore.delete_row("exam_protocols", eid)
+
+
+# ---------- пакетные операции ----------
+def import_file(kind, path, dry_run=False):
+    """Импорт учеников или оценок из CSV/XLSX (см. importer.run_import)."""
+    report = importer.run_import(kind, path, dry_run=dry_run)
+    if not dry_run:
+        after_commit(analytics.cache.invalidate)
+    return report
@@ -0,0 +1,83 @@
+# snapshot.py
+# Снимок справочников (refcache) и первых страниц вкладок в файле профиля
+# пользователя: окно при запуске показывает его сразу, не дожидаясь сети, а
+# данные из БД приходят следом и заменяют снимок.
+#
+# Файл — gzip с JSON; FORMAT поднимается при изменении содержимого. Снимок
+# привязан к БД (сервер и база или файл SQLite) и не показывается для другой
+# БД, другого формата или если он старше max_age_days.
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from config import DB_CONFIG, SQLITE_CONFIG, SNAPSHOT_CONFIG
+from db import BACKEND
+
+FORMAT = 2
+
+log = logging.getLogger("edu.snapshot")
+
+
+def _database():
+    if BACKEND == "sqlite":
+        return f"sqlite:{os.path.abspath(SQLITE_CONFIG['path'])}"
+    return f"mysql:{DB_CONFIG['host']}/{DB_CONFIG['database']}"
+
+
+class Snapshot:
+    """Прочитанный снимок: версия схемы, справочники {таблица: данные} и вкладки {ключ: (строки, всего)}."""
+
+    def __init__(self, data):
+        self.saved_at = datetime.fromisoformat(data['saved_at'])
+        self.schema = data['schema']
+        self.refs = data['refs']
+        self.tabs = {key: (tab['rows'], tab['total']) for key, tab in data['tabs'].items()}
+
+
+def load(path=None):
+    """Прочитать снимок; None, если его нет, он повреждён, от другой БД или устарел."""
+    path = path or SNAPSHOT_CONFIG['path']
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get('format') != FORMAT or data.get('database') != _database():
+            return None
+        snap = Snapshot(data)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log.warning("Снимок %s не прочитан: %s", path, e)
+        return None
+    if datetime.now() - snap.saved_at > timedelta(days=SNAPSHOT_CONFIG['max_age_days']):
+        return None
+    return snap
+
+
+def save(schema, refs, tabs, path=None):
+    """Записать снимок: refs {таблица: RefTable.snapshot()}, tabs {ключ: (строки, всего)}.
+
+    Файл пишется под временным именем и заменяется целиком; доступен только владельцу.
+    """
+    path = path or SNAPSHOT_CONFIG['path']
+    data = {
+        'format': FORMAT,
+        'database': _database(),
+        'saved_at': datetime.now().isoformat(timespec="seconds"),
+        'schema': schema,
+        'refs': refs,
+        'tabs': {key: {'rows': rows, 'total': total} for key, (rows, total) in tabs.items()},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    part = path + ".part"
+    fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
@@ -0,0 +1,166 @@
+# sqlite_backend.py
+# Встроенная БД SQLite для одного пользователя без сервера MySQL (DB_BACKEND=sqlite).
+#
+# Соединение ведёт себя как соединение mysql.connector в объёме, который использует
+# приложение: курсор с column_names, ping(), in_transaction, ошибки тех же классов
+# mysql.connector. Запросы приложения написаны для MySQL; translate() переводит
+# их на диалект SQLite (%s → ?, INSERT IGNORE, ON DUPLICATE KEY UPDATE, DIV,
+# MATCH ... AGAINST, NOW() - INTERVAL, FOR UPDATE, DDL), GET_LOCK/RELEASE_LOCK — функции-заглушки. Нужен SQLite 3.35+ (upsert без указания ключа).
+
+import re
+import sqlite3
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+
+ER_NO_SUCH_TABLE = 1146
+
+# (шаблон MySQL, замена SQLite) — применяются по порядку
+_RULES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    (re.compile(r"\bDIV\b", re.I), "/"),  # целые операнды: деление в SQLite целочисленное
+    (re.compile(r"\bMATCH\s*\(([^)]+)\)\s*AGAINST\s*\(\s*\?\s+IN\s+BOOLEAN\s+MODE\s*\)", re.I), r"edu_match(\1, ?)"),
+    (re.compile(r"\bLIKE\s+\?", re.I), r"LIKE ? ESCAPE '\\'"),  # в MySQL обратная косая черта — экранирование по умолчанию
+    (re.compile(r"\bNOW\(\)\s*-\s*INTERVAL\s+\?\s+SECOND\b", re.I), "datetime('now', '-' || ? || ' seconds')"),  # UTC, как CURRENT_TIMESTAMP
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),  # запись в SQLite и так блокирует всю БД
+    (re.compile(r"\b(?:BIG)?INT\s+PRIMARY\s+KEY\s+AUTO_INCREMENT\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\)\s*ENGINE\s*=\s*\w+", re.I), ")"),
+    (re.compile(r"\bDROP\s+INDEX\s+(\w+)\s+ON\s+\w+", re.I), r"DROP INDEX \1"),
+]
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """Запрос приложения (MySQL) на диалекте SQLite; литералы с %s в запросах не используются."""
+    for pattern, replacement in _RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+# ---------- MATCH ... AGAINST в логическом режиме ----------
+_WORD = re.compile(r"\w+")
+
+
+def _match(text, query):
+    """Совпадение text с запросом FULLTEXT в логическом режиме (+слово обязательно, -слово запрещено, * — префикс)."""
+    if text is None or query is None:
+        return 0
+    words = _WORD.findall(text.lower())
+
+    def found(term):
+        if term.endswith("*"):
+            return any(w.startswith(term[:-1]) for w in words)
+        return term in words
+
+    optional, required = [], False
+    for term in query.lower().split():
+        if term.startswith("+"):
+            if not found(term[1:]):
+                return 0
+            required = True
+        elif term.startswith("-"):
+            if found(term[1:]):
+                return 0
+        else:
+            optional.append(term)
+    # без обязательных слов строка должна содержать хотя бы одно из остальных
+    if optional and not required and not any(found(t) for t in optional):
+        return 0
+    return 1
+
+
+# ---------- типы ----------
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+
+
+def _mysql_error(e):
+    """Ошибка sqlite3 как ошибка mysql.connector того же смысла (её ловит остальной код)."""
+    text = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        return mysql.connector.IntegrityError(msg=text)
+    if isinstance(e, sqlite3.OperationalError):
+        if text.startswith("no such table"):
+            return mysql.connector.ProgrammingError(msg=text, errno=ER_NO_SUCH_TABLE)
+        if "locked" in text or "busy" in text:
+            return mysql.connector.OperationalError(msg=text)
+        return mysql.connector.ProgrammingError(msg=text)
+    return mysql.connector.DatabaseError(msg=text)
+
+
+class Cursor(sqlite3.Cursor):
+    """Курсор, принимающий запросы в синтаксисе MySQL."""
+
+    def execute(self, sql, params=()):
+        try:
+            return super().execute(translate(sql), params)
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def executemany(self, sql, rows):
+        try:
+            return super().executemany(translate(sql), rows)
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self.description or ())
+
+
+class Connection(sqlite3.Connection):
+    def cursor(self, factory=Cursor):
+        return super().cursor(factory)
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        """Локальный файл не обрывается; метод для совместимости с пулом."""
+
+
+def connect(config):
+    """Открыть файл БД с настройками для одного пользователя: WAL, синхронизация NORMAL, кэш в памяти."""
+    try:
+        conn = sqlite3.connect(config['path'], factory=Connection, detect_types=sqlite3.PARSE_DECLTYPES,
+                               timeout=config['busy_timeout_ms'] / 1000, check_same_thread=False)
+    except sqlite3.Error as e:
+        raise _mysql_error(e) from e
+    conn.create_function("edu_match", 2, _match, deterministic=True)
+    # именованные блокировки MySQL: запись в файл и так идёт по одной, блокировка всегда «получена»
+    conn.create_function("GET_LOCK", 2, lambda name, timeout: 1)
+    conn.create_function("RELEASE_LOCK", 1, lambda name: 1)
+    for pragma in ("journal_mode = WAL",
+                   "synchronous = NORMAL",
+                   "foreign_keys = ON",
+                   "temp_store = MEMORY",
+                   f"cache_size = -{config['cache_mb'] * 1024}",
+                   f"mmap_size = {config['mmap_mb'] * 1024 * 1024}"):
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+
+# ---------- сведения о схеме (вместо information_schema) ----------
+INDEXES_SQL = "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'"
+
+
+def columns(cur, table):
+    cur.execute(f"PRAGMA table_info({table})")
+    return {r[1] for r in cur.fetchall()}
+
+
+_INDEX_IN_PLAN = re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING INTEGER PRIMARY KEY")
+
+
+def explain(cur, sql, params):
+    """План запроса: (использованный индекс или None, описание шага)."""
+    cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+    details = [row[-1] for row in cur.fetchall()]
+    for detail in details:
+        m = _INDEX_IN_PLAN.search(detail)
+        if m:
+            return m.group(1) or "PRIMARY", detail
+    return None, "; ".join(details)
@@ -0,0 +1,180 @@
+# tasks.py
+# Выполнение запросов к БД в рабочих потоках с возвратом результата в поток Tk.
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from db import transaction
+import querylog
+
+
+class BackgroundRunner:
+    """Пул рабочих потоков для операций с БД; колбэки вызываются в главном потоке через after().
+
+    Задачи с одинаковым key вытесняют друг друга: результат устаревшей задачи
+    отбрасывается, а ещё не начатая — отменяется.
+    """
+
+    def __init__(self, widget, workers=4, poll_ms=30, on_error=None, writer=None):
+        self.widget = widget
+        self.writer = writer
+        self.poll_ms = poll_ms
+        self.on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self._results = queue.SimpleQueue()
+        self._generations = {}
+        self._futures = {}
+        self._pending = Counter()
+        self._closed = False
+        self._poll()
+
+    def submit(self, fn, *args, key=None, on_done=None, on_error=None, label=None, **kwargs):
+        """Запустить fn(*args, **kwargs) в фоне; on_done(result) / on_error(exc) — в потоке Tk.
+
+        label — действие для учёта запросов (querylog), по умолчанию имя fn.
+        """
+        fn = querylog.labelled(label or getattr(fn, '__qualname__', repr(fn)), fn)
+        gen = None
+        if key is not None:
+            gen = self._generations.get(key, 0) + 1
+            self._generations[key] = gen
+            previous = self._futures.get(key)
+            if previous is not None:
+                previous.cancel()
+        future = self._executor.submit(fn, *args, **kwargs)
+        if key is not None:
+            self._futures[key] = future
+        return self._track(future, key, gen, on_done, on_error)
+
+    def submit_write(self, fn, *args, on_done=None, on_error=None, label=None, **kwargs):
+        """Запустить правку в фоне: через отложенную запись (writer), если она включена, иначе как submit."""
+        if self.writer is None:
+            return self.submit(fn, *args, on_done=on_done, on_error=on_error, label=label, **kwargs)
+        fn = querylog.labelled(label or getattr(fn, '__qualname__', repr(fn)), fn)
+        return self._track(self.writer.submit(fn, *args, **kwargs), None, None, on_done, on_error)
+
+    def _track(self, future, key, gen, on_done, on_error):
+        self._pending[key] += 1
+        future.add_done_callback(lambda f: self._results.put((key, gen, f, on_done, on_error)))
+        return future
+
+    def cancel(self, key):
+        """Отменить задачу key: её результат больше не будет доставлен."""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        previous = self._futures.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+
+    def busy(self, key=None):
+        """Есть ли незавершённые задачи с данным ключом."""
+        return self._pending[key] > 0
+
+    def report_error(self, exc):
+        if self.on_error:
+            self.on_error(exc)
+        else:
+            raise exc
+
+    def _poll(self):
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(*item)
+        if not self._closed:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _deliver(self, key, gen, future, on_done, on_error):
+        self._pending[key] -= 1
+        if key is not None:
+            if self._generations.get(key) != gen:
+                return  # результат вытесненной задачи
+            self._futures.pop(key, None)
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            (on_error or self.report_error)(exc)
+        elif on_done is not None:
+            on_done(future.result())
+
+    def shutdown(self):
+        """Остановить опрос и не ждать незавершённые задачи (накопленные правки writer дописываются)."""
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.writer is not None:
+            self.writer.close()
+
+
+class WriteBehind:
+    """Отложенная запись: правки, пришедшие подряд в пределах delay_ms, выполняются одной транзакцией.
+
+    Каждая правка идёт в своей точке сохранения — ошибка одной не отменяет
+    остальные; результаты отдаются только после общей фиксации.
+    """
+
+    def __init__(self, delay_ms=50, max_batch=100):
+        self.delay = delay_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        done = []
+        try:
+            with transaction():
+                for future, fn, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction():
+                            done.append((future, fn(*args, **kwargs), None))
+                    except Exception as e:
+                        done.append((future, None, e))
+        except Exception as e:
+            # не удалось зафиксировать пакет: ни одна правка не сохранена
+            for future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, exc in done:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+    def close(self):
+        """Дописать накопленные правки и остановить поток."""
+        self._queue.put(None)
+        self._thread.join()
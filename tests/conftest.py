@@ -0,0 +1,42 @@
+# tests/conftest.py
+# Тесты идут на временной БД SQLite (DB_BACKEND=sqlite): сервер MySQL не нужен.
+# Переменные окружения задаются до импорта модулей приложения — config читает их при импорте.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="edu-tests-"), "edu.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Схема временной БД — один раз на прогон; записи каждый тест создаёт свои."""
+    import schema
+    schema.migrate()
+
+
+@pytest.fixture
+def memory_db():
+    """Соединение SQLite в памяти через sqlite_backend: запросы в синтаксисе MySQL переводятся translate()."""
+    import sqlite_backend
+    from config import SQLITE_CONFIG
+    conn = sqlite_backend.connect(dict(SQLITE_CONFIG, path=":memory:"))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def mysql_db():
+    """Соединение с сервером MySQL из DB_* — только при EDU_TEST_MYSQL=1 (тесты с ним не пишут в таблицы)."""
+    if os.getenv("EDU_TEST_MYSQL") != "1":
+        pytest.skip("MySQL: задайте EDU_TEST_MYSQL=1 и DB_HOST/DB_USER/DB_PASSWORD/DB_NAME")
+    import mysql.connector
+    from config import DB_CONFIG
+    conn = mysql.connector.connect(**DB_CONFIG)
+    yield conn
+    conn.close()
@@ -0,0 +1,60 @@
+# tests/test_changelog.py
+
+import mysql.connector
+import pytest
+
+from db import execute, fetch_all
+import changelog
+import grades
+import services
+
+
+def _log_since(version):
+    return fetch_all("SELECT table_name, row_id, op FROM change_log WHERE version > %s ORDER BY version", (version,))
+
+
+def test_bulk_operations_write_one_marker_per_table():
+    services.add_student("Массовый Илья Ильич", "", "МС-1")
+    for subject in ("Алгебра", "Химия", "Физика"):
+        gid = services.add_grade("Массовый Илья Ильич", subject, 4, 5)
+    sync = changelog.ChangeSync(prune=False)
+    sync.poll()
+    start = changelog.latest_version()
+    execute("UPDATE grade_reports SET final_grade=NULL WHERE subject IN (%s, %s, %s)", ("Алгебра", "Химия", "Физика"))
+    per_row = changelog.latest_version()
+    assert per_row - start >= 3
+
+    assert grades.recompute(class_name="МС-1") == 3
+    assert _log_since(per_row) == [("grade_reports", 0, changelog.BULK)]
+
+    changes = sync.poll()
+    assert changes.reloaded == {"grade_reports"}
+    assert "grade_reports" not in changes.tables
+    # правка из окна, открытого до массовой операции, — конфликт
+    assert changelog.row_version("grade_reports", gid) > per_row
+
+    # после блока триггеры снова пишут строки
+    services.update_grade(gid, "Массовый Илья Ильич", "Физика", 3, 3)
+    assert _log_since(changelog.latest_version() - 1) == [("grade_reports", gid, "U")]
+
+
+def test_failed_bulk_operation_leaves_no_marker_and_logging_on():
+    start = changelog.latest_version()
+    with pytest.raises(mysql.connector.IntegrityError):
+        grades.save_sheet([(10 ** 9, "Нет ученика", 5, 5)])  # внешний ключ на students
+    assert changelog.latest_version() == start
+    assert fetch_all("SELECT COUNT(*) FROM change_log_bulk") == [(0,)]
+    sid = services.add_student("После Сбоя Антон", "", "МС-2")
+    assert _log_since(start) == [("students", sid, "I")]
+
+
+def test_prune_compares_age_on_the_server():
+    old = services.add_student("Давний Пётр Петрович", "", "МС-3")
+    start = changelog.latest_version()
+    services.add_student("Свежий Олег Олегович", "", "МС-3")
+    execute("UPDATE change_log SET changed_at = NOW() - INTERVAL %s SECOND WHERE version <= %s", (2 * 86400, start))
+    assert changelog.prune(keep_days=1) >= 1
+    rows = fetch_all("SELECT table_name, row_id FROM change_log WHERE version <= %s", (changelog.latest_version(),))
+    assert ("students", old) not in rows
+    assert len(_log_since(start)) == 1
+    assert changelog.prune(keep_days=1) == 0
@@ -0,0 +1,49 @@
+# tests/test_cli.py
+
+import re
+
+import cli
+from db import PoolTimeout
+import paging
+import schema
+import services
+
+
+def test_database_errors_return_nonzero(monkeypatch, caplog):
+    def busy(args):
+        raise PoolTimeout("Нет свободных соединений в пуле")
+    monkeypatch.setattr(cli, "cmd_changes", busy)
+
+    assert cli.main(["changes", "list"]) == 1
+    assert "Нет свободных соединений" in caplog.text
+
+
+def test_export_one_group_of_grades(tmp_path):
+    services.add_student("Выгрузкин Олег Олегович", "", "П22-4ЖК")
+    services.add_grade("Выгрузкин Олег Олегович (П22-4ЖК)", "Математика", 5, 4)
+    services.add_student("Выгрузкин Олег Олегович", "", "П22-5ЖК")
+    path = tmp_path / "оценки.csv"
+
+    assert cli.main(["export", "grade_reports", str(path), "--eq", "s.class=П22-4ЖК",
+                     "--text", "gr.subject=математика", "-q"]) == 0
+    lines = path.read_text(encoding="utf-8-sig").splitlines()
+    assert len(lines) == 2 and "Выгрузкин Олег Олегович" in lines[1]
+
+
+def test_export_rejects_columns_outside_the_filter_bar(tmp_path, capsys):
+    # поиск слов — только по столбцам с FULLTEXT-индексом
+    assert cli.main(["export", "class_plans", str(tmp_path / "p.csv"), "--text", "cp.class=П22"]) == 2
+    assert "ft.content" in capsys.readouterr().err
+
+
+def test_text_filters_have_fulltext_indexes():
+    indexed = {(table, column) for table, name, column in schema.FULLTEXT_INDEXES}
+    for tab in paging.FILTERS:
+        spec = paging.TABS[tab]
+        # псевдоним → таблица по FROM и JOIN вкладки
+        aliases = {}
+        for table, alias in re.findall(r"(?:^|JOIN )(\w+)(?: (?!LEFT\b|ON\b)(\w+))?", f"{spec['table']} {spec.get('joins', '')}"):
+            aliases[alias or table] = table
+        for column in paging.filter_columns(tab, ('text',)):
+            alias, _, name = column.rpartition(".")
+            assert (aliases[alias or spec['table']], name) in indexed, (tab, column)
@@ -0,0 +1,158 @@
+# tests/test_db.py
+
+import time
+
+import mysql.connector
+import pytest
+
+import db
+from db import ConnectionPool, PoolTimeout, after_commit, execute, fetch_all, transaction
+from tasks import WriteBehind
+
+
+def _teachers(prefix):
+    return [r[0] for r in fetch_all("SELECT full_name FROM teachers WHERE full_name LIKE %s ORDER BY id", (prefix + "%",))]
+
+
+# ---------- единица работы ----------
+def test_nested_unit_rolls_back_only_its_savepoint():
+    with transaction():
+        execute("INSERT INTO teachers (full_name, position) VALUES (%s, %s)", ("Вложенный Внешний", "педагог"))
+        with pytest.raises(RuntimeError):
+            with transaction():
+                execute("INSERT INTO teachers (full_name, position) VALUES (%s, %s)", ("Вложенный Откат", "педагог"))
+                raise RuntimeError("откат точки сохранения")
+        execute("INSERT INTO teachers (full_name, position) VALUES (%s, %s)", ("Вложенный После", "педагог"))
+    assert _teachers("Вложенный") == ["Вложенный Внешний", "Вложенный После"]
+
+
+def test_after_commit_runs_only_after_outer_commit():
+    calls = []
+    with transaction():
+        after_commit(lambda: calls.append("внешний"))
+        with transaction():
+            after_commit(lambda: calls.append("вложенный"))
+        with pytest.raises(RuntimeError):
+            with transaction():
+                after_commit(lambda: calls.append("откатанный"))
+                raise RuntimeError
+        assert calls == []
+    assert calls == ["внешний", "вложенный"]
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            after_commit(lambda: calls.append("после отката"))
+            raise RuntimeError
+    assert calls == ["внешний", "вложенный"]
+
+
+# ---------- отложенная запись ----------
+def test_failed_write_behind_item_keeps_the_rest_of_its_batch():
+    def add(name):
+        execute("INSERT INTO teachers (full_name, position) VALUES (%s, %s)", (name, "педагог"))
+        return name
+
+    def fail(name):
+        add(name)
+        raise ValueError("ошибка одной правки")
+
+    writer = WriteBehind(delay_ms=500, max_batch=10)
+    try:
+        futures = [writer.submit(add, "Пакетный 1"), writer.submit(fail, "Пакетный 2"), writer.submit(add, "Пакетный 3")]
+        assert futures[0].result(timeout=10) == "Пакетный 1"
+        with pytest.raises(ValueError):
+            futures[1].result(timeout=10)
+        assert futures[2].result(timeout=10) == "Пакетный 3"
+    finally:
+        writer.close()
+    assert _teachers("Пакетный") == ["Пакетный 1", "Пакетный 3"]
+
+
+# ---------- пул соединений ----------
+class FakeConnection:
+    """Соединение для проверки пула без сервера: ping может «переподключиться» или не суметь."""
+
+    def __init__(self, number):
+        self.connection_id = number
+        self.in_transaction = False
+        self.pings = 0
+        self.reconnect_on_ping = False
+        self.fail_ping = False
+        self.closed = False
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        self.pings += 1
+        if self.fail_ping:
+            raise mysql.connector.InterfaceError(msg="сервер недоступен")
+        if self.reconnect_on_ping:
+            self.connection_id += 1000
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    made = []
+
+    def connect():
+        made.append(FakeConnection(len(made) + 1))
+        return made[-1]
+    return ConnectionPool(connect=connect, **kwargs), made
+
+
+def test_pool_reuses_connections_and_times_out_when_exhausted():
+    pool, made = _pool(size=2, timeout=0.05, ping_after=60)
+    a, b = pool.acquire(), pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    pool.release(a)
+    assert pool.acquire() is a
+    pool.release(a)
+    pool.release(b, broken=True)
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['created'], stats['discarded'], stats['in_use'], stats['idle']) == (3, 2, 1, 0, 1)
+    assert b.closed and len(made) == 2
+
+
+def test_pool_pings_only_after_idle_and_keeps_statements_of_live_session(monkeypatch):
+    pool, made = _pool(size=1, timeout=1, ping_after=30)
+    conn = pool.acquire()
+    prepared = FakeCursor()
+    db._statements[conn] = {"SELECT 1": (prepared, "SELECT 1")}
+    pool.release(conn)
+    assert pool.acquire() is conn and conn.pings == 0
+    pool.release(conn)
+
+    # простой дольше ping_after: ping без переподключения подготовленные запросы не трогает
+    clock = [time.monotonic() + 60]
+    monkeypatch.setattr(db.time, "monotonic", lambda: clock[0])
+    assert pool.acquire() is conn and conn.pings == 1
+    assert conn in db._statements and not prepared.closed
+    assert pool.stats()['reconnects'] == 0
+    pool.release(conn)
+
+    # ping переподключился — запросы старого сеанса закрыты, переподключение учтено
+    conn.reconnect_on_ping = True
+    clock[0] += 60
+    assert pool.acquire() is conn
+    assert conn not in db._statements and prepared.closed
+    assert pool.stats()['reconnects'] == 1
+    pool.release(conn)
+
+    # ping не удался — соединение заменено новым
+    conn.fail_ping = True
+    clock[0] += 60
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed and len(made) == 2
+    assert pool.stats()['reconnects'] == 2
+    pool.release(fresh)
@@ -0,0 +1,95 @@
+# tests/test_grades.py
+
+import pytest
+
+from db import connection, execute, fetch_all
+import grades
+import schema
+import services
+
+
+def test_recompute_counts_only_changed_rows():
+    services.add_student("Пересчётов Олег Олегович", "", "ПР-1")
+    services.add_grade("Пересчётов Олег Олегович", "Алгебра", 4, 5)
+    gid = services.add_grade("Пересчётов Олег Олегович", "Геометрия", 3, 4)
+    execute("UPDATE grade_reports SET final_grade=%s WHERE id=%s", (2, gid))
+
+    assert grades.recompute(class_name="ПР-1") == 1
+    assert fetch_all("SELECT final_grade FROM grade_reports WHERE id=%s", (gid,)) == [(4,)]
+    assert grades.recompute(class_name="ПР-1") == 0
+
+
+def _ensure_indexes():
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            schema.ensure_indexes(cur)
+            conn.commit()
+        finally:
+            cur.close()
+    return {name for table, name in _indexes() if table == "grade_reports"}
+
+
+def _indexes():
+    with connection() as conn:
+        cur = conn.cursor()
+        try:
+            return schema.existing_indexes(cur)
+        finally:
+            cur.close()
+
+
+def test_save_sheet_without_unique_key(monkeypatch):
+    sid = services.add_student("Ведомостев Юрий Юрьевич", "", "ВД-1")
+    other = services.add_student("Ведомостев Павел Юрьевич", "", "ВД-1")
+    services.add_grade("Ведомостев Юрий Юрьевич (ВД-1)", "Биология", 3, 3)
+    # повтор пары в данных: ensure_indexes оставляет вместо уникального ключа обычный индекс
+    execute("DROP INDEX uq_grade_reports_student_subject ON grade_reports")
+    execute("INSERT INTO grade_reports (student_id, subject, s1, s2, final_grade) VALUES (%s,%s,%s,%s,%s)",
+            (sid, "Биология", 2, 2, 2))
+    monkeypatch.setattr(grades, "_has_unique_key", False)
+    try:
+        assert "ix_grade_reports_student_subject" in _ensure_indexes()
+
+        assert grades.save_sheet([(sid, "Биология", 5, 4), (other, "Биология", 4, None)]) == 2
+        assert fetch_all("SELECT student_id, s1, s2, final_grade FROM grade_reports WHERE subject=%s "
+                         "ORDER BY student_id, id", ("Биология",)) == [(sid, 5, 4, 5), (sid, 5, 4, 5), (other, 4, None, 4)]
+        assert grades._has_unique_key is False
+    finally:
+        execute("DELETE FROM grade_reports WHERE student_id=%s AND subject=%s AND id > "
+                "(SELECT MIN(id) FROM grade_reports WHERE student_id=%s AND subject=%s)",
+                (sid, "Биология", sid, "Биология"))
+        assert "uq_grade_reports_student_subject" in _ensure_indexes()
+
+
+GRADES = (None, 1, 2, 3, 4, 5)
+
+
+def _literal(value):
+    return "NULL" if value is None else str(value)
+
+
+@pytest.mark.parametrize("backend", ["memory_db", "mysql_db"])
+def test_sql_rule_matches_python_rule(backend, request):
+    conn = request.getfixturevalue(backend)
+    cur = conn.cursor()
+    for s1 in GRADES:
+        for s2 in GRADES:
+            cur.execute("SELECT " + grades.final_grade_sql(_literal(s1), _literal(s2)))
+            assert cur.fetchall()[0][0] == grades.final_grade(s1, s2), (s1, s2)
+    cur.close()
+
+
+def test_semester_migration_uses_the_rule(memory_db):
+    cur = memory_db.cursor()
+    cur.execute("CREATE TABLE grade_reports (id INTEGER PRIMARY KEY, q1 INT, q2 INT, q3 INT, q4 INT, final_grade INT)")
+    cur.executemany("INSERT INTO grade_reports (q1, q2, q3, q4) VALUES (%s, %s, %s, %s)",
+                    [(3, 4, 4, 5), (2, None, None, 5), (5, 4, None, None)])
+    memory_db.commit()
+    schema._m003_semesters(memory_db, cur)
+    cur.execute("SELECT s1, s2, final_grade FROM grade_reports ORDER BY id")
+    rows = cur.fetchall()
+    assert rows == [(4, 5, 5), (2, 5, 4), (5, None, 5)]
+    for s1, s2, final in rows:
+        assert final == grades.final_grade(s1, s2)
+    cur.close()
@@ -0,0 +1,29 @@
+# tests/test_importer.py
+
+from db import fetch_all
+import importer
+import services
+
+
+def _csv(tmp_path, text):
+    path = tmp_path / "grades.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_grade_import_skips_existing_and_repeated_pairs(tmp_path):
+    sid = services.add_student("Импортов Иван Иванович", "", "ИМ-1")
+    services.add_grade("Импортов Иван Иванович", "Физика", 4, 5)
+    path = _csv(tmp_path, "ФИО;Группа;Предмет;Семестр 1;Семестр 2\n"
+                          "Импортов Иван Иванович;ИМ-1;Физика;5;5\n"
+                          "Импортов Иван Иванович;ИМ-1;Химия;3;4\n"
+                          "Импортов Иван Иванович;ИМ-1;Химия;4;4\n")
+
+    dry = importer.run_import('grades', path, dry_run=True)
+    assert dry.valid == 1
+    assert [line for line, _ in dry.errors] == [2, 4]
+
+    report = importer.run_import('grades', path)
+    assert report.inserted == 1
+    assert fetch_all("SELECT subject, s1, s2 FROM grade_reports WHERE student_id=%s ORDER BY subject",
+                     (sid,)) == [("Физика", 4, 5), ("Химия", 3, 4)]
@@ -0,0 +1,17 @@
+# tests/test_paging.py
+
+import db
+import paging
+import services
+
+
+def test_rows_by_id_are_not_registered_as_prepared():
+    ids = [services.add_teacher(f"Страничный {i}", "педагог") for i in range(3)]
+    query = paging.KeysetQuery(**paging.TABS['teachers'])
+    query.first_page()
+    registered = set(db._registry)
+
+    for n in range(1, 4):
+        assert sorted(r[0] for r in query.rows(ids[:n])) == sorted(ids[:n])
+    query.first_page((["full_name LIKE %s"], ["Страничный%"]))
+    assert set(db._registry) == registered
@@ -0,0 +1,42 @@
+# tests/test_refcache.py
+
+import pytest
+
+from db import execute, fetch_all
+import refcache
+import services
+
+
+def test_namesakes_resolved_by_name_and_group():
+    first = services.add_student("Тёзкин Пётр Петрович", "", "ТЗ-1")
+    second = services.add_student("Тёзкин Пётр Петрович", "", "ТЗ-2")
+    refcache.students.reload()
+
+    assert "Тёзкин Пётр Петрович (ТЗ-1)" in refcache.students.names()
+    assert "Тёзкин Пётр Петрович (ТЗ-2)" in refcache.students.names()
+    with pytest.raises(services.ValidationError):
+        services.add_grade("Тёзкин Пётр Петрович", "История", 4, 4)
+
+    gid = services.add_grade("Тёзкин Пётр Петрович (ТЗ-2)", "История", 4, 4)
+    assert fetch_all("SELECT student_id FROM grade_reports WHERE id=%s", (gid,)) == [(second,)]
+
+    # незагруженный справочник — поиском в БД
+    fresh = refcache.RefTable("students", "full_name", group_column="class")
+    assert fresh.id_for("Тёзкин Пётр Петрович (ТЗ-1)") == first
+    with pytest.raises(refcache.AmbiguousName):
+        fresh.id_for("Тёзкин Пётр Петрович")
+
+
+def test_names_show_records_added_and_reloaded():
+    services.add_teacher("Списков Альфа", "педагог")
+    refcache.teachers.reload()
+    assert "Списков Альфа" in refcache.teachers.names()
+
+    # своя запись — через added(), без перечитывания
+    services.add_teacher("Списков Бета", "педагог")
+    assert "Списков Бета" in refcache.teachers.names()
+
+    # запись в обход кэша появляется после reload()
+    execute("INSERT INTO teachers (full_name, position) VALUES (%s, %s)", ("Списков Гамма", "педагог"))
+    refcache.teachers.reload()
+    assert "Списков Гамма" in refcache.teachers.names()
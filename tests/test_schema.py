@@ -0,0 +1,54 @@
+# tests/test_schema.py
+
+import pytest
+
+import db
+import schema
+import sqlite_backend
+from config import SQLITE_CONFIG
+
+
+def test_migrate_fresh_database_with_single_connection_pool(tmp_path, monkeypatch):
+    # проверки индексов во время миграции не берут второе соединение из пула
+    monkeypatch.setitem(SQLITE_CONFIG, 'path', str(tmp_path / "fresh.db"))
+    monkeypatch.setattr(db, "_pool", db.ConnectionPool(size=1, timeout=0.5))
+    try:
+        schema.migrate()
+        with db.connection() as conn:
+            cur = conn.cursor()
+            assert schema.current_version(cur) == schema.MIGRATIONS[-1][0]
+            assert ("grade_reports", "uq_grade_reports_student_subject") in schema.existing_indexes(cur)
+            assert ("change_log", "ix_change_log_changed_at") in schema.existing_indexes(cur)
+            cur.close()
+    finally:
+        db._pool.close()
+
+
+def test_migrate_refuses_when_another_copy_holds_the_lock(tmp_path, monkeypatch):
+    def connect():
+        conn = sqlite_backend.connect(dict(SQLITE_CONFIG, path=str(tmp_path / "locked.db")))
+        conn.create_function("GET_LOCK", 2, lambda name, timeout: 0)  # блокировку держит другая копия
+        return conn
+    monkeypatch.setattr(db, "_pool", db.ConnectionPool(size=1, timeout=0.5, connect=connect))
+    try:
+        with pytest.raises(schema.MigrationError):
+            schema.migrate()
+        with db.connection() as conn:
+            cur = conn.cursor()
+            assert schema.current_version(cur) == 0
+            cur.close()
+    finally:
+        db._pool.close()
+
+
+def test_index_migrations_do_the_same_on_every_database(memory_db):
+    cur = memory_db.cursor()
+    steps = {number: step for number, name, step in schema.MIGRATIONS}
+    for number in (1, 2, 3, 4):
+        steps[number](memory_db, cur)
+    names = {name for table, name in schema.existing_indexes(cur)}
+    assert {name for table, name, columns, unique in schema.INDEXES_V4} <= names
+    assert "ix_grade_reports_subject" not in names
+    steps[7](memory_db, cur)
+    assert "ix_grade_reports_subject" in {name for table, name in schema.existing_indexes(cur)}
+    cur.close()
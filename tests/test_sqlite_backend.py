@@ -0,0 +1,89 @@
+# tests/test_sqlite_backend.py
+# Правила translate(): запросы в синтаксисе MySQL выполняются на SQLite в памяти.
+
+import mysql.connector
+import pytest
+
+import sqlite_backend
+
+
+def _all(conn, sql, params=()):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+@pytest.fixture
+def db(memory_db):
+    _all(memory_db, """
+        CREATE TABLE marks (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            name VARCHAR(50) NOT NULL,
+            grade INT,
+            note TEXT,
+            UNIQUE (name)
+        ) ENGINE=InnoDB
+    """)
+    return memory_db
+
+
+def test_div_is_integer_division(db):
+    assert _all(db, "SELECT 7 DIV 2, (4 + 5 + 1) DIV 2") == [(3, 5)]
+
+
+def test_on_duplicate_key_update_and_insert_ignore(db):
+    upsert = "INSERT INTO marks (name, grade) VALUES (%s, %s) ON DUPLICATE KEY UPDATE grade=VALUES(grade)"
+    _all(db, upsert, ("Иванов", 3))
+    _all(db, upsert, ("Иванов", 5))
+    _all(db, "INSERT IGNORE INTO marks (name, grade) VALUES (%s, %s)", ("Иванов", 2))
+    assert _all(db, "SELECT name, grade FROM marks") == [("Иванов", 5)]
+
+
+def test_for_update_is_dropped(db):
+    _all(db, "INSERT INTO marks (name) VALUES (%s)", ("Петров",))
+    assert sqlite_backend.translate("SELECT id FROM marks WHERE name=%s FOR UPDATE") == \
+        "SELECT id FROM marks WHERE name=?"
+    assert _all(db, "SELECT name FROM marks WHERE id=%s FOR UPDATE", (1,)) == [("Петров",)]
+
+
+def test_match_against_boolean_mode(db):
+    cur = db.cursor()
+    cur.executemany("INSERT INTO marks (name, note) VALUES (%s, %s)",
+                    [("а", "Контрольная работа по алгебре"), ("б", "Работа над ошибками"), ("в", None)])
+    cur.close()
+
+    def found(query):
+        return [r[0] for r in _all(db, "SELECT name FROM marks WHERE MATCH(note) AGAINST (%s IN BOOLEAN MODE) "
+                                       "ORDER BY name", (query,))]
+    assert found("+работ*") == ["а", "б"]
+    assert found("+работ* +алгебр*") == ["а"]
+    assert found("+работ* -ошибками") == ["а"]
+    assert found("контрольная ошибками") == ["а", "б"]
+
+
+def test_like_escapes_backslash_like_mysql(db):
+    _all(db, "INSERT INTO marks (name) VALUES (%s), (%s)", ("a_b", "axb"))
+    assert _all(db, "SELECT name FROM marks WHERE name LIKE %s", ("a\\_b",)) == [("a_b",)]
+
+
+def test_drop_index_on_table(db):
+    _all(db, "CREATE INDEX ix_marks_grade ON marks (grade)")
+    _all(db, "DROP INDEX ix_marks_grade ON marks")
+    assert ("marks", "ix_marks_grade") not in set(_all(db, sqlite_backend.INDEXES_SQL))
+
+
+def test_named_locks(db):
+    assert _all(db, "SELECT GET_LOCK('edu_schema_migrate', 60)") == [(1,)]
+    assert _all(db, "SELECT RELEASE_LOCK('edu_schema_migrate')") == [(1,)]
+
+
+def test_errors_use_mysql_connector_classes(db):
+    _all(db, "INSERT INTO marks (name) VALUES (%s)", ("Сидоров",))
+    with pytest.raises(mysql.connector.IntegrityError):
+        _all(db, "INSERT INTO marks (name) VALUES (%s)", ("Сидоров",))
+    with pytest.raises(mysql.connector.ProgrammingError) as e:
+        _all(db, "SELECT * FROM no_such_table")
+    assert e.value.errno == sqlite_backend.ER_NO_SUCH_TABLE
@@ -0,0 +1,508 @@
+# widgets.py
+# Переиспользуемые виджеты админки.
+
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+
+import grades
+import paging
+from config import UI_CONFIG
+
+
+class PagedTree:
+    """Treeview с постраничной подгрузкой по id (keyset) и ограниченным окном строк.
+
+    В виджете держится не больше max_pages страниц: при прокрутке вниз подгружаются
+    более старые записи (id < нижнего), а верх окна отбрасывается; при прокрутке
+    обратно вверх отброшенные записи запрашиваются заново (id > верхнего).
+    Запросы выполняются через runner (tasks.BackgroundRunner) вне потока Tk.
+    """
+
+    def __init__(self, parent, columns, headers, widths, table, fields, id_column, runner,
+                 joins="", page_size=200, max_pages=3, height=18):
+        self.runner = runner
+        self.query = paging.KeysetQuery(table, fields, id_column, joins, page_size)
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.total = 0
+        self._filter = ([], [])  # условия фильтра (FilterBar) и их параметры — ко всем запросам
+        self.on_loaded = None  # вызывается после показа первой страницы
+        self._more_below = False
+        self._more_above = False
+        self._loading = False
+        self.stale_since = None  # время снимка, пока показаны строки из него, а не из БД
+
+        self.frame = tk.Frame(parent)
+        body = tk.Frame(self.frame)
+        body.pack(fill=tk.BOTH, expand=True)
+        tree = ttk.Treeview(body, columns=columns, show="headings", height=height)
+        for c, h, w in zip(columns, headers, widths):
+            tree.heading(c, text=h); tree.column(c, width=w)
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=self._on_scroll)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = tree
+
+        self.status = tk.Label(self.frame, anchor="e")
+        self.status.pack(fill=tk.X)
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    # ---------- запросы ----------
+    # фильтр передаётся одним значением: его может заменить поток Tk
+    def _count(self):
+        return self.query.count(self._filter)
+
+    def _first_page(self):
+        return self.query.first_page(self._filter)
+
+    def _submit(self, fn, *args, **kwargs):
+        # в учёте запросов (querylog) действие — таблица вкладки и операция
+        label = f"{self.query.table.split()[0]}.{fn.__name__.strip('_')}"
+        return self.runner.submit(fn, *args, label=label, **kwargs)
+
+    def _older_page(self, before_id):
+        return self.query.older_page(before_id, self._filter)
+
+    def _newer_page(self, after_id):
+        return self.query.newer_page(after_id, self._filter)
+
+    def _row(self, row_id):
+        return self.query.row(row_id, self._filter)
+
+    def _rows(self, row_ids):
+        return self.query.rows(row_ids, self._filter)
+
+    @property
+    def conditions(self):
+        """Текущий фильтр (условия, параметры) — например, для выгрузки вкладки."""
+        return self._filter
+
+    def set_filter(self, where, params):
+        """Задать условия фильтра (список SQL-условий и их параметры) и перечитать таблицу."""
+        self._filter = (list(where), list(params))
+        self.reload()
+
+    # ---------- окно строк ----------
+    def reload(self):
+        """Перечитать первую страницу и общее количество записей (в фоне)."""
+        # повторный вызов вытесняет незавершённую загрузку (тот же key);
+        # до прихода первой страницы подгрузка при прокрутке не запускается.
+        # Страница показывается сразу, количество (на больших таблицах дольше) — когда придёт
+        self._loading = True
+        self.total = None
+        self._set_busy()
+        self._submit(self._first_page, key=self, on_done=self._show_first, on_error=self._failed)
+        self._submit(self._count, key=(self, "count"), on_done=self._show_count,
+                     on_error=self.runner.report_error)
+
+    def _show_count(self, total):
+        self.total = total
+        if not self._loading:
+            self._update_status()
+
+    def _show_first(self, rows):
+        self._loading = False
+        self.stale_since = None
+        self.tree.delete(*self.tree.get_children())
+        for r in rows:
+            self.tree.insert("", tk.END, iid=r[0], values=r)
+        self._more_above = False
+        self._more_below = len(rows) == self.page_size
+        self.tree.yview_moveto(0)
+        self._update_status()
+        if self.on_loaded:
+            self.on_loaded()
+
+    # ---------- снимок (snapshot.py) ----------
+    def show_cached(self, rows, total, saved_at):
+        """Показать первую страницу из снимка до прихода данных из БД; строки помечаются как устаревшие."""
+        if not self._loading or self.tree.get_children():
+            return  # данные из БД уже пришли
+        for r in rows:
+            self.tree.insert("", tk.END, iid=r[0], values=r)
+        self.total = total
+        self.stale_since = saved_at
+        self._set_busy()
+
+    def snapshot_page(self):
+        """Показанная первая страница без фильтра для снимка: (строки, всего); None — сейчас нечего сохранять."""
+        if self._filter[0] or self._more_above or self._loading or self.stale_since is not None:
+            return None
+        rows = [[v if isinstance(v, (int, float)) else str(v) for v in self.tree.item(iid, "values")]
+                for iid in self.tree.get_children()[:self.page_size]]
+        return rows, self.total
+
+    def _failed(self, exc):
+        self._loading = False
+        self._update_status()
+        self.runner.report_error(exc)
+
+    def _edge_id(self, index):
+        children = self.tree.get_children()
+        return int(children[index]) if children else None
+
+    def _append_older(self, rows):
+        self._loading = False
+        anchor = self._top_visible()
+        for r in rows:
+            self.tree.insert("", tk.END, iid=r[0], values=r)
+        self._more_below = len(rows) == self.page_size
+        excess = len(self.tree.get_children()) - self.max_rows
+        if excess > 0:
+            self.tree.delete(*self.tree.get_children()[:excess])
+            self._more_above = True
+        self._restore_view(anchor)
+
+    def _prepend_newer(self, rows):
+        self._loading = False
+        anchor = self._top_visible()
+        for i, r in enumerate(rows):
+            self.tree.insert("", i, iid=r[0], values=r)
+        self._more_above = len(rows) == self.page_size
+        excess = len(self.tree.get_children()) - self.max_rows
+        if excess > 0:
+            self.tree.delete(*self.tree.get_children()[-excess:])
+            self._more_below = True
+        self._restore_view(anchor)
+
+    # ---------- точечные изменения после add/edit/delete ----------
+    def row_inserted(self, row_id):
+        """Добавить в начало окна только что вставленную запись (по lastrowid)."""
+        self._submit(self._row, row_id, on_done=self._show_inserted, on_error=self._failed)
+
+    def row_updated(self, row_id):
+        """Перечитать одну изменённую запись и обновить её строку по iid."""
+        self._submit(self._row, row_id, on_done=lambda row: self._show_updated(row_id, row),
+                     on_error=self._failed)
+
+    def row_deleted(self, row_id):
+        """Убрать удалённую запись из окна без перезагрузки таблицы."""
+        if self.tree.exists(row_id):
+            self.tree.delete(row_id)
+        if self.total is not None:
+            self.total = max(self.total - 1, 0)
+        self._update_status()
+
+    def _show_inserted(self, row):
+        if row is None:
+            return
+        if self.tree.exists(row[0]):
+            # запись уже пришла вместе с перезагрузкой страницы
+            self.tree.item(row[0], values=row)
+            return
+        if self.total is not None:
+            self.total += 1
+        if not self._more_above:
+            # новые записи (наибольший id) видны только в самом верху окна
+            self.tree.insert("", 0, iid=row[0], values=row)
+            excess = len(self.tree.get_children()) - self.max_rows
+            if excess > 0:
+                self.tree.delete(*self.tree.get_children()[-excess:])
+                self._more_below = True
+        self._update_status()
+
+    def _show_updated(self, row_id, row):
+        if row is None:
+            self.row_deleted(row_id)
+        elif self.tree.exists(row_id):
+            self.tree.item(row_id, values=row)
+
+    # ---------- изменения других пользователей (changelog.py) ----------
+    def apply_changes(self, inserted=(), updated=(), deleted=(), visible=False, on_done=None):
+        """Применить изменения из журнала: удалённые убрать, новые и изменённые строки окна перечитать одним запросом.
+
+        Строки вне окна не запрашиваются; visible — перечитать всё окно (изменился
+        справочник, имена из которого показаны в строках). При вставках и удалениях
+        общее количество пересчитывается. on_done вызывается, когда строки обновлены.
+        """
+        for row_id in deleted:
+            if self.tree.exists(row_id):
+                self.tree.delete(row_id)
+        if visible:
+            ids = {int(iid) for iid in self.tree.get_children()}
+        else:
+            ids = {row_id for row_id in updated if self.tree.exists(row_id)}
+        new = set()
+        if not self._more_above:
+            # новые записи (наибольший id) видны только в самом верху окна
+            new = {row_id for row_id in inserted if not self.tree.exists(row_id)}
+            ids |= new
+        if inserted or deleted:
+            self._submit(self._count, key=(self, "count"), on_done=self._show_count,
+                         on_error=self.runner.report_error)
+        self._update_status()
+        if not ids:
+            if on_done:
+                on_done()
+            return
+        ids = sorted(ids)
+
+        def show(rows):
+            self._show_changed(ids, rows, new)
+            if on_done:
+                on_done()
+        self._submit(self._rows, ids, on_done=show, on_error=self._failed)
+
+    def _show_changed(self, ids, rows, new):
+        found = {row[0]: row for row in rows}
+        for row_id in ids:
+            row = found.get(row_id)
+            if row is None:
+                # удалена или больше не подходит под фильтр
+                if self.tree.exists(row_id):
+                    self.tree.delete(row_id)
+            elif self.tree.exists(row_id):
+                self.tree.item(row_id, values=row)
+            elif row_id in new and not self._more_above:
+                self.tree.insert("", 0, iid=row_id, values=row)
+        excess = len(self.tree.get_children()) - self.max_rows
+        if excess > 0:
+            self.tree.delete(*self.tree.get_children()[-excess:])
+            self._more_below = True
+        self._update_status()
+
+    def _top_visible(self):
+        return self.tree.identify_row(1) or None
+
+    def _restore_view(self, anchor):
+        children = self.tree.get_children()
+        if anchor and self.tree.exists(anchor) and children:
+            self.tree.yview_moveto(self.tree.index(anchor) / len(children))
+        self._update_status()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        if float(last) >= 0.95 and self._more_below:
+            fetch, apply, edge = self._older_page, self._append_older, self._edge_id(-1)
+        elif float(first) <= 0.05 and self._more_above:
+            fetch, apply, edge = self._newer_page, self._prepend_newer, self._edge_id(0)
+        else:
+            return
+        if edge is None:
+            return
+        self._loading = True
+        self._set_busy()
+        self._submit(fetch, edge, key=self, on_done=apply, on_error=self._failed)
+
+    def _stale_text(self):
+        return f"Показаны данные на {self.stale_since:%d.%m %H:%M} (снимок)"
+
+    def _set_busy(self):
+        if self.stale_since is not None:
+            self.status.config(text=self._stale_text() + " — обновление…", fg="darkorange")
+        else:
+            self.status.config(text="Загрузка…", fg="black")
+
+    def _update_status(self):
+        if self.stale_since is not None:
+            # загрузка из БД не удалась — на экране остаётся снимок
+            self.status.config(text=self._stale_text() + " — нет связи с БД, данные могут быть устаревшими", fg="red")
+            return
+        shown = len(self.tree.get_children())
+        total = "…" if self.total is None else self.total
+        self.status.config(text=f"Загружено {shown} из {total}", fg="black")
+
+
+class FilterBar:
+    """Строка поиска и фильтров над PagedTree: условия уходят в WHERE, ввод применяется с задержкой.
+
+    filters — список (подпись, вид, столбец[, заполнение]):
+    'text' — поиск слов (FULLTEXT), 'equals' — точное совпадение, 'number' — целое число,
+    'choice' — выпадающий список (заполнение(combo) наполняет его значениями),
+    'from' / 'to' — границы диапазона дат YYYY-MM-DD.
+    """
+
+    def __init__(self, parent, view, filters, delay_ms=None):
+        self.view = view
+        self.filters = filters
+        self.delay_ms = UI_CONFIG['search_delay_ms'] if delay_ms is None else delay_ms
+        self._after = None
+        self._applied = ([], [])
+        self.inputs = []
+        self.frame = tk.Frame(parent)
+        for spec in filters:
+            label, kind, column = spec[:3]
+            tk.Label(self.frame, text=label + ":").pack(side=tk.LEFT, padx=(5, 2))
+            if kind == 'choice':
+                widget = ttk.Combobox(self.frame, width=22)
+                widget.bind("<<ComboboxSelected>>", self._schedule)
+                spec[3](widget)
+            else:
+                widget = tk.Entry(self.frame, width=24 if kind == 'text' else 12)
+            widget.bind("<KeyRelease>", self._schedule)
+            widget.pack(side=tk.LEFT)
+            self.inputs.append(widget)
+        tk.Button(self.frame, text="Сбросить", command=self.clear).pack(side=tk.LEFT, padx=5)
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def clear(self):
+        for widget in self.inputs:
+            widget.delete(0, tk.END)
+        self.apply()
+
+    def _schedule(self, event=None):
+        # каждое нажатие откладывает запрос: он уходит, когда ввод замер на delay_ms
+        if self._after is not None:
+            self.frame.after_cancel(self._after)
+        self._after = self.frame.after(self.delay_ms, self.apply)
+
+    def conditions(self):
+        """Собрать (условия, параметры) из заполненных полей; неверные значения подсвечиваются и пропускаются."""
+        where, params = [], []
+        for spec, widget in zip(self.filters, self.inputs):
+            kind, column = spec[1], spec[2]
+            value = widget.get().strip()
+            valid = True
+            if not value:
+                pass
+            elif kind == 'text':
+                w, p = paging.text_condition(column, value)
+                where += w
+                params += p
+            elif kind in ('equals', 'choice'):
+                where.append(f"{column} = %s")
+                params.append(value)
+            elif kind == 'number':
+                valid = value.isdigit()
+                if valid:
+                    where.append(f"{column} = %s")
+                    params.append(int(value))
+            elif kind in ('from', 'to'):
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    valid = False
+                else:
+                    where.append(f"{column} {'>=' if kind == 'from' else '<='} %s")
+                    params.append(value)
+            if kind != 'choice':
+                widget.config(fg="black" if valid else "red")
+        return where, params
+
+    def apply(self):
+        """Применить фильтр к таблице, если условия изменились."""
+        self._after = None
+        where, params = self.conditions()
+        if (where, params) == self._applied:
+            return
+        self._applied = (where, params)
+        self.view.set_filter(where, params)
+
+
+class GradeGrid:
+    """Ведомость группы для ввода оценок таблицей: строки — ученики, на каждый предмет столбцы С1, С2, Итог.
+
+    Итог считается на месте по grades.final_grade. Изменённые ячейки подсвечиваются,
+    changes() отдаёт только их; Enter и стрелки вверх/вниз переходят по столбцу.
+    """
+
+    CHANGED = "#fff3b0"
+    NORMAL = "white"
+
+    def __init__(self, parent, students, subjects, cells):
+        self.students = students
+        self.subjects = []
+        self._cells = cells
+        self._inputs = {}
+        self._finals = {}
+        self._saved = {}
+        outer = tk.Frame(parent)
+        self.frame = outer
+        canvas = tk.Canvas(outer, highlightthickness=0)
+        yscroll = ttk.Scrollbar(outer, orient=tk.VERTICAL, command=canvas.yview)
+        xscroll = ttk.Scrollbar(outer, orient=tk.HORIZONTAL, command=canvas.xview)
+        canvas.configure(yscrollcommand=yscroll.set, xscrollcommand=xscroll.set)
+        yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.body = tk.Frame(canvas)
+        canvas.create_window((0, 0), window=self.body, anchor="nw")
+        self.body.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        tk.Label(self.body, text="Ученик", anchor="w", font=("", 9, "bold")).grid(row=1, column=0, sticky="w", padx=4)
+        for r, (sid, name) in enumerate(students, start=2):
+            tk.Label(self.body, text=name, anchor="w").grid(row=r, column=0, sticky="w", padx=4)
+        for subject in subjects:
+            self.add_subject(subject)
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def add_subject(self, subject):
+        """Добавить столбцы предмета (пустые, если оценок по нему ещё нет)."""
+        if subject in self.subjects:
+            return
+        col = 1 + 3 * len(self.subjects)
+        self.subjects.append(subject)
+        tk.Label(self.body, text=subject, font=("", 9, "bold")).grid(row=0, column=col, columnspan=3)
+        for i, title in enumerate(("С1", "С2", "Итог")):
+            tk.Label(self.body, text=title).grid(row=1, column=col + i)
+        for r, (sid, _) in enumerate(self.students, start=2):
+            s1, s2, final = self._cells.get((sid, subject), (None, None, None))
+            key = (sid, subject)
+            entries = []
+            for i, value in enumerate((s1, s2)):
+                e = tk.Entry(self.body, width=4, justify=tk.CENTER, bg=self.NORMAL)
+                e.insert(0, "" if value is None else str(value))
+                e.grid(row=r, column=col + i, padx=1, pady=1)
+                e.bind("<KeyRelease>", lambda ev, k=key: self._edited(k))
+                for seq, step in (("<Return>", 1), ("<Down>", 1), ("<Up>", -1)):
+                    e.bind(seq, lambda ev, k=key, n=i, d=step: self._move(k, n, d))
+                entries.append(e)
+            self._inputs[key] = entries
+            self._finals[key] = tk.Label(self.body, width=4, text="" if final is None else str(final))
+            self._finals[key].grid(row=r, column=col + 2)
+            self._saved[key] = (s1, s2)
+
+    def _value(self, entry):
+        """Оценка из поля: None для пустого, False для неверного значения."""
+        text = entry.get().strip()
+        if not text:
+            return None
+        return int(text) if text.isdigit() else False
+
+    def _edited(self, key):
+        s1, s2 = (self._value(e) for e in self._inputs[key])
+        for e, v in zip(self._inputs[key], (s1, s2)):
+            e.config(fg="red" if v is False else "black")
+        valid = s1 is not False and s2 is not False
+        final = grades.final_grade(s1, s2) if valid else None
+        self._finals[key].config(text="" if final is None else str(final))
+        changed = (s1, s2) != self._saved[key]
+        for e in self._inputs[key]:
+            e.config(bg=self.CHANGED if changed else self.NORMAL)
+
+    def _move(self, key, index, step):
+        row = next(i for i, (sid, _) in enumerate(self.students) if sid == key[0]) + step
+        if 0 <= row < len(self.students):
+            target = self._inputs[(self.students[row][0], key[1])][index]
+            target.focus_set()
+            target.select_range(0, tk.END)
+        return "break"
+
+    def invalid(self):
+        """Число ячеек с неверным значением (не целое число)."""
+        return sum(1 for entries in self._inputs.values() for e in entries if self._value(e) is False)
+
+    def changes(self):
+        """Изменённые ячейки: [(id ученика, предмет, s1, s2)] (неверные значения не включаются)."""
+        result = []
+        for key, entries in self._inputs.items():
+            s1, s2 = (self._value(e) for e in entries)
+            if s1 is False or s2 is False or (s1, s2) == self._saved[key]:
+                continue
+            result.append(key + (s1, s2))
+        return result
+
+    def mark_saved(self, changes):
+        """Сохранённые ячейки становятся исходными значениями (подсветка снимается)."""
+        for sid, subject, s1, s2 in changes:
+            self._saved[(sid, subject)] = (s1, s2)
+            self._edited((sid, subject))